@@ -2,9 +2,30 @@
 Django admin configuration for VR Tours platform.
 """
 from django.contrib import admin
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
-from .models import Tour, Scene, Hotspot
+from .models import Tour, Scene, Hotspot, Job
+from .variants import MIME_TYPES, variant_urls
+
+
+def image_preview(obj, field_name, style):
+    """
+    Render an admin preview from the ``admin`` variant of an image field.
+
+    Modern formats are offered through ``<picture>`` so the browser picks
+    what it supports; the original file is used while variants are missing.
+    """
+    urls = variant_urls(obj, field_name, 'admin')
+    if not urls:
+        return format_html('<img src="{}" style="{}" />', getattr(obj, field_name).url, style)
+    sources = format_html_join(
+        '', '<source srcset="{}" type="{}" />',
+        ((url, MIME_TYPES[fmt]) for fmt, url in urls.items() if fmt != 'jpeg')
+    )
+    return format_html(
+        '<picture>{}<img src="{}" style="{}" /></picture>',
+        sources, urls['jpeg'], style
+    )
 
 
 class SceneInline(admin.TabularInline):
@@ -49,10 +70,7 @@ class TourAdmin(admin.ModelAdmin):
     def thumbnail_preview(self, obj):
         """Display thumbnail preview in admin."""
         if obj.thumbnail:
-            return format_html(
-                '<img src="{}" style="max-width: 100px; max-height: 100px;" />',
-                obj.thumbnail.url
-            )
+            return image_preview(obj, 'thumbnail', 'max-width: 100px; max-height: 100px;')
         return "No thumbnail"
     thumbnail_preview.short_description = "Thumbnail Preview"
 
@@ -60,10 +78,13 @@ class TourAdmin(admin.ModelAdmin):
 @admin.register(Scene)
 class SceneAdmin(admin.ModelAdmin):
     """Admin interface for Scene model."""
-    list_display = ['title', 'tour', 'order', 'hotspot_count', 'is_active', 'panorama_preview']
+    list_display = ['title', 'tour', 'order', 'hotspot_count', 'processing_status', 'is_active', 'panorama_preview']
     list_filter = ['tour', 'is_active', 'created_at']
     search_fields = ['title', 'description', 'tour__title']
-    readonly_fields = ['hotspot_count', 'created_at', 'updated_at', 'panorama_preview', 'map_preview']
+    readonly_fields = [
+        'hotspot_count', 'processing_status', 'processing_error',
+        'created_at', 'updated_at', 'panorama_preview', 'map_preview'
+    ]
     inlines = [HotspotInline]
     list_editable = ['order', 'is_active']
     
@@ -82,6 +103,10 @@ class SceneAdmin(admin.ModelAdmin):
             'fields': ('hotspot_count',),
             'classes': ('collapse',)
         }),
+        ('Processing', {
+            'fields': ('processing_status', 'processing_error'),
+            'classes': ('collapse',)
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -91,36 +116,35 @@ class SceneAdmin(admin.ModelAdmin):
     def panorama_preview(self, obj):
         """Display panorama preview in admin."""
         if obj.panorama_image:
-            return format_html(
-                '<img src="{}" style="max-width: 200px; max-height: 100px;" />',
-                obj.panorama_image.url
-            )
+            return image_preview(obj, 'panorama_image', 'max-width: 200px; max-height: 100px;')
         return "No panorama image"
     panorama_preview.short_description = "Panorama Preview"
 
     def map_preview(self, obj):
         """Display map preview in admin."""
         if obj.map_image:
-            return format_html(
-                '<img src="{}" style="max-width: 100px; max-height: 100px;" />',
-                obj.map_image.url
-            )
+            return image_preview(obj, 'map_image', 'max-width: 100px; max-height: 100px;')
         return "No map image"
     map_preview.short_description = "Map Preview"
 
+    def get_queryset(self, request):
+        """Optimize queryset with select_related."""
+        qs = super().get_queryset(request)
+        return qs.select_related('tour')
+
 
 @admin.register(Hotspot)
 class HotspotAdmin(admin.ModelAdmin):
     """Admin interface for Hotspot model."""
-    list_display = ['source_scene', 'target_scene', 'label', 'yaw', 'pitch', 'color_preview', 'is_active']
+    list_display = ['source_scene', 'target_scene', 'label', 'yaw', 'pitch', 'color_preview', 'click_count', 'is_active']
     list_filter = ['source_scene__tour', 'is_active', 'created_at']
     search_fields = ['label', 'source_scene__title', 'target_scene__title']
-    readonly_fields = ['created_at', 'updated_at', 'color_preview']
+    readonly_fields = ['created_at', 'updated_at', 'color_preview', 'click_count']
     list_editable = ['is_active']
     
     fieldsets = (
         (None, {
-            'fields': ('source_scene', 'target_scene', 'label', 'is_active')
+            'fields': ('source_scene', 'target_scene', 'label', 'is_active', 'click_count')
         }),
         ('Position', {
             'fields': ('yaw', 'pitch'),
@@ -150,6 +174,20 @@ class HotspotAdmin(admin.ModelAdmin):
         return qs.select_related('source_scene', 'target_scene', 'source_scene__tour')
 
 
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Admin interface for background jobs."""
+    list_display = ['id', 'name', 'key', 'status', 'attempts', 'run_after', 'updated_at']
+    list_filter = ['status', 'name']
+    search_fields = ['key']
+    readonly_fields = [
+        'name', 'key', 'payload', 'attempts', 'max_attempts',
+        'locked_at', 'last_error', 'created_at', 'updated_at'
+    ]
+    fields = ['name', 'key', 'payload', 'status', 'run_after', 'attempts', 'max_attempts',
+              'locked_at', 'last_error', 'created_at', 'updated_at']
+
+
 # Customize admin site header
 admin.site.site_header = "VR Tours Administration"
 admin.site.site_title = "VR Tours Admin"
@@ -0,0 +1,173 @@
+"""
+Async read views for VR Tours platform.
+
+Under ASGI a sync view holds a worker thread for its whole run, including
+time spent waiting on the database, the cache or a slow client. These views
+serve the read endpoints as coroutines instead: queries go through Django's
+async ORM, and the remaining sync sections (cache builds, the hotspot
+index, page-number counts) run in ``sync_to_async``. ``urls.py`` routes the
+read endpoints here when ``ASYNC_READ_VIEWS`` is on.
+
+The DRF view classes are still used to authenticate, check permissions and
+throttles, negotiate, build querysets, filter and serialize, so payloads,
+headers and errors match the sync views.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from rest_framework import status
+from rest_framework.response import Response
+
+from .conditional import catalogue_condition, scene_kwarg_condition, tour_kwarg_condition
+from .models import Tour
+from .views import (
+    TourListAPIView,
+    TourDetailAPIView,
+    TourScenesAPIView,
+    SceneDetailAPIView,
+    SceneHotspotsAPIView,
+    get_navigation_data,
+    preload_links,
+    tour_navigation as sync_tour_navigation,
+)
+
+
+def async_read_view(view_class):
+    """
+    Turn a coroutine returning a DRF ``Response`` into an async GET view.
+
+    An instance of ``view_class`` goes through the steps of DRF's
+    ``dispatch``: ``initial()`` (authentication, permissions, throttling,
+    content negotiation with the view's renderers) runs in ``sync_to_async``,
+    exceptions go through ``handle_exception`` and the response through
+    ``finalize_response``. The coroutine is called with the DRF ``Request``
+    and the view instance. ``OPTIONS`` is answered by the view's metadata;
+    methods other than ``GET``/``HEAD``, or missing from the view's
+    ``http_method_names``, get 405. Like ``dispatch`` this wraps the
+    conditional decorators, so errors carry no validators.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def view(request, *args, **kwargs):
+            instance = view_class()
+            instance.setup(request, *args, **kwargs)
+            drf_request = instance.initialize_request(request, *args, **kwargs)
+            instance.request = drf_request
+            instance.headers = instance.default_response_headers
+            try:
+                await sync_to_async(instance.initial)(drf_request, *args, **kwargs)
+                method = request.method.lower()
+                if method not in instance.http_method_names or method not in ('get', 'head', 'options'):
+                    instance.http_method_not_allowed(drf_request, *args, **kwargs)
+                elif method == 'options':
+                    response = await sync_to_async(instance.options)(drf_request, *args, **kwargs)
+                else:
+                    response = await func(drf_request, instance, *args, **kwargs)
+            except Exception as exc:
+                response = instance.handle_exception(exc)
+            response = instance.finalize_response(drf_request, response, *args, **kwargs)
+            if isinstance(response, Response):
+                response.render()
+            return response
+        return view
+    return decorator
+
+
+async def _get_object(view, **lookup):
+    """Async ``get_object`` of a DRF view, raising ``Http404`` when missing."""
+    instance = await view.filter_queryset(view.get_queryset()).filter(**lookup).afirst()
+    if instance is None:
+        raise Http404(f"No {view.get_queryset().model._meta.object_name} matches the given query.")
+    return instance
+
+
+@async_read_view(TourListAPIView)
+@catalogue_condition
+async def tour_list(request, view):
+    """
+    Async version of ``TourListAPIView``.
+
+    GET /api/tours/
+    """
+    queryset = view.filter_queryset(view.get_queryset())
+    page = await view.paginator.apaginate_queryset(queryset, request, view)
+    return view.get_paginated_response(view.get_serializer(page, many=True).data)
+
+
+@async_read_view(TourDetailAPIView)
+@tour_kwarg_condition('id')
+async def tour_detail(request, view, id):
+    """
+    Async version of ``TourDetailAPIView``.
+
+    GET /api/tours/{id}/
+    """
+    tour = await _get_object(view, id=id)
+    return Response(view.get_serializer(tour).data)
+
+
+@async_read_view(TourScenesAPIView)
+@tour_kwarg_condition('tour_id')
+async def tour_scenes(request, view, tour_id):
+    """
+    Async version of ``TourScenesAPIView``.
+
+    GET /api/tours/{tour_id}/scenes/
+    """
+    page = await view.paginator.apaginate_queryset(view.get_queryset(), request, view)
+    return view.get_paginated_response(view.get_serializer(page, many=True).data)
+
+
+# The class DRF's ``@api_view`` wrapped the sync function view in
+@async_read_view(sync_tour_navigation.cls)
+@tour_kwarg_condition('tour_id')
+async def tour_navigation(request, view, tour_id):
+    """
+    Async version of ``views.tour_navigation``.
+
+    GET /api/tours/{tour_id}/navigation/
+    """
+    try:
+        # Cache lookups and the rebuild on a miss are sync
+        return Response(await sync_to_async(get_navigation_data)(tour_id))
+    except Tour.DoesNotExist:
+        return Response(
+            {'error': 'Tour not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except Exception:
+        return Response(
+            {'error': 'An error occurred while fetching navigation data'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@async_read_view(SceneDetailAPIView)
+@scene_kwarg_condition('id')
+async def scene_detail(request, view, id):
+    """
+    Async version of ``SceneDetailAPIView``.
+
+    GET /api/scenes/{id}/
+    """
+    scene = await _get_object(view, id=id)
+    response = Response(view.get_serializer(scene).data)
+    links = preload_links(response.data['neighbours'])
+    if links:
+        response['Link'] = links
+    return response
+
+
+@async_read_view(SceneHotspotsAPIView)
+@scene_kwarg_condition('scene_id')
+async def scene_hotspots(request, view, scene_id):
+    """
+    Async version of ``SceneHotspotsAPIView``.
+
+    GET /api/scenes/{scene_id}/hotspots/?yaw={yaw}&pitch={pitch}&fov={fov}
+    """
+    # The viewport index and the page-number count are sync
+    queryset = await sync_to_async(view.get_queryset)()
+    page = await sync_to_async(view.paginate_queryset)(queryset)
+    return view.get_paginated_response(view.get_serializer(page, many=True).data)
@@ -0,0 +1,183 @@
+"""
+Caching helpers for VR Tours platform.
+
+Per-tour payloads are stored under versioned keys. Saving or deleting a
+tour, scene or hotspot bumps the tour's version (see ``signals.py``), which
+orphans every cached payload of that tour at once without having to know
+which keys exist. The tour catalogue is versioned the same way under the
+``CATALOGUE`` id. Versions also back the ETag/Last-Modified validators of
+the read views.
+"""
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .routers import use_primary
+
+# Stripe the single-flight locks so memory stays bounded however many tours exist
+_LOCK_STRIPES = 64
+_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def get_cache_stats():
+    """Return hit/miss counters for this process."""
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+def reset_cache_stats():
+    """Reset the hit/miss counters for this process."""
+    with _stats_lock:
+        _stats['hits'] = 0
+        _stats['misses'] = 0
+
+
+CATALOGUE = 'catalogue'
+
+
+def _version_key(tour_id):
+    return f'tours:version:{tour_id}'
+
+
+def _modified_key(tour_id):
+    return f'tours:modified:{tour_id}'
+
+
+def _seed(tour_id, initial):
+    """
+    Initialise the missing version or modification keys of a tour.
+
+    ``initial`` maps each missing key to its initial value; returns the
+    stored values. Keys of existing tours never expire; ids without a tour
+    (probes of arbitrary ids) get keys that expire, so they can't fill the
+    cache with permanent keys.
+    """
+    from .models import Tour
+
+    if tour_id == CATALOGUE or Tour.objects.filter(pk=tour_id).exists():
+        timeout = None
+    else:
+        timeout = getattr(settings, 'TOUR_CACHE_TIMEOUT', 60 * 60)
+    for key, value in initial.items():
+        cache.add(key, value, timeout=timeout)
+    stored = cache.get_many(list(initial))
+    return {key: stored.get(key, value) for key, value in initial.items()}
+
+
+def get_tour_version(tour_id):
+    """Return the current cache version of a tour, initialising it if needed."""
+    key = _version_key(tour_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never reuses an old version
+        version = _seed(tour_id, {key: int(time.time() * 1000)})[key]
+    return version
+
+
+def get_tour_validators(tour_id):
+    """
+    Return ``(version, last_modified)`` of a tour for conditional requests.
+
+    ``last_modified`` is the UNIX time of the last invalidation. If it was
+    evicted it restarts at the current time, which only costs clients one
+    full response.
+    """
+    version_key, modified_key = _version_key(tour_id), _modified_key(tour_id)
+    values = cache.get_many([version_key, modified_key])
+    now = time.time()
+    initial = {
+        key: value
+        for key, value in ((version_key, int(now * 1000)), (modified_key, int(now)))
+        if key not in values
+    }
+    if initial:
+        values.update(_seed(tour_id, initial))
+    return values[version_key], values[modified_key]
+
+
+def invalidate_tour(tour_id):
+    """
+    Invalidate every cached payload of a tour by bumping its version.
+
+    Inside a transaction the bump waits for the commit: bumped earlier, a
+    concurrent request could rebuild the payload from the rows the
+    transaction is about to change and cache it under the new version.
+    """
+    transaction.on_commit(partial(_bump_version, tour_id))
+
+
+def _bump_version(tour_id):
+    key = _version_key(tour_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), timeout=None)
+    cache.set(_modified_key(tour_id), int(time.time()), timeout=None)
+
+
+def tour_cache_key(name, tour_id):
+    """Return the versioned cache key for a named per-tour payload."""
+    return f'tours:{name}:{tour_id}:v{get_tour_version(tour_id)}'
+
+
+def get_or_build(key, builder, timeout=None):
+    """
+    Return the cached value for ``key``, building it with ``builder`` on a miss.
+
+    Concurrent misses share one rebuild: threads of this process wait on a
+    lock, and other processes wait for the short-lived lease taken with
+    ``cache.add`` before falling back to building themselves.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'TOUR_CACHE_TIMEOUT', 60 * 60)
+
+    value = cache.get(key)
+    if value is not None:
+        _record('hits')
+        return value
+
+    with _locks[hash(key) % _LOCK_STRIPES]:
+        value = cache.get(key)
+        if value is not None:
+            _record('hits')
+            return value
+
+        lease_key = f'{key}:lease'
+        lease_timeout = getattr(settings, 'TOUR_CACHE_LEASE_TIMEOUT', 10)
+        if not cache.add(lease_key, 1, timeout=lease_timeout):
+            # Another process is rebuilding; poll for its result
+            deadline = time.monotonic() + lease_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = cache.get(key)
+                if value is not None:
+                    _record('hits')
+                    return value
+
+        _record('misses')
+        try:
+            # Shared payloads must not be built from a lagging replica
+            with use_primary():
+                value = builder()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lease_key)
+        return value
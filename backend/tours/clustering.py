@@ -0,0 +1,155 @@
+"""
+Level-of-detail clustering of scene hotspots for VR Tours platform.
+
+Markers that sit closer than their on-screen size overlap, and the angle at
+which that happens grows with the viewer's field of view. Each scene's
+active hotspots are therefore grouped ahead of time into nested levels:
+level 0 holds every hotspot on its own, and each further level merges the
+clusters of the previous one whose centres lie within that level's radius
+(scaled by marker ``size``) of the heaviest cluster around them. Levels are
+built with NumPy over the whole distance matrix when it is installed, with a
+pure Python fallback, and cached under the tour's versioned key so saving a
+hotspot rebuilds them.
+"""
+import math
+
+from django.conf import settings
+
+from .cache import get_or_build, tour_cache_key
+from .models import Hotspot
+from .viewport import numpy, unit_vectors
+
+# Merge radius of each level in degrees, level 0 first
+CLUSTER_RADII = (0.0, 1.5, 3.0, 6.0, 12.0, 24.0)
+
+
+def _normalise(vector):
+    """Scale a vector to unit length; members cancelling out fall back to the zenith."""
+    norm = math.sqrt(sum(component * component for component in vector))
+    if norm == 0.0:
+        return 0.0, 0.0, 1.0
+    return tuple(component / norm for component in vector)
+
+
+def _direction(x, y, z):
+    """Return the ``(yaw, pitch)`` in degrees of a unit vector."""
+    return (
+        round(math.degrees(math.atan2(y, x)), 4),
+        round(math.degrees(math.asin(max(-1.0, min(1.0, z)))), 4),
+    )
+
+
+def _neighbourhoods(vectors, sizes, radius):
+    """
+    Return, for every cluster, the set of clusters within merging distance:
+    ``radius`` times the mean marker size of the pair.
+    """
+    if numpy is not None:
+        points = numpy.array(vectors, dtype=numpy.float64)
+        scale = numpy.array(sizes, dtype=numpy.float64)
+        angles = numpy.degrees(numpy.arccos(numpy.clip(points @ points.T, -1.0, 1.0)))
+        near = angles <= radius * (scale[:, None] + scale[None, :]) / 2.0
+        return [set(numpy.flatnonzero(row).tolist()) for row in near]
+
+    neighbourhoods = []
+    for i, (a, size_a) in enumerate(zip(vectors, sizes)):
+        near = set()
+        for j, (b, size_b) in enumerate(zip(vectors, sizes)):
+            dot = max(-1.0, min(1.0, a[0] * b[0] + a[1] * b[1] + a[2] * b[2]))
+            if math.degrees(math.acos(dot)) <= radius * (size_a + size_b) / 2.0:
+                near.add(j)
+        neighbourhoods.append(near)
+    return neighbourhoods
+
+
+def _merge(clusters, radius):
+    """
+    Merge ``clusters`` for one level.
+
+    Heaviest clusters lead: each takes every still unassigned cluster near
+    it, so one level's clusters are unions of the previous level's.
+    """
+    if len(clusters) < 2:
+        return clusters
+    near = _neighbourhoods(
+        [cluster['vector'] for cluster in clusters],
+        [cluster['size'] for cluster in clusters],
+        radius
+    )
+    order = sorted(
+        range(len(clusters)),
+        key=lambda index: (-len(clusters[index]['hotspots']), clusters[index]['hotspots'][0])
+    )
+    assigned = set()
+    merged = []
+    for leader in order:
+        if leader in assigned:
+            continue
+        group = sorted(near[leader] - assigned)
+        assigned.update(group)
+        members = [clusters[index] for index in group]
+        merged.append({
+            'hotspots': sorted(hotspot for member in members for hotspot in member['hotspots']),
+            # Centroid of all hotspots, so each member weighs by its count
+            'vector': _normalise([
+                sum(member['vector'][axis] * len(member['hotspots']) for member in members)
+                for axis in range(3)
+            ]),
+            'size': max(member['size'] for member in members),
+        })
+    return merged
+
+
+def build_clusters(hotspots):
+    """
+    Cluster ``(id, yaw, pitch, size)`` tuples at every level of ``CLUSTER_RADII``.
+
+    Returns one list of markers per level, each marker a dict with the
+    centroid ``yaw``/``pitch``, member ``count`` and ``hotspots`` ids.
+    """
+    hotspots = list(hotspots)
+    xs, ys, zs = unit_vectors(
+        [yaw for _, yaw, _, _ in hotspots], [pitch for _, _, pitch, _ in hotspots]
+    )
+    clusters = [
+        {'hotspots': [hotspot_id], 'vector': vector, 'size': size}
+        for (hotspot_id, _, _, size), vector in zip(hotspots, zip(xs, ys, zs))
+    ]
+
+    levels = []
+    for radius in CLUSTER_RADII:
+        if radius:
+            clusters = _merge(clusters, radius)
+        levels.append([_marker(cluster) for cluster in clusters])
+    return levels
+
+
+def _marker(cluster):
+    yaw, pitch = _direction(*cluster['vector'])
+    return {
+        'yaw': yaw,
+        'pitch': pitch,
+        'count': len(cluster['hotspots']),
+        'hotspots': cluster['hotspots'],
+    }
+
+
+def level_for_fov(fov):
+    """
+    Return the deepest level whose radius is below the angle a marker covers
+    at this field of view (``fov * HOTSPOT_CLUSTER_FOV_FRACTION``).
+    """
+    marker = fov * settings.HOTSPOT_CLUSTER_FOV_FRACTION
+    return max(level for level, radius in enumerate(CLUSTER_RADII) if radius <= marker)
+
+
+def get_scene_clusters(scene_id, tour_id):
+    """Return the cached cluster levels of a scene, building them on a miss."""
+    return get_or_build(
+        tour_cache_key(f'hotspot-clusters:{scene_id}', tour_id),
+        lambda: build_clusters(Hotspot.objects.filter(
+            source_scene_id=scene_id,
+            is_active=True,
+            target_scene__is_active=True
+        ).order_by('id').values_list('id', 'yaw', 'pitch', 'size'))
+    )
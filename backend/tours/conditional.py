@@ -0,0 +1,103 @@
+"""
+Conditional GET support for VR Tours read views.
+
+Validators come from the per-tour cache versions maintained by signals, so
+answering ``If-None-Match``/``If-Modified-Since`` costs a cache lookup (plus
+at most one small query to find a scene's tour) instead of the full
+serializer run. The decorators work on async views as well.
+"""
+import zlib
+from datetime import datetime, timezone
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+
+from .cache import CATALOGUE, get_tour_validators
+from .models import Scene
+
+
+def _tour_from_kwarg(name):
+    """Resolve the tour id directly from a URL keyword argument."""
+    def resolve(kwargs):
+        return kwargs[name]
+    return resolve
+
+
+def _tour_from_scene_kwarg(name):
+    """Resolve the tour id of the scene named by a URL keyword argument."""
+    def resolve(kwargs):
+        return Scene.objects.filter(id=kwargs[name]).order_by().values_list(
+            'tour_id', flat=True
+        ).first()
+    return resolve
+
+
+def _catalogue(kwargs):
+    return CATALOGUE
+
+
+def _validators(request, resolve, kwargs):
+    """Return ``(tour_id, version, last_modified)``, memoized on the request."""
+    cached = getattr(request, '_tour_validators', None)
+    if cached is None:
+        tour_id = resolve(kwargs)
+        if tour_id is None:
+            cached = (None, None, None)
+        else:
+            cached = (tour_id, *get_tour_validators(tour_id))
+        request._tour_validators = cached
+    return cached
+
+
+def tour_condition(resolve):
+    """
+    Build a ``condition`` decorator validated by the version of a tour.
+
+    ``resolve`` maps the view's URL kwargs to the tour id, or ``None`` when
+    the resource doesn't exist (the view then answers normally).
+    """
+    def etag_func(request, *args, **kwargs):
+        tour_id, version, _ = _validators(request, resolve, kwargs)
+        if tour_id is None:
+            return None
+        # Representations differ per Accept (e.g. negotiated image variants)
+        accept = zlib.crc32(request.META.get('HTTP_ACCEPT', '').encode())
+        return f'tour-{tour_id}-{version}-{accept:x}'
+
+    def last_modified_func(request, *args, **kwargs):
+        tour_id, _, modified = _validators(request, resolve, kwargs)
+        if tour_id is None:
+            return None
+        return datetime.fromtimestamp(modified, tz=timezone.utc)
+
+    def decorator(func):
+        conditional = condition(etag_func=etag_func, last_modified_func=last_modified_func)
+        view = vary_on_headers('Accept')(conditional(func))
+        if not iscoroutinefunction(func):
+            return view
+
+        @wraps(func)
+        async def async_view(request, *args, **kwargs):
+            # Look the validators up off the event loop; the functions above
+            # then only read the memo
+            await sync_to_async(_validators)(request, resolve, kwargs)
+            return await view(request, *args, **kwargs)
+        return async_view
+
+    return decorator
+
+
+catalogue_condition = tour_condition(_catalogue)
+
+
+def tour_kwarg_condition(name):
+    """Conditional GET for views whose URL carries the tour id as ``name``."""
+    return tour_condition(_tour_from_kwarg(name))
+
+
+def scene_kwarg_condition(name):
+    """Conditional GET for views whose URL carries a scene id as ``name``."""
+    return tour_condition(_tour_from_scene_kwarg(name))
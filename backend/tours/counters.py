@@ -0,0 +1,81 @@
+"""
+Stored counters for VR Tours platform.
+
+``Tour.scene_count`` counts the tour's active scenes and
+``Scene.hotspot_count`` the active hotspots leaving the scene. Signals (see
+``signals.py``) keep them up to date with ``F()`` increments as rows are
+created, deleted, activated, deactivated or moved, so concurrent writers
+never overwrite each other's counts. Bulk writes skip signals and call
+``recount_tours``/``recount_scenes`` for the rows they touched;
+``manage.py recount`` repairs any remaining drift, e.g. after
+``QuerySet.update(is_active=...)``.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Hotspot, Scene, Tour
+
+# model: (counter field, counted model, foreign key to the counted row)
+COUNTERS = {
+    Tour: ('scene_count', Scene, 'tour'),
+    Scene: ('hotspot_count', Hotspot, 'source_scene'),
+}
+# Ids per statement, well below SQLite's bound parameter limit
+BATCH_SIZE = 500
+
+# counted model: (model holding the counter, foreign key attribute)
+PARENTS = {
+    counted: (model, counted._meta.get_field(foreign_key).attname)
+    for model, (_, counted, foreign_key) in COUNTERS.items()
+}
+
+
+def adjust(model, pk, delta):
+    """Add ``delta`` to the stored counter of one row, never going below zero."""
+    field = COUNTERS[model][0]
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def _actual(model):
+    field, counted, foreign_key = COUNTERS[model]
+    active = counted.objects.filter(
+        **{foreign_key: OuterRef('pk')}, is_active=True
+    ).order_by().values(foreign_key).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(active), Value(0))
+
+
+def recount(model, queryset=None):
+    """
+    Recompute the stored counter of ``model`` rows (all by default) and
+    return how many were wrong.
+    """
+    field = COUNTERS[model][0]
+    if queryset is None:
+        queryset = model.objects.all()
+    drifted = list(
+        queryset.annotate(actual=_actual(model)).exclude(**{field: F('actual')}).values_list('pk', flat=True)
+    )
+    for start in range(0, len(drifted), BATCH_SIZE):
+        model.objects.filter(pk__in=drifted[start:start + BATCH_SIZE]).update(**{field: _actual(model)})
+    return len(drifted)
+
+
+def _recount_ids(model, ids):
+    ids = list(ids)
+    return sum(
+        recount(model, model.objects.filter(pk__in=ids[start:start + BATCH_SIZE]))
+        for start in range(0, len(ids), BATCH_SIZE)
+    )
+
+
+def recount_tours(tour_ids):
+    """Recompute ``scene_count`` of the given tours."""
+    return _recount_ids(Tour, tour_ids)
+
+
+def recount_scenes(scene_ids):
+    """Recompute ``hotspot_count`` of the given scenes."""
+    return _recount_ids(Scene, scene_ids)
@@ -0,0 +1,171 @@
+"""
+Scene-graph routing and reachability for VR Tours platform.
+
+The active hotspots of a tour form a directed graph over its active scenes.
+``compile_graph`` loads it with two queries and packs it into compressed
+sparse row (CSR) arrays: scene ``i`` links to
+``targets[offsets[i]:offsets[i + 1]]``. Compiled graphs are cached under
+the tour's versioned key, so any tour, scene or hotspot change invalidates
+them, and every traversal afterwards runs in memory without a query per hop.
+
+``rank_neighbours`` orders the scenes one click away from a scene by how
+likely visitors are to go there next, for preloading their panoramas.
+"""
+from array import array
+from collections import deque
+
+from .cache import get_or_build, tour_cache_key
+from .models import Tour, Scene, Hotspot
+from .tiling import tile_urls
+
+
+class SceneGraph:
+    """Directed hotspot graph of one tour in CSR form."""
+
+    __slots__ = ('scene_ids', 'index', 'offsets', 'targets')
+
+    def __init__(self, scene_ids, edges):
+        """
+        Build the graph from scene ids in viewing order and
+        ``(source_id, target_id)`` pairs.
+        """
+        self.scene_ids = array('q', scene_ids)
+        self.index = {scene_id: position for position, scene_id in enumerate(scene_ids)}
+
+        adjacency = [set() for _ in scene_ids]
+        for source, target in edges:
+            if source in self.index and target in self.index and source != target:
+                adjacency[self.index[source]].add(self.index[target])
+
+        self.offsets = array('l', [0])
+        self.targets = array('l')
+        for neighbours in adjacency:
+            # Sorted so traversals, and therefore routes, are deterministic
+            self.targets.extend(sorted(neighbours))
+            self.offsets.append(len(self.targets))
+
+    def __getstate__(self):
+        return self.scene_ids, self.index, self.offsets, self.targets
+
+    def __setstate__(self, state):
+        self.scene_ids, self.index, self.offsets, self.targets = state
+
+    def __len__(self):
+        return len(self.scene_ids)
+
+    def __contains__(self, scene_id):
+        return scene_id in self.index
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    @property
+    def start(self):
+        """Id of the first scene of the tour, or None for an empty tour."""
+        return self.scene_ids[0] if self.scene_ids else None
+
+    def neighbours(self, position):
+        return self.targets[self.offsets[position]:self.offsets[position + 1]]
+
+    def _search(self, source, target=None):
+        """Breadth-first search from ``source``; returns the parent array."""
+        parents = array('l', [-1]) * len(self.scene_ids)
+        parents[source] = source
+        queue = deque([source])
+        while queue:
+            position = queue.popleft()
+            if position == target:
+                break
+            for neighbour in self.neighbours(position):
+                if parents[neighbour] == -1:
+                    parents[neighbour] = position
+                    queue.append(neighbour)
+        return parents
+
+    def shortest_path(self, source_id, target_id):
+        """
+        Return the scene ids of a shortest route (fewest hotspot clicks),
+        both ends included, or None when ``target_id`` can't be reached.
+        """
+        source, target = self.index[source_id], self.index[target_id]
+        parents = self._search(source, target)
+        if parents[target] == -1:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(parents[path[-1]])
+        return [self.scene_ids[position] for position in reversed(path)]
+
+    def unreachable_from(self, source_id):
+        """Return the ids of scenes that can't be reached from ``source_id``."""
+        parents = self._search(self.index[source_id])
+        return [
+            scene_id for scene_id, parent in zip(self.scene_ids, parents)
+            if parent == -1
+        ]
+
+    def dead_ends(self):
+        """Return the ids of scenes without any hotspot leading on."""
+        return [
+            scene_id for position, scene_id in enumerate(self.scene_ids)
+            if self.offsets[position] == self.offsets[position + 1]
+        ]
+
+
+def compile_graph(tour_id):
+    """
+    Load the hotspot graph of an active tour.
+
+    Raises ``Tour.DoesNotExist`` if the tour is missing or inactive.
+    """
+    if not Tour.objects.filter(id=tour_id, is_active=True).exists():
+        raise Tour.DoesNotExist
+    scene_ids = list(Scene.objects.filter(
+        tour_id=tour_id,
+        is_active=True
+    ).order_by('order', 'id').values_list('id', flat=True))
+    edges = Hotspot.objects.filter(
+        source_scene__tour_id=tour_id,
+        is_active=True,
+        target_scene__is_active=True
+    ).order_by().values_list('source_scene_id', 'target_scene_id')
+    return SceneGraph(scene_ids, edges)
+
+
+def get_scene_graph(tour_id):
+    """Return the compiled graph of a tour from the cache, compiling it on a miss."""
+    return get_or_build(tour_cache_key('graph', tour_id), lambda: compile_graph(tour_id))
+
+
+def rank_neighbours(scene):
+    """
+    Return ``(target_scene, clicks)`` for the scenes one click away, likeliest first.
+
+    Expects ``source_hotspots`` prefetched with their target scenes. Scenes
+    are ranked by recorded hotspot clicks, ties keep the hotspot order.
+    """
+    ranked = {}
+    for position, hotspot in enumerate(scene.source_hotspots.all()):
+        target = hotspot.target_scene
+        if not hotspot.is_active or not target.is_active or target.pk == scene.pk:
+            continue
+        if target.pk in ranked:
+            ranked[target.pk][1] += hotspot.click_count
+        else:
+            ranked[target.pk] = [target, hotspot.click_count, position]
+    return [
+        (target, clicks)
+        for target, clicks, _ in sorted(ranked.values(), key=lambda entry: (-entry[1], entry[2]))
+    ]
+
+
+def preload_asset(scene):
+    """
+    Return the storage URL the viewer fetches first for a scene, or None.
+
+    That is the tile pyramid preview once tiles exist, else the panorama.
+    """
+    if scene.tile_manifest:
+        return tile_urls(scene.tile_manifest)['preview_url']
+    return scene.panorama_image.url if scene.panorama_image else None
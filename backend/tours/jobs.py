@@ -0,0 +1,244 @@
+"""
+Database-backed background job queue for VR Tours platform.
+
+Jobs are rows of the ``Job`` model, so no external broker is needed. Code
+enqueues work with ``enqueue()`` and ``manage.py worker`` claims due jobs
+and runs them in a process pool. Failed jobs are retried with exponential
+backoff until ``max_attempts`` is reached.
+
+Tasks are plain functions registered with the ``@task`` decorator::
+
+    @task('process_scene_media')
+    def process_scene_media(scene_id):
+        ...
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+class Task:
+    """A registered task function with its retry policy."""
+
+    def __init__(self, func, name, max_attempts, on_failure):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.on_failure = on_failure
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+
+def task(name, max_attempts=3, on_failure=None):
+    """
+    Register a function as a background task.
+
+    ``on_failure(error, **payload)`` is called once the last attempt failed.
+    """
+    def decorator(func):
+        TASKS[name] = Task(func, name, max_attempts, on_failure)
+        return TASKS[name]
+    return decorator
+
+
+def enqueue(name, key='', **payload):
+    """
+    Queue a task to run in the background and return its job.
+
+    If a job with the same non-empty ``key`` is still pending, that job is
+    returned instead of queueing a duplicate. With ``JOB_QUEUE_EAGER`` the
+    job runs in-process once the current transaction commits.
+    """
+    if name not in TASKS:
+        raise KeyError(f"Unknown task: {name}")
+
+    if key:
+        job = Job.objects.filter(key=key, status=Job.STATUS_PENDING).first()
+        if job is not None:
+            return job
+
+    job = Job.objects.create(
+        name=name,
+        key=key,
+        payload=payload,
+        max_attempts=TASKS[name].max_attempts,
+        run_after=timezone.now(),
+    )
+    if getattr(settings, 'JOB_QUEUE_EAGER', False):
+        transaction.on_commit(lambda: _run_eager(job.pk))
+    return job
+
+
+def enqueue_many(name, items):
+    """
+    Queue one job per ``(key, payload)`` pair with a single bulk insert.
+
+    Keys that already have a pending job are skipped, like ``enqueue()``.
+    """
+    if name not in TASKS:
+        raise KeyError(f"Unknown task: {name}")
+    items = list(items)
+    if not items:
+        return []
+
+    pending = set(Job.objects.filter(
+        key__in=[key for key, _ in items if key],
+        status=Job.STATUS_PENDING,
+    ).values_list('key', flat=True))
+    now = timezone.now()
+    jobs = Job.objects.bulk_create([
+        Job(
+            name=name,
+            key=key,
+            payload=payload,
+            max_attempts=TASKS[name].max_attempts,
+            run_after=now,
+        )
+        for key, payload in items
+        if not key or key not in pending
+    ])
+    if getattr(settings, 'JOB_QUEUE_EAGER', False):
+        for job in jobs:
+            transaction.on_commit(lambda job_id=job.pk: _run_eager(job_id))
+    return jobs
+
+
+def _run_eager(job_id):
+    if claim(job_id):
+        run_job(job_id)
+
+
+def claim(job_id):
+    """Atomically move a due job from pending to running; return success."""
+    now = timezone.now()
+    return bool(Job.objects.filter(
+        id=job_id,
+        status=Job.STATUS_PENDING,
+    ).update(
+        status=Job.STATUS_RUNNING,
+        locked_at=now,
+        attempts=F('attempts') + 1,
+        updated_at=now,
+    ))
+
+
+def claim_due_jobs(limit):
+    """
+    Claim up to ``limit`` due jobs and return their ids.
+
+    Claiming is a compare-and-set per row, so several worker processes can
+    poll the same table without running a job twice. Jobs left running by a
+    crashed worker are released after ``JOB_LOCK_TIMEOUT`` seconds, counting
+    as a failed attempt.
+    """
+    now = timezone.now()
+    lock_timeout = getattr(settings, 'JOB_LOCK_TIMEOUT', 15 * 60)
+    stale = Job.objects.filter(
+        status=Job.STATUS_RUNNING,
+        locked_at__lt=now - timedelta(seconds=lock_timeout),
+    )
+    for job in stale:
+        # Compare-and-set so concurrent workers release each job once
+        if Job.objects.filter(id=job.pk, status=Job.STATUS_RUNNING, locked_at=job.locked_at).update(locked_at=now):
+            _record_failure(job, TASKS.get(job.name), RuntimeError(
+                f"Job lock expired after {lock_timeout} seconds; the worker running it was lost"
+            ))
+
+    candidates = Job.objects.filter(
+        status=Job.STATUS_PENDING,
+        run_after__lte=now,
+    ).order_by('run_after', 'id').values_list('id', flat=True)[:limit]
+    return [job_id for job_id in list(candidates) if claim(job_id)]
+
+
+def unclaim(job_ids):
+    """Return claimed jobs that never started to the queue, undoing their attempt."""
+    return Job.objects.filter(id__in=job_ids, status=Job.STATUS_RUNNING).update(
+        status=Job.STATUS_PENDING,
+        locked_at=None,
+        attempts=F('attempts') - 1,
+        updated_at=timezone.now(),
+    )
+
+
+def release(job_id, error):
+    """
+    Record a run that ended without an outcome, e.g. because its worker
+    process died: the job is retried, or failed once out of attempts.
+    """
+    job = Job.objects.filter(id=job_id, status=Job.STATUS_RUNNING).first()
+    if job is not None:
+        _record_failure(job, TASKS.get(job.name), error)
+
+
+def run_job(job_id):
+    """
+    Run a claimed job and record the outcome.
+
+    Returns the final status. Safe to call from a pool worker process.
+    """
+    job = Job.objects.get(id=job_id)
+    registered = TASKS.get(job.name)
+    try:
+        if registered is None:
+            raise KeyError(f"Unknown task: {job.name}")
+        registered(**job.payload)
+    except Exception as error:
+        logger.exception("Job %s (%s) failed", job.pk, job.name)
+        _record_failure(job, registered, error)
+        return Job.objects.filter(id=job_id).values_list('status', flat=True).first()
+
+    Job.objects.filter(id=job_id).update(
+        status=Job.STATUS_SUCCEEDED,
+        locked_at=None,
+        last_error='',
+        updated_at=timezone.now(),
+    )
+    return Job.STATUS_SUCCEEDED
+
+
+def _record_failure(job, registered, error):
+    now = timezone.now()
+    last_error = ''.join(traceback.format_exception(error))[-4000:]
+    if registered is not None and job.attempts < job.max_attempts:
+        backoff = getattr(settings, 'JOB_RETRY_BACKOFF', 30) * 2 ** (job.attempts - 1)
+        Job.objects.filter(id=job.pk).update(
+            status=Job.STATUS_PENDING,
+            locked_at=None,
+            run_after=now + timedelta(seconds=backoff),
+            last_error=last_error,
+            updated_at=now,
+        )
+        return
+
+    Job.objects.filter(id=job.pk).update(
+        status=Job.STATUS_FAILED,
+        locked_at=None,
+        last_error=last_error,
+        updated_at=now,
+    )
+    if registered is not None and registered.on_failure is not None:
+        try:
+            registered.on_failure(error, **job.payload)
+        except Exception:
+            logger.exception("Failure handler of job %s (%s) failed", job.pk, job.name)
+
+
+def purge_finished(older_than):
+    """Delete succeeded and failed jobs last updated before ``older_than``."""
+    return Job.objects.filter(
+        Q(status=Job.STATUS_SUCCEEDED) | Q(status=Job.STATUS_FAILED),
+        updated_at__lt=older_than,
+    ).delete()[0]
@@ -0,0 +1,275 @@
+"""
+Benchmark every API endpoint and report the results as JSON.
+
+    python manage.py seed_benchmark --tours 1000 --scenes 5
+    python manage.py bench --repeat 50 --concurrency 16 -o before.json
+    python manage.py bench --tour 1001 --url http://127.0.0.1:8000
+
+Every URL of ``tours/urls.py`` that answers GET is requested with sample
+ids from ``--tour`` (the largest active tour by default):
+
+* through the Django test client, one request at a time, recording latency,
+  SQL queries and payload size; the cached payloads of the tour and the
+  catalogue are invalidated first, so the first request (``cold_ms``) shows
+  the cost of a cache miss (``--clear-cache`` clears the whole cache
+  instead, which other users of a shared cache would notice);
+* over real HTTP by ``--concurrency`` clients, against ``--url`` or a
+  threaded WSGI server started in-process, recording latency percentiles
+  and throughput.
+
+Endpoints that only accept writes, or need an object that doesn't exist
+(e.g. an upload id), are listed under ``skipped``.
+"""
+import json
+import math
+import platform
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+import django
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import URLPattern, URLResolver, reverse
+from django.urls.converters import IntConverter
+from django.utils import timezone
+
+from tours import urls as tour_urls
+from tours.cache import CATALOGUE, invalidate_tour
+from tours.models import Hotspot, Scene, Tour
+
+# Query strings for endpoints that need one to do real work
+QUERIES = {
+    'search': 'q=scene',
+    'tour-route': 'from={first_scene}&to={last_scene}',
+}
+
+
+def percentiles(latencies):
+    """Return p50/p95/p99 in milliseconds (nearest rank) of latencies in seconds."""
+    ordered = sorted(latencies)
+
+    def rank(percent):
+        return round(ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)] * 1000, 3)
+
+    return {'p50_ms': rank(50), 'p95_ms': rank(95), 'p99_ms': rank(99)}
+
+
+def sample_objects(tour_id=None):
+    """Pick the tour, scenes and hotspot whose ids fill the URL patterns."""
+    tours = Tour.objects.filter(is_active=True)
+    if tour_id is None:
+        tour = tours.order_by('-scene_count', 'id').first()
+    else:
+        tour = tours.filter(id=tour_id).first()
+    if tour is None:
+        raise CommandError("No active tour to benchmark; run seed_benchmark or pass --tour")
+    scenes = Scene.objects.filter(tour=tour, is_active=True).order_by('order', 'id')
+    first_scene, last_scene = scenes.first(), scenes.last()
+    if first_scene is None:
+        raise CommandError(f"Tour {tour.id} has no active scenes")
+    hotspot = Hotspot.objects.filter(source_scene__tour=tour).order_by('id').first()
+    return {
+        'tour': tour.id,
+        'first_scene': first_scene.id,
+        'last_scene': last_scene.id,
+        'hotspot': hotspot.id if hotspot else None,
+        'scene_count': scenes.count(),
+    }
+
+
+def _patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern
+
+
+def _accepts_get(callback):
+    view_class = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+    if view_class is None:
+        # Plain (async) views of this app are read views
+        return True
+    return hasattr(view_class, 'get')
+
+
+def endpoints(objects):
+    """
+    Return ``(endpoints, skipped)``: ``{'name', 'path'}`` dicts of the
+    GET-able URLs filled with sample ids, and ``{'name', 'reason'}`` dicts.
+    """
+    by_parameter = {
+        'tour_id': objects['tour'],
+        'scene_id': objects['first_scene'],
+        'hotspot_id': objects['hotspot'],
+    }
+    found, skipped = [], []
+    for pattern in _patterns(tour_urls.urlpatterns):
+        name = pattern.name
+        if not _accepts_get(pattern.callback):
+            skipped.append({'name': name, 'reason': 'write-only'})
+            continue
+        kwargs = {}
+        for parameter, converter in pattern.pattern.converters.items():
+            if parameter == 'id':
+                # Bare ids belong to the resource the URL names
+                value = objects['first_scene'] if name.startswith('scene') else objects['tour']
+                if not isinstance(converter, IntConverter):
+                    value = None
+            else:
+                value = by_parameter.get(parameter)
+            if value is None:
+                break
+            kwargs[parameter] = value
+        else:
+            path = reverse(f'{tour_urls.app_name}:{name}', kwargs=kwargs)
+            query = QUERIES.get(name)
+            if query:
+                path = f'{path}?{query.format(**objects)}'
+            found.append({'name': name, 'path': path})
+            continue
+        skipped.append({'name': name, 'reason': 'no sample object'})
+    return found, skipped
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark every API endpoint through the test client and over HTTP; prints JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tour', type=int, default=None, help="Tour whose ids fill the URLs.")
+        parser.add_argument('--repeat', type=int, default=20, help="Test client requests per endpoint.")
+        parser.add_argument('--requests', type=int, default=200, help="HTTP requests per endpoint.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Concurrent HTTP clients.")
+        parser.add_argument('--url', default=None, help="Base URL of a running server (default: start one).")
+        parser.add_argument('--skip-http', action='store_true', help="Only run the test client pass.")
+        parser.add_argument(
+            '--clear-cache', action='store_true',
+            help="Clear the whole cache before each endpoint, not only the tour's payloads.",
+        )
+        parser.add_argument('-o', '--output', default=None, help="Write the JSON here instead of stdout.")
+
+    def handle(self, *args, **options):
+        for name in ('repeat', 'requests', 'concurrency'):
+            if options[name] < 1:
+                raise CommandError(f"--{name} must be positive")
+        # Allows the test client's host; DEBUG stays off as in production
+        setup_test_environment(debug=False)
+        objects = sample_objects(options['tour'])
+        found, skipped = endpoints(objects)
+
+        report = {
+            'started_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connections['default'].vendor,
+            'tour': objects['tour'],
+            'scene_count': objects['scene_count'],
+            'options': {
+                name: options[name] for name in ('repeat', 'requests', 'concurrency', 'url', 'clear_cache')
+            },
+            'client': [
+                self.bench_client(endpoint, options['repeat'], objects, options['clear_cache'])
+                for endpoint in found
+            ],
+            'skipped': skipped,
+        }
+        if not options['skip_http']:
+            report['http'] = self.bench_http(found, options)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stderr.write(f"Wrote {len(found)} endpoints to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def bench_client(self, endpoint, repeat, objects, clear_cache=False):
+        """Request one endpoint ``repeat`` times, starting from a cold cache."""
+        client = Client()
+        if clear_cache:
+            cache.clear()
+        else:
+            invalidate_tour(objects['tour'])
+            invalidate_tour(CATALOGUE)
+        latencies, queries = [], []
+        for _ in range(repeat):
+            with ExitStack() as stack:
+                captures = [
+                    stack.enter_context(CaptureQueriesContext(connections[alias]))
+                    for alias in connections
+                ]
+                start = time.perf_counter()
+                response = client.get(endpoint['path'])
+                latencies.append(time.perf_counter() - start)
+            queries.append(sum(len(capture) for capture in captures))
+        content = response.getvalue() if response.streaming else response.content
+        return {
+            **endpoint,
+            'status': response.status_code,
+            'requests': repeat,
+            'cold_ms': round(latencies[0] * 1000, 3),
+            **percentiles(latencies[1:] or latencies),
+            'queries_cold': queries[0],
+            'queries': max(queries[1:] or queries),
+            'bytes': len(content),
+        }
+
+    def bench_http(self, found, options):
+        """Request every endpoint from concurrent clients over HTTP."""
+        server = None
+        base = options['url']
+        if base is None:
+            server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietHandler, allow_reuse_address=False)
+            server.set_app(WSGIHandler())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base = f'http://127.0.0.1:{server.server_address[1]}'
+        try:
+            return [self.bench_endpoint(base.rstrip('/'), endpoint, options) for endpoint in found]
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+    def bench_endpoint(self, base, endpoint, options):
+        url = base + endpoint['path']
+
+        def fetch(_):
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=60) as response:
+                    size, status = len(response.read()), response.status
+            except urllib.error.HTTPError as error:
+                size, status = len(error.read()), error.code
+            except OSError:
+                size, status = 0, None
+            return time.perf_counter() - start, size, status
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(fetch, range(options['requests'])))
+        elapsed = time.perf_counter() - start
+        latencies = [latency for latency, _, _ in results]
+        return {
+            **endpoint,
+            'requests': len(results),
+            'concurrency': options['concurrency'],
+            'errors': sum(1 for _, _, status in results if status is None or status >= 500),
+            'throughput': round(len(results) / elapsed, 1),
+            **percentiles(latencies),
+            'bytes': max(size for _, size, _ in results),
+        }
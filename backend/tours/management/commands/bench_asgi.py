@@ -0,0 +1,193 @@
+"""
+Compare throughput and latency of the sync and async read views.
+
+    python manage.py bench_asgi --tour 12
+    python manage.py bench_asgi --concurrency 200 --requests 5000 --threads 8
+
+Each mode runs in its own process: ``wsgi`` calls the sync views through
+the test ``Client`` from a pool of ``--threads`` threads, ``asgi`` calls the
+async views (``ASYNC_READ_VIEWS``) through ``AsyncClient`` on one event
+loop. ``--concurrency`` clients request the endpoints back to back, so the
+numbers cover Django's handlers and the views without network noise. No
+WSGI or ASGI server is involved: this compares a thread pool with an event
+loop, not gunicorn with uvicorn.
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment
+
+from tours.models import Scene, Tour
+
+MODES = ('wsgi', 'asgi')
+
+
+def read_paths(tour_id=None):
+    """Return the read endpoint URLs of a tour (the first active one by default)."""
+    tours = Tour.objects.filter(is_active=True)
+    tour = tours.filter(id=tour_id).first() if tour_id else tours.order_by('id').first()
+    if tour is None:
+        raise CommandError("No active tour to benchmark; create one or pass --tour")
+    scene = Scene.objects.filter(tour=tour, is_active=True).order_by('order', 'id').first()
+    paths = [
+        '/api/tours/',
+        f'/api/tours/{tour.id}/',
+        f'/api/tours/{tour.id}/scenes/',
+        f'/api/tours/{tour.id}/navigation/',
+    ]
+    if scene is not None:
+        paths += [f'/api/scenes/{scene.id}/', f'/api/scenes/{scene.id}/hotspots/']
+    return paths
+
+
+def summarize(mode, latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    cut = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(cut[49] * 1000, 2),
+        'p99_ms': round(cut[98] * 1000, 2),
+    }
+
+
+def run_wsgi(paths, total, concurrency, threads):
+    """Closed-loop clients submitting to a fixed pool of WSGI worker threads."""
+    local = threading.local()
+
+    def serve(path):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        return local.client.get(path).status_code
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client(offset, count, pool):
+        for index in range(count):
+            start = time.perf_counter()
+            status = pool.submit(serve, paths[(offset + index) % len(paths)]).result()
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors.append(status)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        clients = [
+            threading.Thread(target=client, args=(offset, count, pool))
+            for offset, count in enumerate(_split(total, concurrency))
+        ]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+    return latencies, len(errors), time.perf_counter() - start
+
+
+def run_asgi(paths, total, concurrency):
+    """Closed-loop clients as tasks on one event loop."""
+    latencies, errors = [], []
+
+    async def client(offset, count):
+        http = AsyncClient()
+        for index in range(count):
+            start = time.perf_counter()
+            response = await http.get(paths[(offset + index) % len(paths)])
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+
+    async def main():
+        await asyncio.gather(*(
+            client(offset, count) for offset, count in enumerate(_split(total, concurrency))
+        ))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return latencies, len(errors), time.perf_counter() - start
+
+
+def _split(total, parts):
+    return [total // parts + (1 if index < total % parts else 0) for index in range(parts)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the sync read views on a thread pool against the async ones on an event "
+        "loop, through the in-process test clients (no server)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tour', type=int, default=None, help="Tour whose endpoints are requested.")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per mode.")
+        parser.add_argument('--concurrency', type=int, default=100, help="Concurrent clients.")
+        parser.add_argument('--threads', type=int, default=8, help="WSGI worker threads.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+        parser.add_argument('--mode', choices=MODES, help="Run one mode in this process.")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['threads'] < 1:
+            raise CommandError("--requests, --concurrency and --threads must be positive")
+        if options['mode']:
+            result = self.run_mode(options)
+            self.stdout.write(json.dumps(result))
+            return
+
+        results = [self.spawn(mode, options) for mode in MODES]
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{options['requests']} requests, {options['concurrency']} concurrent clients, "
+            f"{options['threads']} WSGI threads"
+        )
+        self.stdout.write(f"{'mode':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:<8}{result['throughput']:>10}{result['p50_ms']:>10}"
+                f"{result['p99_ms']:>10}{result['errors']:>8}"
+            )
+
+    def spawn(self, mode, options):
+        """Run one mode in a child process with the matching views routed."""
+        command = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_asgi', '--mode', mode,
+            '--requests', str(options['requests']),
+            '--concurrency', str(options['concurrency']),
+            '--threads', str(options['threads']),
+        ]
+        if options['tour'] is not None:
+            command += ['--tour', str(options['tour'])]
+        env = {**os.environ, 'ASYNC_READ_VIEWS': 'True' if mode == 'asgi' else 'False'}
+        child = subprocess.run(command, env=env, capture_output=True, text=True)
+        if child.returncode:
+            raise CommandError(f"{mode} run failed:\n{child.stderr}")
+        return json.loads(child.stdout.strip().splitlines()[-1])
+
+    def run_mode(self, options):
+        # Allows the test client's host and stops DEBUG query logging
+        setup_test_environment(debug=False)
+        paths = read_paths(options['tour'])
+        expected = options['mode'] == 'asgi'
+        if settings.ASYNC_READ_VIEWS != expected:
+            raise CommandError(f"Set ASYNC_READ_VIEWS={expected} to benchmark {options['mode']}")
+        if options['mode'] == 'asgi':
+            measured = run_asgi(paths, options['requests'], options['concurrency'])
+        else:
+            measured = run_wsgi(paths, options['requests'], options['concurrency'], options['threads'])
+        return summarize(options['mode'], *measured)
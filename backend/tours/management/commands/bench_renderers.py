@@ -0,0 +1,106 @@
+"""
+Compare payload size and encode time of the response renderers.
+
+    python manage.py bench_renderers --tour 12
+    python manage.py bench_renderers --scenes 500 --hotspots 6
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from tours.models import Tour
+from tours.renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson
+from tours.views import build_navigation_data
+
+
+def synthetic_navigation(scene_count, hotspots_per_scene):
+    """Build a navigation payload shaped like ``build_navigation_data``."""
+    rng = random.Random(0)
+    scenes = [
+        {
+            'id': scene_id,
+            'title': f'Scene {scene_id}',
+            'order': scene_id,
+            'initial_yaw': rng.uniform(-180, 180),
+            'initial_pitch': rng.uniform(-90, 90),
+            'panorama_image': f'/media/scenes/panoramas/{scene_id:064x}.jpg',
+            'map_image': None,
+            'voiceover_audio': f'/media/scenes/audio/{scene_id:064x}.mp3',
+        }
+        for scene_id in range(1, scene_count + 1)
+    ]
+    connections = [
+        {
+            'id': scene['id'] * hotspots_per_scene + index,
+            'from_scene': scene['id'],
+            'to_scene': rng.randint(1, scene_count),
+            'yaw': rng.uniform(-180, 180),
+            'pitch': rng.uniform(-90, 90),
+            'label': 'Next room',
+            'size': rng.uniform(0.1, 5.0),
+            'color': '#ffffff',
+        }
+        for scene in scenes
+        for index in range(hotspots_per_scene)
+    ]
+    return {
+        'tour': {'id': 1, 'title': 'Synthetic tour', 'scene_count': scene_count},
+        'scenes': scenes,
+        'connections': connections,
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark bytes and encode time of each response renderer."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tour', type=int, default=None,
+            help="Encode the navigation payload of this tour."
+        )
+        parser.add_argument(
+            '--scenes', type=int, default=500,
+            help="Scenes in the synthetic payload (without --tour)."
+        )
+        parser.add_argument(
+            '--hotspots', type=int, default=6,
+            help="Hotspots per scene in the synthetic payload."
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help="Encodes per renderer; the best time is reported."
+        )
+
+    def handle(self, *args, **options):
+        if options['tour'] is not None:
+            try:
+                data = build_navigation_data(options['tour'])
+            except Tour.DoesNotExist:
+                raise CommandError(f"Tour {options['tour']} does not exist or is inactive")
+        else:
+            data = synthetic_navigation(options['scenes'], options['hotspots'])
+
+        renderers = [('json (stdlib)', JSONRenderer())]
+        if orjson is not None:
+            renderers.append(('json (orjson)', ORJSONRenderer()))
+        if msgpack is not None:
+            renderers.append(('msgpack', MessagePackRenderer()))
+
+        self.stdout.write(
+            f"{len(data['scenes'])} scenes, {len(data['connections'])} connections, "
+            f"best of {options['repeat']}"
+        )
+        self.stdout.write(f"{'format':<16}{'bytes':>10}{'encode ms':>12}{'speedup':>10}")
+        baseline = None
+        for label, renderer in renderers:
+            best = float('inf')
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                body = renderer.render(data, renderer.media_type, {})
+                best = min(best, time.perf_counter() - start)
+            baseline = baseline or best
+            self.stdout.write(
+                f"{label:<16}{len(body):>10}{best * 1000:>12.3f}{baseline / best:>9.1f}x"
+            )
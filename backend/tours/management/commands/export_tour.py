@@ -0,0 +1,42 @@
+"""
+Export a tour with its scenes, hotspots and media to a zip archive.
+
+    python manage.py export_tour 12 -o lobby.zip
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tours.models import Tour
+from tours.transfer import export_filename, stream_export
+
+
+class Command(BaseCommand):
+    help = "Write a tour archive (tour.json plus media) for import elsewhere."
+
+    def add_arguments(self, parser):
+        parser.add_argument('tour_id', type=int)
+        parser.add_argument(
+            '-o', '--output', default=None,
+            help="Archive path, or '-' for stdout (default: tour-<id>.zip)."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            tour = Tour.objects.get(id=options['tour_id'])
+        except Tour.DoesNotExist:
+            raise CommandError(f"Tour {options['tour_id']} does not exist")
+
+        output = options['output'] or export_filename(tour)
+        if output == '-':
+            for chunk in stream_export(tour):
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        size = 0
+        with open(output, 'wb') as handle:
+            for chunk in stream_export(tour):
+                handle.write(chunk)
+                size += len(chunk)
+        self.stdout.write(f"Exported tour {tour.id} ({size} bytes) to {output}")
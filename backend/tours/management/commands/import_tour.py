@@ -0,0 +1,27 @@
+"""
+Create a tour from an archive written by ``export_tour``.
+
+    python manage.py import_tour lobby.zip
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from tours.transfer import ArchiveError, import_tour
+
+
+class Command(BaseCommand):
+    help = "Import a tour archive as a new tour."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archive'], 'rb') as handle:
+                tour = import_tour(handle)
+        except OSError as error:
+            raise CommandError(str(error))
+        except ArchiveError as error:
+            raise CommandError(f"Invalid archive: {error}")
+        self.stdout.write(
+            f"Imported tour {tour.id} ({tour.scenes.count()} scenes) from {options['archive']}"
+        )
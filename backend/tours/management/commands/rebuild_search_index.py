@@ -0,0 +1,25 @@
+"""
+Rebuild the full-text search index from the database.
+
+    python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+
+from tours import search
+
+
+class Command(BaseCommand):
+    help = "Recreate the search index of tours, scenes and hotspot labels."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help="Documents written per statement batch."
+        )
+
+    def handle(self, *args, **options):
+        if search.get_backend() is None:
+            self.stdout.write("This database has no full-text index; nothing to do.")
+            return
+        count = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(f"Indexed {count} documents")
@@ -0,0 +1,39 @@
+"""
+Repair the stored scene and hotspot counters.
+
+    python manage.py recount
+    python manage.py recount --tour 12
+
+Run it once after adding the counter columns, and whenever rows were
+changed without signals (``QuerySet.update``, raw SQL, ``loaddata``).
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tours.cache import CATALOGUE, invalidate_tour
+from tours.counters import recount
+from tours.models import Scene, Tour
+
+
+class Command(BaseCommand):
+    help = "Recompute Tour.scene_count and Scene.hotspot_count from the active rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tour', type=int, action='append', help="Only this tour (repeatable).")
+
+    def handle(self, *args, **options):
+        tours = Tour.objects.all()
+        scenes = Scene.objects.all()
+        if options['tour']:
+            tours = tours.filter(pk__in=options['tour'])
+            scenes = scenes.filter(tour_id__in=options['tour'])
+
+        with transaction.atomic():
+            fixed_tours = recount(Tour, tours)
+            fixed_scenes = recount(Scene, scenes)
+        if fixed_tours or fixed_scenes:
+            # Counts are part of cached payloads
+            for tour_id in tours.values_list('pk', flat=True):
+                invalidate_tour(tour_id)
+            invalidate_tour(CATALOGUE)
+        self.stdout.write(f"Fixed {fixed_tours} tour and {fixed_scenes} scene counters")
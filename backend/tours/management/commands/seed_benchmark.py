@@ -0,0 +1,143 @@
+"""
+Generate synthetic tours for benchmarking.
+
+    python manage.py seed_benchmark --tours 1000 --scenes 5 --hotspots 3
+    python manage.py seed_benchmark --tours 1 --scenes 5000 --hotspots 4
+    python manage.py seed_benchmark --clear --tours 0
+
+Every scene gets up to ``--hotspots`` links: to the next and previous
+scene first, so the whole tour is reachable, then to random scenes of the
+tour. All scenes share a few small placeholder panoramas. Seeded tours are
+titled ``Benchmark tour <n>`` so ``--clear`` can remove them again.
+"""
+import io
+import random
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from tours.cache import CATALOGUE, invalidate_tour
+from tours.counters import recount_scenes, recount_tours
+from tours.models import Hotspot, Scene, Tour
+from tours.search import index_hotspots, index_scenes, index_tours
+
+TITLE_PREFIX = 'Benchmark tour'
+PLACEHOLDER_COLOURS = ['#3d5a80', '#98c1d9', '#e0fbfc', '#ee6c4d', '#293241']
+
+
+def placeholder_jpeg(colour, size=(64, 32)):
+    """Return a tiny equirectangular-shaped JPEG of one colour."""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, colour).save(buffer, format='JPEG', quality=60)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = "Create synthetic tours, scenes and hotspot graphs for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tours', type=int, default=10, help="Tours to create.")
+        parser.add_argument('--scenes', type=int, default=50, help="Scenes per tour.")
+        parser.add_argument('--hotspots', type=int, default=4, help="Links per scene, neighbouring scenes first.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for repeatable graphs.")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows per bulk insert.")
+        parser.add_argument('--clear', action='store_true', help="Delete previously seeded tours first.")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted = 0
+            for tour in Tour.objects.filter(title__startswith=TITLE_PREFIX).iterator():
+                # One by one, so signals release files and index entries
+                tour.delete()
+                deleted += 1
+            self.stdout.write(f"Deleted {deleted} benchmark tours")
+        if options['tours'] < 1:
+            return
+        if options['scenes'] < 1 or options['hotspots'] < 0:
+            raise CommandError("--scenes must be positive and --hotspots not negative")
+
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            counts = self.seed(rng, options)
+        self.stdout.write(self.style.SUCCESS(
+            "Created {tours} tours, {scenes} scenes and {hotspots} hotspots".format(**counts)
+        ))
+
+    def seed(self, rng, options):
+        storage = Scene._meta.get_field('panorama_image').storage
+        panoramas = [
+            storage.save(
+                Scene._meta.get_field('panorama_image').generate_filename(None, 'benchmark.jpg'),
+                ContentFile(placeholder_jpeg(colour))
+            )
+            for colour in PLACEHOLDER_COLOURS
+        ]
+        references = dict.fromkeys(panoramas, 0)
+
+        start = Tour.objects.filter(title__startswith=TITLE_PREFIX).count()
+        tours = Tour.objects.bulk_create([
+            Tour(
+                title=f'{TITLE_PREFIX} {start + number + 1}',
+                description=f"Synthetic tour with {options['scenes']} scenes",
+            )
+            for number in range(options['tours'])
+        ], batch_size=options['batch_size'])
+
+        scenes = []
+        for tour in tours:
+            for order in range(options['scenes']):
+                panorama = rng.choice(panoramas)
+                references[panorama] += 1
+                scenes.append(Scene(
+                    tour=tour,
+                    title=f'Scene {order + 1}',
+                    description=f'Room {order + 1} of {tour.title}',
+                    panorama_image=panorama,
+                    initial_yaw=rng.uniform(-180, 180),
+                    order=order,
+                ))
+        Scene.objects.bulk_create(scenes, batch_size=options['batch_size'])
+
+        hotspots = []
+        per_tour = options['scenes']
+        for first in range(0, len(scenes), per_tour):
+            tour_scenes = scenes[first:first + per_tour]
+            for index, scene in enumerate(tour_scenes):
+                targets = []
+                if index + 1 < len(tour_scenes):
+                    targets.append(tour_scenes[index + 1])
+                if index > 0:
+                    targets.append(tour_scenes[index - 1])
+                while len(targets) < options['hotspots'] and len(tour_scenes) > 1:
+                    target = rng.choice(tour_scenes)
+                    if target is not scene:
+                        targets.append(target)
+                for target in targets[:options['hotspots']]:
+                    hotspots.append(Hotspot(
+                        source_scene=scene,
+                        target_scene=target,
+                        yaw=rng.uniform(-180, 180),
+                        pitch=rng.uniform(-30, 30),
+                        label=f'To {target.title}',
+                    ))
+        Hotspot.objects.bulk_create(hotspots, batch_size=options['batch_size'])
+
+        # save() above added one reference per placeholder; add the rest
+        for name, count in references.items():
+            if count > 1:
+                storage.add_references(name, count - 1)
+            elif count == 0:
+                storage.delete(name)
+
+        # bulk_create skips signals, so count, index and invalidate by hand
+        recount_tours([tour.pk for tour in tours])
+        recount_scenes([scene.pk for scene in scenes])
+        index_tours(tours)
+        index_scenes(scenes)
+        index_hotspots(hotspots, {scene.pk: scene.tour_id for scene in scenes})
+        for tour in tours:
+            invalidate_tour(tour.pk)
+        invalidate_tour(CATALOGUE)
+        return {'tours': len(tours), 'scenes': len(scenes), 'hotspots': len(hotspots)}
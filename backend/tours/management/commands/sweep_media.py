@@ -0,0 +1,37 @@
+"""
+Delete stored media files that nothing references.
+
+    python manage.py sweep_media
+    python manage.py sweep_media --grace 1 --dry-run
+
+Uploads are written before the transaction saving their row commits, so a
+rolled back save (a failed import, an admin form error) leaves the file
+behind without a reference. Run it from cron, e.g. daily.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from tours.storage import get_media_storage
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed media files without references."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=float, default=24,
+            help="Only files written more than this many hours ago (default: 24)."
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="List the files instead of deleting them."
+        )
+
+    def handle(self, *args, **options):
+        older_than = time.time() - options['grace'] * 60 * 60
+        swept = get_media_storage().sweep(older_than, dry_run=options['dry_run'])
+        for name in swept:
+            self.stdout.write(name)
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(f"{verb} {len(swept)} unreferenced media files")
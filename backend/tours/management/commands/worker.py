@@ -0,0 +1,126 @@
+"""
+Run the background job worker.
+
+    python manage.py worker --processes 4
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from tours import jobs, uploads
+
+
+def _close_connections():
+    # Forked children must not share the parent's database connections
+    connections.close_all()
+
+
+def _run(job_id):
+    try:
+        return jobs.run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Process queued background jobs (media tiling, image variants, ...)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help="Number of worker processes (default: number of CPUs)."
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help="Seconds to sleep when the queue is empty."
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit once no due jobs are left instead of polling forever."
+        )
+        parser.add_argument(
+            '--purge-after', type=int, default=7,
+            help="Delete finished jobs older than this many days on startup."
+        )
+
+    def handle(self, *args, **options):
+        purged = jobs.purge_finished(timezone.now() - timedelta(days=options['purge_after']))
+        if purged:
+            self.stdout.write(f"Purged {purged} finished jobs")
+        expired = uploads.purge_expired()
+        if expired:
+            self.stdout.write(f"Discarded {expired} expired chunked uploads")
+
+        capacity = options['processes'] or os.cpu_count() or 1
+        pool = self.start_pool(capacity)
+        self.stdout.write(f"Worker started with {capacity} processes")
+        running = {}
+        try:
+            while True:
+                free = capacity - len(running)
+                claimed = jobs.claim_due_jobs(free) if free else []
+                for index, job_id in enumerate(claimed):
+                    try:
+                        running[pool.submit(_run, job_id)] = job_id
+                    except BrokenProcessPool:
+                        jobs.unclaim(claimed[index:])
+                        pool = self.recover(pool, running, capacity)
+                        break
+
+                if not running:
+                    if options['once'] and not claimed:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                # Wake up when a job finishes or new jobs may have arrived
+                done, _ = wait(
+                    running,
+                    timeout=options['poll_interval'],
+                    return_when=FIRST_COMPLETED,
+                )
+                broken = False
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        self.stdout.write(f"Job {job_id}: {future.result()}")
+                    except Exception as error:
+                        self.stderr.write(f"Job {job_id}: worker process failed ({error})")
+                        jobs.release(job_id, error)
+                        broken = broken or isinstance(error, BrokenProcessPool)
+                if broken:
+                    pool = self.recover(pool, running, capacity)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping worker, waiting for running jobs...")
+        finally:
+            pool.shutdown(wait=True)
+
+    def start_pool(self, capacity):
+        _close_connections()
+        # Forked children inherit the configured Django; spawned ones (the
+        # default elsewhere than Linux, and from Python 3.14) would import
+        # the tasks before django.setup()
+        return ProcessPoolExecutor(
+            max_workers=capacity,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_close_connections,
+        )
+
+    def recover(self, pool, running, capacity):
+        """
+        Replace a pool broken by a dead process. Its processes are gone, so
+        the jobs still running in it are released and the pool restarted.
+        """
+        self.stderr.write("Worker pool broken, restarting it")
+        for job_id in running.values():
+            jobs.release(job_id, BrokenProcessPool("A process in the worker pool died"))
+        running.clear()
+        pool.shutdown(wait=False, cancel_futures=True)
+        return self.start_pool(capacity)
@@ -0,0 +1,190 @@
+"""
+Media file delivery for VR Tours platform.
+
+Serves ``MEDIA_ROOT`` with ``Range`` support (so audio seeking and resumed
+panorama downloads only transfer the bytes asked for), strong validators and
+long-lived cache headers. Every request passes ``authorize_media`` first.
+With ``MEDIA_SENDFILE`` set, Django only resolves and authorizes the file
+and a front proxy streams the bytes:
+
+* ``'x-accel-redirect'`` (nginx): the response carries
+  ``X-Accel-Redirect: MEDIA_ACCEL_REDIRECT_PREFIX + path``.
+* ``'x-sendfile'`` (Apache, lighttpd): the response carries the absolute
+  file path in ``X-Sendfile``.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .storage import is_content_addressed, is_generation
+
+STREAM_BLOCK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Derived files are written to a new generation directory below these
+DERIVED_DIR_SUFFIXES = ('_tiles', '_variants')
+
+
+def is_immutable(path):
+    """
+    Return whether the file at ``path`` never changes under that name:
+    content-addressed uploads, and derived files of one generation. Derived
+    files written before generations existed may be rewritten in place.
+    """
+    if is_content_addressed(path):
+        return True
+    directories = path.split('/')[:-1]
+    return any(
+        parent.endswith(DERIVED_DIR_SUFFIXES) and is_generation(child)
+        for parent, child in zip(directories, directories[1:])
+    )
+
+
+def authorize_media(request, path):
+    """
+    Return whether ``request`` may read the media file at ``path``.
+
+    Tour media is public, so every file is allowed. This is the one place
+    to restrict it (e.g. media of unpublished tours); responses then need a
+    ``private`` ``Cache-Control`` as well.
+    """
+    return True
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range ``Range`` header into inclusive ``(start, end)``.
+
+    Returns ``None`` when the header should be ignored (absent, malformed or
+    multi-range, which is answered with the full file) and raises
+    ``ValueError`` when the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if size == 0:
+        raise ValueError("Range of an empty file")
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    """Return whether an ``If-Range`` precondition (if any) holds."""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _stream_range(path, start, length):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while length > 0:
+            data = handle.read(min(STREAM_BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def _sendfile_response(path, full_path):
+    mode = getattr(settings, 'MEDIA_SENDFILE', None)
+    if mode == 'x-accel-redirect':
+        response = HttpResponse()
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        # nginx decodes the URI, so names with spaces or '?' survive
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(path)
+        return response
+    if mode == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = full_path
+        return response
+    return None
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from ``MEDIA_ROOT``.
+
+    GET /media/{path}
+    """
+    if not authorize_media(request, path):
+        # Same answer as a missing file, so existence isn't disclosed
+        raise Http404("Media file not found")
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        info = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404("Media file not found")
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404("Media file not found")
+
+    size = info.st_size
+    last_modified = int(info.st_mtime)
+    # Strong validator: size and nanosecond mtime change with any rewrite
+    etag = f'"{size:x}-{info.st_mtime_ns:x}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _sendfile_response(path, full_path)
+    if response is None:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range and not _if_range_matches(request, etag, last_modified):
+            byte_range = None
+
+        if byte_range is None:
+            response = FileResponse(open(full_path, 'rb'))
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _stream_range(full_path, start, length) if request.method == 'GET' else [],
+                status=206,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    if response.status_code != 304:
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if is_immutable(path):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        max_age = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 60 * 60)
+        response['Cache-Control'] = f'public, max-age={max_age}'
+    return response
@@ -0,0 +1,345 @@
+"""
+Prometheus metrics for VR Tours platform.
+
+``MetricsMiddleware`` counts every request in this process: requests by URL
+name, method and status, a latency histogram and the database queries per
+URL name. Cache hits and misses come from ``cache.get_cache_stats`` and
+upload bytes are counted where uploads are received.
+
+Under multi-process WSGI servers each worker only sees its own requests, so
+every process writes its totals to a file of its own in ``METRICS_DIR``
+(named after its PID and start time, so a reused PID never takes over an
+old file) at most every ``METRICS_FLUSH_INTERVAL`` seconds and on exit,
+replacing the file atomically. ``/api/metrics/`` adds up the files of all
+processes; workers never wait on each other. Every ``COMPACT_INTERVAL``
+seconds a live process folds the files of exited processes into
+``exited.json``, so counters don't go backwards and the directory doesn't
+grow with every restart. ``METRICS_DIR`` must be local to the host, since
+liveness is checked by PID. It is off by default, and then only the serving
+process is reported.
+"""
+import atexit
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from time import monotonic, perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .cache import get_cache_stats
+from .timing import request_sample
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not on Windows
+    fcntl = None
+
+PREFIX = 'vrtours'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help)
+METRICS = {
+    'http_requests_total': ('counter', "Requests served, by URL name, method and status."),
+    'http_request_duration_seconds': ('histogram', "Request latency by URL name."),
+    'db_queries_total': ('counter', "Database queries run while serving requests, by URL name."),
+    'cache_requests_total': ('counter', "Per-tour payload cache lookups, by result."),
+    'cache_hit_ratio': ('gauge', "Share of per-tour payload cache lookups that hit."),
+    'upload_bytes_total': ('counter', "Upload bytes received, by kind."),
+}
+
+# Seconds between folds of the files of exited processes
+COMPACT_INTERVAL = 60
+EXITED_FILE = 'exited.json'
+PROCESS_FILE_RE = re.compile(r'^(\d+)(?:-\d+)?\.json$')
+
+_lock = threading.Lock()
+# {(name, labels): value}, labels a tuple of (label, value) pairs
+_counters = {}
+# {(name, labels): [count per bucket..., count, sum]}
+_histograms = {}
+_last_flush = 0.0
+_last_compact = 0.0
+# (pid, start time in ms) naming this process's file
+_identity = None
+# METRICS_DIR as of the last request, for the flush at exit
+_directory = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def increment(name, amount=1, **labels):
+    """Add ``amount`` to a counter of this process."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Add a value to a histogram of this process."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(buckets) + 2)
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[index] += 1
+                break
+        histogram[-2] += 1
+        histogram[-1] += value
+
+
+def _snapshot():
+    """Return this process's totals in the JSON form of the metric files."""
+    with _lock:
+        counters = [[name, dict(labels), value] for (name, labels), value in _counters.items()]
+        histograms = [[name, dict(labels), list(values)] for (name, labels), values in _histograms.items()]
+    stats = get_cache_stats()
+    for field, result in (('hits', 'hit'), ('misses', 'miss')):
+        counters.append(['cache_requests_total', {'result': result}, stats[field]])
+    return {'counters': counters, 'histograms': histograms}
+
+
+def _metrics_dir():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    return Path(directory) if directory else None
+
+
+def _own_file(directory):
+    global _identity
+    pid = os.getpid()
+    if _identity is None or _identity[0] != pid:
+        # Also reset in a forked child, which must not share its parent's file
+        _identity = (pid, int(time.time() * 1000))
+    return directory / f'{pid}-{_identity[1]}.json'
+
+
+def _write_json(path, data):
+    temporary = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+    temporary.write_text(json.dumps(data))
+    os.replace(temporary, path)
+
+
+def _read_json(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        # Removed while listing
+        return None
+
+
+def flush(force=False):
+    """
+    Write this process's totals to its file in ``METRICS_DIR``, at most once
+    per interval, and fold the files of exited processes now and then.
+
+    Called from requests; the forced flush at exit writes to the directory
+    those saw, since settings may have changed since (an ended
+    ``override_settings``), and writes nothing if they saw none.
+    """
+    global _last_flush, _last_compact, _directory
+    if force:
+        directory = _directory
+    else:
+        directory = _directory = _metrics_dir()
+    now = monotonic()
+    if directory is None or not force and now - _last_flush < settings.METRICS_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    directory.mkdir(parents=True, exist_ok=True)
+    _write_json(_own_file(directory), _snapshot())
+    if not force and now - _last_compact >= COMPACT_INTERVAL:
+        _last_compact = now
+        compact(directory)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def _folding_lock(directory, exclusive):
+    """Hold the lock that orders folding against reading the files."""
+    if fcntl is None:
+        yield
+        return
+    with open(directory / '.fold.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def compact(directory):
+    """
+    Fold the files of exited processes into ``exited.json`` and remove them.
+
+    The lock keeps two processes from folding the same file and readers from
+    seeing a file both folded and on its own; the folded names are recorded
+    along with the totals, so files left behind by an interrupted fold are
+    never counted twice. Without ``fcntl`` nothing is folded.
+    """
+    if fcntl is None:
+        return
+    with _folding_lock(directory, exclusive=True):
+        exited_path = directory / EXITED_FILE
+        exited = _read_json(exited_path) or {'counters': [], 'histograms': [], 'folded': []}
+        already = set(exited['folded'])
+        dead = []
+        for path in directory.glob('*.json'):
+            match = PROCESS_FILE_RE.match(path.name)
+            if match and not _is_alive(int(match.group(1))):
+                dead.append(path)
+        snapshots = [exited]
+        for path in dead:
+            if path.name not in already:
+                snapshot = _read_json(path)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        if not dead and not already:
+            return
+        counters, histograms = _merge(snapshots)
+        _write_json(exited_path, {
+            'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, dict(labels), values] for (name, labels), values in histograms.items()],
+            'folded': [path.name for path in dead],
+        })
+        for path in dead:
+            path.unlink(missing_ok=True)
+
+
+def _merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = _key(name, labels)
+            merged = histograms.get(key)
+            histograms[key] = values if merged is None else [a + b for a, b in zip(merged, values)]
+    return counters, histograms
+
+
+@atexit.register
+def _flush_on_exit():
+    if not _counters and not _histograms:
+        # Served nothing, e.g. a management command
+        return
+    try:
+        flush(force=True)
+    except Exception:
+        pass
+
+
+def collect():
+    """Return the totals of all processes, this one from memory."""
+    snapshots = [_snapshot()]
+    directory = _metrics_dir()
+    if directory is not None and directory.is_dir():
+        own = _own_file(directory)
+        with _folding_lock(directory, exclusive=False):
+            exited = _read_json(directory / EXITED_FILE)
+            folded = set()
+            if exited is not None:
+                snapshots.append(exited)
+                folded.update(exited['folded'])
+            for path in directory.glob('*.json'):
+                if path == own or path.name == EXITED_FILE or path.name in folded:
+                    continue
+                snapshot = _read_json(path)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+    return _merge(snapshots)
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (
+        (label, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for label, value in pairs
+    )
+    return '{' + ','.join(f'{label}="{value}"' for label, value in escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics():
+    """Return the merged metrics in the Prometheus text exposition format."""
+    counters, histograms = collect()
+    hits = counters.get(_key('cache_requests_total', {'result': 'hit'}), 0)
+    misses = counters.get(_key('cache_requests_total', {'result': 'miss'}), 0)
+    gauges = {_key('cache_hit_ratio', {}): hits / (hits + misses) if hits + misses else 0.0}
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        full_name = f'{PREFIX}_{name}'
+        lines += [f'# HELP {full_name} {help_text}', f'# TYPE {full_name} {kind}']
+        if kind == 'histogram':
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, values):
+                    cumulative += count
+                    lines.append(f'{full_name}_bucket{_labels(labels, le=_number(bound))} {cumulative}')
+                lines.append(f'{full_name}_bucket{_labels(labels, le="+Inf")} {values[-2]}')
+                lines.append(f'{full_name}_count{_labels(labels)} {values[-2]}')
+                lines.append(f'{full_name}_sum{_labels(labels)} {_number(float(values[-1]))}')
+            continue
+        values = counters if kind == 'counter' else gauges
+        for (metric, labels), value in sorted(values.items()):
+            if metric == name:
+                lines.append(f'{full_name}{_labels(labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Count requests, their latency and their queries per URL name."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with request_sample() as sample:
+            start = perf_counter()
+            response = self.get_response(request)
+        return self.finish(request, sample.queries, perf_counter() - start, response)
+
+    async def __acall__(self, request):
+        with request_sample() as sample:
+            start = perf_counter()
+            response = await self.get_response(request)
+        return self.finish(request, sample.queries, perf_counter() - start, response)
+
+    def finish(self, request, queries, elapsed, response):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unresolved>'
+        increment('http_requests_total', view=view, method=request.method, status=response.status_code)
+        observe('http_request_duration_seconds', elapsed, view=view)
+        if queries:
+            increment('db_queries_total', queries, view=view)
+        flush()
+        return response
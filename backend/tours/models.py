@@ -1,12 +1,51 @@
 """
 Models for VR Tours platform.
 """
-from django.db import models
+import uuid
+
+from django.db import models, router, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.urls import reverse
 
+from .storage import get_media_storage
+
+
+class StoredCounterMixin:
+    """
+    Leave ``counter_field`` out when saving an existing row, so a stale
+    in-memory count never overwrites the ``F()`` updates of ``counters.py``.
+
+    Such saves run as ``update_fields`` saves of every other field, which
+    differ from a plain ``save()`` in two ways: saving an instance whose row
+    was deleted raises ``DatabaseError`` instead of inserting it again (pass
+    ``force_insert=True`` to re-create it), and ``pre_save``/``post_save``
+    receivers get the field list as ``update_fields``.
+    """
+    counter_field = None
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != self.counter_field
+            ]
+        super().save(*args, **kwargs)
+
+
+class CountedRowMixin:
+    """
+    Save rows counted by a parent's stored counter in a transaction, so the
+    previous state ``signals.py`` locks before the save stays locked until
+    the counters were adjusted.
+    """
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
 
-class Tour(models.Model):
+class Tour(StoredCounterMixin, models.Model):
     """
     A tour containing multiple connected scenes.
     """
@@ -14,33 +53,49 @@ class Tour(models.Model):
     description = models.TextField(blank=True, help_text="Tour description")
     thumbnail = models.ImageField(
         upload_to='tours/thumbnails/', 
+        storage=get_media_storage,
         blank=True, 
         null=True,
         help_text="Tour thumbnail image"
     )
+    # Sized/re-encoded copies of the image fields (see variants.py)
+    image_variants = models.JSONField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="Generated image variants per image field"
+    )
     is_active = models.BooleanField(default=True, help_text="Is tour available to view?")
+    # Kept up to date by signals (see counters.py)
+    scene_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of active scenes"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        # Keyset pagination of the catalogue seeks on (created_at, id) or (scene_count, id)
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['scene_count', 'id']),
+        ]
         verbose_name = "Tour"
         verbose_name_plural = "Tours"
 
+    counter_field = 'scene_count'
+
     def __str__(self):
         return self.title
 
-    @property
-    def scene_count(self):
-        """Return the number of scenes in this tour."""
-        return self.scenes.count()
-
     def get_first_scene(self):
-        """Get the first scene of the tour for starting navigation."""
-        return self.scenes.first()
+        """Get the first active scene of the tour for starting navigation."""
+        return self.scenes.filter(is_active=True).order_by('order').first()
 
 
-class Scene(models.Model):
+class Scene(CountedRowMixin, StoredCounterMixin, models.Model):
     """
     A 360° panoramic scene within a tour.
     """
@@ -56,12 +111,14 @@ class Scene(models.Model):
     # 360° panorama image (required)
     panorama_image = models.ImageField(
         upload_to='scenes/panoramas/',
+        storage=get_media_storage,
         help_text="360° panoramic image for this scene"
     )
     
     # Optional voiceover audio
     voiceover_audio = models.FileField(
         upload_to='scenes/audio/',
+        storage=get_media_storage,
         blank=True,
         null=True,
         help_text="Optional MP3 voiceover for this scene"
@@ -82,6 +139,7 @@ class Scene(models.Model):
     # Optional map/layout image
     map_image = models.ImageField(
         upload_to='scenes/maps/',
+        storage=get_media_storage,
         blank=True,
         null=True,
         help_text="Optional map or layout image for this scene"
@@ -93,7 +151,53 @@ class Scene(models.Model):
         help_text="Order of this scene within the tour"
     )
     
+    # Sized/re-encoded copies of the image fields (see variants.py)
+    image_variants = models.JSONField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="Generated image variants per image field"
+    )
+    
+    # Background media processing state (see jobs.py)
+    PROCESSING_PENDING = 'pending'
+    PROCESSING_RUNNING = 'processing'
+    PROCESSING_READY = 'ready'
+    PROCESSING_FAILED = 'failed'
+    PROCESSING_CHOICES = [
+        (PROCESSING_PENDING, 'Pending'),
+        (PROCESSING_RUNNING, 'Processing'),
+        (PROCESSING_READY, 'Ready'),
+        (PROCESSING_FAILED, 'Failed'),
+    ]
+    processing_status = models.CharField(
+        max_length=20,
+        choices=PROCESSING_CHOICES,
+        default=PROCESSING_READY,
+        editable=False,
+        help_text="State of background processing of this scene's media"
+    )
+    processing_error = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="Last media processing error, if any"
+    )
+    
+    # Multi-resolution cube tiles generated from the panorama (see tiling.py)
+    tile_manifest = models.JSONField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="Manifest of the generated panorama tile pyramid"
+    )
+    
     is_active = models.BooleanField(default=True, help_text="Is scene available to view?")
+    # Kept up to date by signals (see counters.py)
+    hotspot_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of active hotspots leaving this scene"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -103,16 +207,13 @@ class Scene(models.Model):
         verbose_name_plural = "Scenes"
         unique_together = ['tour', 'order']
 
+    counter_field = 'hotspot_count'
+
     def __str__(self):
         return f"{self.tour.title} - {self.title}"
 
-    @property
-    def hotspot_count(self):
-        """Return the number of hotspots in this scene."""
-        return self.source_hotspots.count()
 
-
-class Hotspot(models.Model):
+class Hotspot(CountedRowMixin, models.Model):
     """
     Interactive hotspot that connects two scenes.
     """
@@ -159,6 +260,12 @@ class Hotspot(models.Model):
     )
     
     is_active = models.BooleanField(default=True, help_text="Is hotspot clickable?")
+    # Incremented with F() by the click endpoint, never through save()
+    click_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Times visitors followed this hotspot"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -183,4 +290,107 @@ class Hotspot(models.Model):
             if self.source_scene == self.target_scene:
                 raise ValidationError(
                     "Source and target scenes cannot be the same."
-                ) 
\ No newline at end of file
+                )
+
+
+class Job(models.Model):
+    """
+    A unit of background work in the database-backed job queue.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100, help_text="Registered task name")
+    key = models.CharField(
+        max_length=200,
+        blank=True,
+        db_index=True,
+        help_text="Deduplication key; only one pending job per key is queued"
+    )
+    payload = models.JSONField(default=dict, blank=True, help_text="Task keyword arguments")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(help_text="Earliest time the job may run")
+    locked_at = models.DateTimeField(null=True, blank=True, help_text="When a worker claimed the job")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class ChunkedUpload(models.Model):
+    """
+    A resumable upload of a large scene media file, received in chunks.
+    """
+    STATUS_OPEN = 'open'
+    STATUS_COMPLETE = 'complete'
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'Open'),
+        (STATUS_COMPLETE, 'Complete'),
+    ]
+
+    FIELD_CHOICES = [
+        ('panorama_image', 'Panorama image'),
+        ('voiceover_audio', 'Voiceover audio'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    scene = models.ForeignKey(
+        Scene,
+        on_delete=models.CASCADE,
+        related_name='chunked_uploads',
+        help_text="Scene the file is attached to on completion"
+    )
+    field = models.CharField(max_length=30, choices=FIELD_CHOICES, help_text="Scene field to attach to")
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField(help_text="Total size in bytes")
+    offset = models.PositiveBigIntegerField(default=0, help_text="Bytes received so far")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_OPEN)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Chunked upload"
+        verbose_name_plural = "Chunked uploads"
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+class StoredFile(models.Model):
+    """
+    Reference count of a content-addressed media file (see storage.py).
+    """
+    name = models.CharField(max_length=255, unique=True, help_text="Storage name")
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0, help_text="Model fields referencing the file")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Stored file"
+        verbose_name_plural = "Stored files"
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
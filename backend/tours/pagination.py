@@ -0,0 +1,200 @@
+"""
+Keyset (cursor) pagination for VR Tours platform.
+
+Page links carry the sort key of the row they continue from, and the next
+page is fetched with ``WHERE (created_at, id) < (...)`` instead of an
+``OFFSET``, so a deep page costs the same as the first one, no ``COUNT(*)``
+is run, and rows inserted while a client pages don't shift or repeat
+results. Unlike DRF's ``CursorPagination``, which positions on the first
+ordering field plus an offset, the cursor holds every ordering field with
+``id`` as the final tie-breaker, so ``?ordering=`` by non-unique fields
+such as ``title`` or ``scene_count`` pages exactly as well.
+"""
+import base64
+import binascii
+import datetime
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over the view ordering with ``id`` as tie-breaker.
+
+    ``ordering`` is used when the view has no ``OrderingFilter`` or the
+    request doesn't pick an ordering.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views, fetching with the async ORM."""
+        queryset = self.page_queryset(queryset, request, view)
+        return self.set_page([row async for row in queryset])
+
+    def page_queryset(self, queryset, request, view=None):
+        """Return the (unevaluated) queryset of the requested page plus one row."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        position, self.reverse = self.decode_cursor(request)
+        self.has_cursor = position is not None
+        if position is not None:
+            position = self.clean_position(queryset.model, position)
+
+        # A previous page is read backwards from the cursor, then flipped
+        ordering = [_flip(field) for field in self.ordering] if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(_after(ordering, position))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        """Keep the page out of the fetched rows and work out its links."""
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = self.has_cursor, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.has_cursor
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        """Return the requested ordering with ``id`` appended as tie-breaker."""
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        ordering = list(ordering or self.ordering)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return ordering
+
+    def decode_cursor(self, request):
+        """Return ``(position, reverse)`` from the request, or ``(None, False)``."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            position, reverse = cursor['p'], bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            # Stale cursor from a different ?ordering=
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def clean_position(self, model, position):
+        """Convert cursor values to their fields' types; tampered ones are not found."""
+        cleaned = []
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            model_field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            try:
+                cleaned.append(model_field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if cleaned[-1] is None:
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def encode_cursor(self, row, reverse):
+        position = [_key_value(row, field.lstrip('-')) for field in self.ordering]
+        cursor = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(cursor.encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Past the end: step back from the start
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class SceneKeysetPagination(KeysetPagination):
+    """Scenes page in viewing order."""
+
+    ordering = ('order', 'id')
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _key_value(row, field):
+    value = getattr(row, field)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def _after(ordering, position):
+    """
+    Build the row-value comparison "sort key comes after ``position``".
+
+    ``(a, b, c) > (x, y, z)`` expands to
+    ``a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)``, with
+    ``<`` for descending fields.
+    """
+    clauses = []
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {ordering[i].lstrip('-'): position[i] for i in range(index)}
+        clauses.append(Q(**equal, **{f'{name}__{lookup}': position[index]}))
+    return reduce(or_, clauses)
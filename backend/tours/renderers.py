@@ -0,0 +1,92 @@
+"""
+Response renderers for VR Tours platform.
+
+``ORJSONRenderer`` produces the same JSON as DRF's ``JSONRenderer`` with
+orjson, which encodes the float-heavy navigation and hotspot payloads
+several times faster. ``MessagePackRenderer`` answers
+``Accept: application/msgpack`` with a smaller binary encoding. Both
+libraries are optional: without orjson the JSON renderer falls back to the
+standard library, and ``settings`` only enables MessagePack when msgpack is
+installed.
+"""
+from math import isfinite
+
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .timing import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_encoder = JSONEncoder()
+
+
+def _default(value):
+    """Encode what the fast encoders don't know natively (lazy strings, Decimal...)."""
+    return _encoder.default(value)
+
+
+def _has_non_finite(data):
+    """Return whether ``data`` holds a NaN or infinite float."""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson when it is installed.
+
+    orjson writes NaN and infinities as ``null``; like DRF's strict mode this
+    refuses them instead, looking for them only when the output has a
+    ``null``. Non-strict mode writes them as literals, which only the
+    standard library can.
+    """
+
+    @timed('render')
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        # UTC datetimes end in "Z", as with DRF's encoder
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            # orjson only indents by two spaces
+            options |= orjson.OPT_INDENT_2
+        content = orjson.dumps(data, default=_default, option=options)
+        if b'null' in content and _has_non_finite(data):
+            raise ValueError("Out of range float values are not JSON compliant")
+        return content
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack renderer, selected with ``Accept: application/msgpack``."""
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    @timed('render')
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True)
@@ -0,0 +1,156 @@
+"""
+Read replica routing for VR Tours platform.
+
+``ReplicaRouter`` sends the reads of safe (GET/HEAD/OPTIONS) requests to
+the API views of the ``tours`` app to the aliases in ``DATABASE_REPLICAS``
+and everything else to ``default``: writes, reads of unsafe requests, of
+other views (the admin, where editors read what they just wrote) and of
+middleware running before the view is resolved, and all code running
+outside a request, such as the job worker and management commands. Once a
+request writes, the rest of it reads from the primary, and
+``ReplicaPinningMiddleware`` sets a cookie that keeps the client's reads on
+the primary for ``REPLICA_PIN_SECONDS``, long enough for the replicas to
+catch up, so editors always see their own changes.
+
+State lives in a context variable, so it follows a request through threads
+(``sync_to_async``) and async views alike.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PIN_COOKIE = 'db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# URL namespaces whose views may read from replicas
+REPLICA_APP_NAMES = ('tours',)
+
+# None: primary only. Otherwise a dict {'replica': bool, 'wrote': bool}
+_state = ContextVar('replica_routing', default=None)
+
+
+def _replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary inside the block, e.g. when building payloads
+    that are cached for everyone and must not come from a lagging replica.
+    """
+    state = _state.get()
+    if state is None or not state['replica']:
+        yield
+        return
+    state['replica'] = False
+    try:
+        yield
+    finally:
+        state['replica'] = not state['wrote']
+
+
+def replica_pinning_exempt(view):
+    """Don't pin clients to the primary after this view writes (e.g. counters)."""
+    view.replica_pinning_exempt = True
+    return view
+
+
+class ReplicaRouter:
+    """Route reads to a random replica when the current request allows it."""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = _replicas()
+        if state is None or not state['replica'] or not replicas:
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Read your own writes for the rest of the request
+            state['replica'] = False
+            state['wrote'] = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas copy the primary's schema
+        return db not in _replicas()
+
+
+class ReplicaPinningMiddleware:
+    """Set up replica routing per request and pin writers to the primary."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, state, response)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, state, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.replica_pinning_exempt = getattr(view_func, 'replica_pinning_exempt', False)
+        state = _state.get()
+        if state is not None and not state['wrote'] and _reads_from_replica(request):
+            state['replica'] = True
+
+    def start(self, request):
+        # Reads go to the primary until process_view knows the view
+        return {'replica': False, 'wrote': False}
+
+    def finish(self, request, state, response):
+        if state['wrote'] and not getattr(request, 'replica_pinning_exempt', False):
+            seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                PIN_COOKIE, str(int(time.time() + seconds)),
+                max_age=seconds, httponly=True, samesite='Lax'
+            )
+        return response
+
+
+def _reads_from_replica(request):
+    match = request.resolver_match
+    return (
+        request.method in SAFE_METHODS
+        and match is not None
+        and any(app_name in REPLICA_APP_NAMES for app_name in match.app_names)
+        and _pinned_until(request) <= time.time()
+    )
+
+
+def _pinned_until(request):
+    try:
+        return int(request.COOKIES.get(PIN_COOKIE, 0))
+    except ValueError:
+        return 0
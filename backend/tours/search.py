@@ -0,0 +1,344 @@
+"""
+Full-text search over tours, scenes and hotspot labels.
+
+Every searchable object is one document in the ``tours_search`` index:
+an SQLite FTS5 virtual table, or a table with a GIN-indexed ``tsvector``
+column on PostgreSQL. Other database backends have no index and fall back
+to ``icontains`` filtering. The index is created after ``migrate``, kept up
+to date by signals (see ``signals.py``) and rebuilt from scratch with
+``manage.py rebuild_search_index``.
+
+A document's key encodes its kind (``key = object_id * 4 + kind``), so an
+object is replaced or removed through the primary key without scanning.
+Documents keep the ids of their tour and scene, and inactive tours and
+scenes are filtered out when querying, so toggling ``is_active`` on a tour
+doesn't rewrite the documents of all its scenes.
+"""
+import html
+import re
+from itertools import chain
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router, transaction
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+from .models import Tour, Scene, Hotspot
+
+INDEX_TABLE = 'tours_search'
+KINDS = {'tour': 1, 'scene': 2, 'hotspot': 3}
+KIND_NAMES = {code: name for name, code in KINDS.items()}
+MAX_TERMS = 8
+
+# Private-use characters mark matches, so the text can be escaped afterwards
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+
+def document_key(kind, object_id):
+    return object_id * 4 + KINDS[kind]
+
+
+def search_terms(query):
+    """Split a user query into plain word terms (no query syntax)."""
+    return re.findall(r'\w+', query or '')[:MAX_TERMS]
+
+
+def highlight(text):
+    """HTML-escape ``text`` and turn the match markers into ``<mark>`` tags."""
+    return html.escape(text or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+class SQLiteBackend:
+    """FTS5 index ranked with BM25, title matches weighted 10 to 1."""
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+            "title, body, tour_id UNINDEXED, scene_id UNINDEXED, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {INDEX_TABLE}")
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(
+            f"DELETE FROM {INDEX_TABLE} WHERE rowid = %s", [(row[0],) for row in rows]
+        )
+        cursor.executemany(
+            f"INSERT INTO {INDEX_TABLE} (rowid, title, body, tour_id, scene_id) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            rows
+        )
+
+    def delete(self, cursor, keys):
+        cursor.executemany(f"DELETE FROM {INDEX_TABLE} WHERE rowid = %s", [(key,) for key in keys])
+
+    def match_expression(self, terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def matching_ids_sql(self, kind, terms):
+        return (
+            f"SELECT rowid / 4 FROM {INDEX_TABLE} "
+            f"WHERE {INDEX_TABLE} MATCH %s AND rowid %% 4 = %s",
+            [self.match_expression(terms), KINDS[kind]]
+        )
+
+    def search(self, cursor, terms, kinds, limit):
+        visible, visible_params = _visible_clause()
+        cursor.execute(
+            f"SELECT rowid, tour_id, scene_id, bm25({INDEX_TABLE}, 10.0, 1.0) AS rank, "
+            f"highlight({INDEX_TABLE}, 0, %s, %s), "
+            f"snippet({INDEX_TABLE}, 1, %s, %s, '…', 16) "
+            f"FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s AND {visible} "
+            f"AND rowid %% 4 IN ({', '.join(['%s'] * len(kinds))}) "
+            "ORDER BY rank LIMIT %s",
+            [MARK_START, MARK_END, MARK_START, MARK_END, self.match_expression(terms),
+             *visible_params, *kinds, limit]
+        )
+        # BM25 is lower for better matches; report higher-is-better scores
+        return [
+            (key, tour_id, scene_id, -rank, title, body)
+            for key, tour_id, scene_id, rank, title, body in cursor.fetchall()
+        ]
+
+
+class PostgresBackend:
+    """``tsvector`` index with the title weighted above the body."""
+
+    config = 'simple'
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ("
+            "key bigint PRIMARY KEY, title text NOT NULL, body text NOT NULL, "
+            "tour_id integer NOT NULL, scene_id integer, "
+            "document tsvector GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('{self.config}', title), 'A') || "
+            f"setweight(to_tsvector('{self.config}', body), 'B')) STORED)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {INDEX_TABLE}_document "
+            f"ON {INDEX_TABLE} USING gin (document)"
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f"TRUNCATE {INDEX_TABLE}")
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {INDEX_TABLE} (key, title, body, tour_id, scene_id) "
+            "VALUES (%s, %s, %s, %s, %s) ON CONFLICT (key) DO UPDATE SET "
+            "title = EXCLUDED.title, body = EXCLUDED.body, "
+            "tour_id = EXCLUDED.tour_id, scene_id = EXCLUDED.scene_id",
+            rows
+        )
+
+    def delete(self, cursor, keys):
+        cursor.execute(f"DELETE FROM {INDEX_TABLE} WHERE key = ANY(%s)", [list(keys)])
+
+    def match_expression(self, terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def matching_ids_sql(self, kind, terms):
+        return (
+            f"SELECT key / 4 FROM {INDEX_TABLE} "
+            f"WHERE document @@ to_tsquery('{self.config}', %s) AND key %% 4 = %s",
+            [self.match_expression(terms), KINDS[kind]]
+        )
+
+    def search(self, cursor, terms, kinds, limit):
+        visible, visible_params = _visible_clause()
+        options = f'StartSel={MARK_START}, StopSel={MARK_END}'
+        # Headlines are expensive, so only compute them for the ranked page
+        cursor.execute(
+            "SELECT key, tour_id, scene_id, rank, "
+            f"ts_headline('{self.config}', title, query, %s), "
+            f"ts_headline('{self.config}', body, query, %s) "
+            "FROM ("
+            "SELECT key, tour_id, scene_id, title, body, query, ts_rank_cd(document, query) AS rank "
+            f"FROM {INDEX_TABLE}, to_tsquery('{self.config}', %s) AS query "
+            f"WHERE document @@ query AND {visible} "
+            f"AND key %% 4 IN ({', '.join(['%s'] * len(kinds))}) "
+            "ORDER BY rank DESC LIMIT %s"
+            ") AS ranked ORDER BY rank DESC",
+            [f'{options}, HighlightAll=true', f'{options}, MaxWords=24, MinWords=8',
+             self.match_expression(terms), *visible_params, *kinds, limit]
+        )
+        return cursor.fetchall()
+
+
+def _visible_clause():
+    """SQL keeping documents whose tour, and scene if any, are active."""
+    tours = connection.ops.quote_name(Tour._meta.db_table)
+    scenes = connection.ops.quote_name(Scene._meta.db_table)
+    return (
+        f"tour_id IN (SELECT id FROM {tours} WHERE is_active = %s) "
+        f"AND (scene_id IS NULL OR scene_id IN (SELECT id FROM {scenes} WHERE is_active = %s))",
+        [True, True]
+    )
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend(using=DEFAULT_DB_ALIAS):
+    """Return the index backend for the database ``using``, or None."""
+    backend = BACKENDS.get(connections[using].vendor)
+    return backend() if backend else None
+
+
+def create_index(using=DEFAULT_DB_ALIAS):
+    """Create the index table in the database ``using`` if it is missing."""
+    backend = get_backend(using)
+    if backend is not None:
+        with connections[using].cursor() as cursor:
+            backend.create(cursor)
+
+
+def _tour_row(tour):
+    return (document_key('tour', tour.pk), tour.title, tour.description or '', tour.pk, None)
+
+
+def _scene_row(scene):
+    return (document_key('scene', scene.pk), scene.title, scene.description or '', scene.tour_id, scene.pk)
+
+
+def _hotspot_row(hotspot, tour_id):
+    return (document_key('hotspot', hotspot.pk), hotspot.label, '', tour_id, hotspot.source_scene_id)
+
+
+def index_tours(tours):
+    _write([_tour_row(tour) for tour in tours], [])
+
+
+def index_scenes(scenes):
+    _write([_scene_row(scene) for scene in scenes], [])
+
+
+def index_hotspots(hotspots, scene_tours=None):
+    """
+    Index hotspot labels; inactive or unlabelled hotspots are removed.
+
+    ``scene_tours`` maps source scene ids to tour ids when the caller
+    already has them, otherwise they are looked up in one query.
+    """
+    hotspots = list(hotspots)
+    if scene_tours is None:
+        scene_tours = dict(Scene.objects.filter(
+            id__in={hotspot.source_scene_id for hotspot in hotspots}
+        ).order_by().values_list('id', 'tour_id'))
+    rows, removed = [], []
+    for hotspot in hotspots:
+        if hotspot.is_active and hotspot.label and hotspot.source_scene_id in scene_tours:
+            rows.append(_hotspot_row(hotspot, scene_tours[hotspot.source_scene_id]))
+        else:
+            removed.append(document_key('hotspot', hotspot.pk))
+    _write(rows, removed)
+
+
+def remove_documents(kind, object_ids):
+    _write([], [document_key(kind, object_id) for object_id in object_ids])
+
+
+def _write(rows, removed):
+    backend = get_backend()
+    if backend is None or not (rows or removed):
+        return
+    with connection.cursor() as cursor:
+        if removed:
+            backend.delete(cursor, removed)
+        if rows:
+            backend.upsert(cursor, rows)
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def rebuild_index(batch_size=2000):
+    """Empty the index and index every tour, scene and hotspot again."""
+    backend = get_backend()
+    if backend is None:
+        return 0
+
+    hotspots = Hotspot.objects.filter(is_active=True).exclude(label='').annotate(
+        scene_tour_id=F('source_scene__tour_id')
+    ).order_by()
+    rows = chain(
+        (_tour_row(tour) for tour in Tour.objects.order_by().iterator(chunk_size=batch_size)),
+        (_scene_row(scene) for scene in Scene.objects.order_by().iterator(chunk_size=batch_size)),
+        (
+            _hotspot_row(hotspot, hotspot.scene_tour_id)
+            for hotspot in hotspots.iterator(chunk_size=batch_size)
+        ),
+    )
+    count = 0
+    # Searches keep seeing the old index until the new one is complete
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            backend.create(cursor)
+            backend.clear(cursor)
+        for batch in _batched(rows, batch_size):
+            _write(batch, [])
+            count += len(batch)
+    return count
+
+
+def search(query, kinds=None, limit=20):
+    """
+    Return ranked matches for ``query`` as dicts, best first.
+
+    Titles come back with every match wrapped in ``<mark>``; ``snippet`` is
+    the best matching excerpt of the description.
+    """
+    terms = search_terms(query)
+    backend = get_backend()
+    if not terms or backend is None:
+        return []
+    codes = [KINDS[kind] for kind in (kinds or KINDS)]
+    with connections[router.db_for_read(Tour)].cursor() as cursor:
+        rows = backend.search(cursor, terms, codes, limit)
+    return [
+        {
+            'type': KIND_NAMES[key % 4],
+            'id': key // 4,
+            'tour': tour_id,
+            'scene': scene_id,
+            'score': score,
+            'title': highlight(title),
+            'snippet': highlight(body),
+        }
+        for key, tour_id, scene_id, score, title, body in rows
+    ]
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    ``?search=`` filter answered from the full-text index.
+
+    Falls back to DRF's ``icontains`` search on databases without one.
+    """
+
+    search_kind = 'tour'
+
+    def filter_queryset(self, request, queryset, view):
+        backend = get_backend()
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+        terms = search_terms(' '.join(self.get_search_terms(request)))
+        if not terms:
+            return queryset
+        sql, params = backend.matching_ids_sql(self.search_kind, terms)
+        return queryset.filter(pk__in=RawSQL(sql, params))
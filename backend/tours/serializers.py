@@ -1,11 +1,73 @@
 """
 Django REST Framework serializers for VR Tours platform.
 """
+from django.conf import settings
 from rest_framework import serializers
-from .models import Tour, Scene, Hotspot
+from .graph import preload_asset, rank_neighbours
+from .models import Tour, Scene, Hotspot, ChunkedUpload
+from .tiling import tile_urls
+from .timing import TimedSerializerMixin
+from .variants import variant_url, variant_urls
 
+ALLOWED_AUDIO_TYPES = ['audio/mpeg', 'audio/mp3', 'audio/wav']
 
-class HotspotSerializer(serializers.ModelSerializer):
+
+def panorama_max_size():
+    """Maximum panorama upload size in bytes."""
+    return getattr(settings, 'PANORAMA_MAX_UPLOAD_SIZE', 200 * 1024 * 1024)
+
+
+def voiceover_max_size():
+    """Maximum voiceover upload size in bytes."""
+    return getattr(settings, 'VOICEOVER_MAX_UPLOAD_SIZE', 50 * 1024 * 1024)
+
+
+class ImageVariantField(serializers.Field):
+    """
+    Read-only URL of an image variant.
+
+    The format is negotiated against the request's ``Accept`` header, falling
+    back to JPEG, and to the original file while variants are missing. An
+    API request usually accepts ``application/json`` only, which gets JPEG;
+    clients wanting modern formats pick them from the matching
+    ``ImageVariantsField`` (e.g. ``thumbnail_variants``) instead.
+    """
+    
+    def __init__(self, image_field, preset, **kwargs):
+        self.image_field = image_field
+        self.preset = preset
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+    
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        accept = request.META.get('HTTP_ACCEPT') if request else None
+        url = variant_url(instance, self.image_field, self.preset, accept)
+        if url and request:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class ImageVariantsField(serializers.Field):
+    """Read-only ``{format: url}`` of an image variant, for ``<picture>`` sources."""
+    
+    def __init__(self, image_field, preset, **kwargs):
+        self.image_field = image_field
+        self.preset = preset
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+    
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        urls = variant_urls(instance, self.image_field, self.preset)
+        if urls and request:
+            return {fmt: request.build_absolute_uri(url) for fmt, url in urls.items()}
+        return urls
+
+
+class HotspotSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Hotspot model."""
     
     target_scene_title = serializers.CharField(source='target_scene.title', read_only=True)
@@ -26,10 +88,12 @@ class HotspotSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class SceneListSerializer(serializers.ModelSerializer):
+class SceneListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Simplified serializer for Scene in list views."""
     
     hotspot_count = serializers.ReadOnlyField()
+    panorama_thumbnail = ImageVariantsField('panorama_image', 'card')
+    map_thumbnail = ImageVariantsField('map_image', 'card')
     
     class Meta:
         model = Scene
@@ -38,19 +102,22 @@ class SceneListSerializer(serializers.ModelSerializer):
             'title',
             'description',
             'panorama_image',
+            'panorama_thumbnail',
             'map_image',
+            'map_thumbnail',
             'order',
             'hotspot_count',
             'is_active',
         ]
 
 
-class SceneDetailSerializer(serializers.ModelSerializer):
+class SceneDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Detailed serializer for Scene with hotspots."""
     
     hotspots = HotspotSerializer(source='source_hotspots', many=True, read_only=True)
     hotspot_count = serializers.ReadOnlyField()
     tour_title = serializers.CharField(source='tour.title', read_only=True)
+    neighbours = serializers.SerializerMethodField()
     
     class Meta:
         model = Scene
@@ -68,16 +135,36 @@ class SceneDetailSerializer(serializers.ModelSerializer):
             'order',
             'hotspots',
             'hotspot_count',
+            'neighbours',
             'is_active',
             'created_at',
             'updated_at',
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    def get_neighbours(self, obj):
+        """Scenes one click away, likeliest next first, with the asset to preload."""
+        request = self.context.get('request')
+        neighbours = []
+        for scene, clicks in rank_neighbours(obj):
+            url = preload_asset(scene)
+            if url and request:
+                url = request.build_absolute_uri(url)
+            neighbours.append({
+                'id': scene.id,
+                'title': scene.title,
+                'clicks': clicks,
+                'preload_url': url,
+            })
+        return neighbours
 
 
-class TourListSerializer(serializers.ModelSerializer):
+class TourListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Simplified serializer for Tour in list views."""
     
+    # Cards only need a small rendition, not the original upload
+    thumbnail = ImageVariantField('thumbnail', 'card')
+    thumbnail_variants = ImageVariantsField('thumbnail', 'card')
     scene_count = serializers.ReadOnlyField()
     first_scene = serializers.SerializerMethodField()
     
@@ -88,6 +175,7 @@ class TourListSerializer(serializers.ModelSerializer):
             'title',
             'description',
             'thumbnail',
+            'thumbnail_variants',
             'scene_count',
             'first_scene',
             'is_active',
@@ -96,14 +184,18 @@ class TourListSerializer(serializers.ModelSerializer):
     
     def get_first_scene(self, obj):
         """Get the first scene ID for starting the tour."""
+        if hasattr(obj, 'first_scene_id'):
+            # Annotated by TourListAPIView with a subquery
+            return obj.first_scene_id
         first_scene = obj.get_first_scene()
         return first_scene.id if first_scene else None
 
 
-class TourDetailSerializer(serializers.ModelSerializer):
+class TourDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Detailed serializer for Tour with scenes."""
     
     scenes = SceneListSerializer(many=True, read_only=True)
+    thumbnail_variants = ImageVariantsField('thumbnail', 'card')
     scene_count = serializers.ReadOnlyField()
     first_scene = serializers.SerializerMethodField()
     
@@ -114,6 +206,7 @@ class TourDetailSerializer(serializers.ModelSerializer):
             'title',
             'description',
             'thumbnail',
+            'thumbnail_variants',
             'scenes',
             'scene_count',
             'first_scene',
@@ -125,7 +218,12 @@ class TourDetailSerializer(serializers.ModelSerializer):
     
     def get_first_scene(self, obj):
         """Get the first scene data for starting the tour."""
-        first_scene = obj.get_first_scene()
+        if 'scenes' in getattr(obj, '_prefetched_objects_cache', {}):
+            # Reuse the prefetched (active, ordered) scenes instead of querying again
+            scenes = obj.scenes.all()
+            first_scene = scenes[0] if scenes else None
+        else:
+            first_scene = obj.get_first_scene()
         if first_scene:
             return {
                 'id': first_scene.id,
@@ -135,7 +233,97 @@ class TourDetailSerializer(serializers.ModelSerializer):
         return None
 
 
-class HotspotCreateSerializer(serializers.ModelSerializer):
+class BundleHotspotSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Hotspot entry of a tour bundle, linking scenes by id."""
+    
+    class Meta:
+        model = Hotspot
+        fields = [
+            'id',
+            'source_scene',
+            'target_scene',
+            'yaw',
+            'pitch',
+            'label',
+            'size',
+            'color',
+        ]
+
+
+class BundleSceneSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Scene entry of a tour bundle with hotspot ids instead of nested hotspots."""
+    
+    hotspots = serializers.SerializerMethodField()
+    hotspot_count = serializers.ReadOnlyField()
+    panorama_thumbnail = ImageVariantsField('panorama_image', 'card')
+    map_thumbnail = ImageVariantsField('map_image', 'card')
+    tiles = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Scene
+        fields = [
+            'id',
+            'title',
+            'description',
+            'panorama_image',
+            'panorama_thumbnail',
+            'voiceover_audio',
+            'initial_yaw',
+            'initial_pitch',
+            'map_image',
+            'map_thumbnail',
+            'order',
+            'hotspots',
+            'hotspot_count',
+            'tiles',
+            'processing_status',
+            'created_at',
+            'updated_at',
+        ]
+    
+    def get_hotspots(self, obj):
+        """Ids of the prefetched active hotspots leaving this scene."""
+        return [hotspot.id for hotspot in obj.source_hotspots.all()]
+    
+    def get_tiles(self, obj):
+        """Tile pyramid description, or None until tiles are generated."""
+        return tile_urls(obj.tile_manifest) if obj.tile_manifest else None
+
+
+class TourBundleSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Tour entry of a tour bundle; expects the active scenes in the context."""
+    
+    thumbnail_variants = ImageVariantsField('thumbnail', 'card')
+    scene_count = serializers.ReadOnlyField()
+    scenes = serializers.SerializerMethodField()
+    first_scene = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Tour
+        fields = [
+            'id',
+            'title',
+            'description',
+            'thumbnail',
+            'thumbnail_variants',
+            'scenes',
+            'scene_count',
+            'first_scene',
+            'created_at',
+            'updated_at',
+        ]
+    
+    def get_scenes(self, obj):
+        """Ids of the active scenes in viewing order."""
+        return [scene.id for scene in self.context['scenes']]
+    
+    def get_first_scene(self, obj):
+        """Id of the scene the tour starts at."""
+        scenes = self.context['scenes']
+        return scenes[0].id if scenes else None
+
+
+class HotspotCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for creating/updating hotspots."""
     
     class Meta:
@@ -158,7 +346,7 @@ class HotspotCreateSerializer(serializers.ModelSerializer):
         
         if source_scene and target_scene:
             # Check if scenes belong to the same tour
-            if source_scene.tour != target_scene.tour:
+            if source_scene.tour_id != target_scene.tour_id:
                 raise serializers.ValidationError(
                     "Source and target scenes must belong to the same tour."
                 )
@@ -172,12 +360,77 @@ class HotspotCreateSerializer(serializers.ModelSerializer):
         return data
 
 
-class SceneCreateSerializer(serializers.ModelSerializer):
+class HotspotBulkItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    One item of a bulk hotspot write.
+
+    Scenes are taken as plain ids so validating a batch doesn't fetch each
+    scene; ``validate_hotspot_batch`` checks them all with one query. Items
+    with an ``id`` update that hotspot, the others create one.
+    """
+    
+    id = serializers.IntegerField(required=False)
+    source_scene = serializers.IntegerField(source='source_scene_id')
+    target_scene = serializers.IntegerField(source='target_scene_id')
+    
+    class Meta:
+        model = Hotspot
+        fields = [
+            'id',
+            'source_scene',
+            'target_scene',
+            'yaw',
+            'pitch',
+            'label',
+            'size',
+            'color',
+            'is_active',
+        ]
+
+
+def validate_hotspot_batch(items):
+    """
+    Check the scene links of validated bulk items.
+
+    ``items`` maps the request index to validated data. Returns the per-index
+    errors and the tour id of every referenced scene, looked up with a
+    single query.
+    """
+    scene_ids = set()
+    for data in items.values():
+        scene_ids.update((data['source_scene_id'], data['target_scene_id']))
+    scene_tours = dict(
+        Scene.objects.filter(id__in=scene_ids).order_by().values_list('id', 'tour_id')
+    )
+    
+    errors = {}
+    for index, data in items.items():
+        source, target = data['source_scene_id'], data['target_scene_id']
+        missing = {
+            field: [f"Scene {scene_id} does not exist."]
+            for field, scene_id in (('source_scene', source), ('target_scene', target))
+            if scene_id not in scene_tours
+        }
+        if missing:
+            errors[index] = missing
+        elif scene_tours[source] != scene_tours[target]:
+            errors[index] = {'non_field_errors': [
+                "Source and target scenes must belong to the same tour."
+            ]}
+        elif source == target:
+            errors[index] = {'non_field_errors': [
+                "Source and target scenes cannot be the same."
+            ]}
+    return errors, scene_tours
+
+
+class SceneCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for creating/updating scenes."""
     
     class Meta:
         model = Scene
         fields = [
+            'id',
             'tour',
             'title',
             'description',
@@ -188,15 +441,17 @@ class SceneCreateSerializer(serializers.ModelSerializer):
             'map_image',
             'order',
             'is_active',
+            'processing_status',
         ]
+        read_only_fields = ['id', 'processing_status']
     
     def validate_panorama_image(self, value):
         """Validate panorama image file."""
         if value:
-            # Check file size (max 10MB)
-            if value.size > 10 * 1024 * 1024:
+            # Check file size (larger captures should use chunked uploads)
+            if value.size > panorama_max_size():
                 raise serializers.ValidationError(
-                    "Panorama image file size cannot exceed 10MB."
+                    f"Panorama image file size cannot exceed {panorama_max_size() // (1024 * 1024)}MB."
                 )
             
             # Check file type
@@ -210,17 +465,57 @@ class SceneCreateSerializer(serializers.ModelSerializer):
     def validate_voiceover_audio(self, value):
         """Validate voiceover audio file."""
         if value:
-            # Check file size (max 20MB)
-            if value.size > 20 * 1024 * 1024:
+            # Check file size
+            if value.size > voiceover_max_size():
                 raise serializers.ValidationError(
-                    "Audio file size cannot exceed 20MB."
+                    f"Audio file size cannot exceed {voiceover_max_size() // (1024 * 1024)}MB."
                 )
             
             # Check file type
-            allowed_types = ['audio/mpeg', 'audio/mp3', 'audio/wav']
-            if value.content_type not in allowed_types:
+            if value.content_type not in ALLOWED_AUDIO_TYPES:
+                raise serializers.ValidationError(
+                    "Only MP3 and WAV audio files are allowed."
+                )
+        
+        return value
+
+
+class ChunkedUploadSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for starting and inspecting resumable uploads."""
+    
+    class Meta:
+        model = ChunkedUpload
+        fields = [
+            'id',
+            'scene',
+            'field',
+            'filename',
+            'content_type',
+            'size',
+            'offset',
+            'status',
+            'created_at',
+        ]
+        read_only_fields = ['id', 'offset', 'status', 'created_at']
+    
+    def validate(self, data):
+        """Apply the same type and size rules as direct scene uploads."""
+        if data['field'] == 'panorama_image':
+            if not data['content_type'].startswith('image/'):
+                raise serializers.ValidationError(
+                    "Only image files are allowed for panorama."
+                )
+            max_size = panorama_max_size()
+        else:
+            if data['content_type'] not in ALLOWED_AUDIO_TYPES:
                 raise serializers.ValidationError(
                     "Only MP3 and WAV audio files are allowed."
                 )
+            max_size = voiceover_max_size()
+        
+        if data['size'] > max_size:
+            raise serializers.ValidationError(
+                f"File size cannot exceed {max_size // (1024 * 1024)}MB."
+            )
         
-        return value 
\ No newline at end of file
+        return data
@@ -0,0 +1,238 @@
+"""
+Signal handlers for VR Tours platform.
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import router
+from django.db.models import FileField
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, search, tiling, variants
+from .cache import CATALOGUE, invalidate_tour
+from .jobs import enqueue
+from .models import Tour, Scene, Hotspot
+from .storage import ContentAddressedStorage
+
+
+def _counted_file_fields(model):
+    """Return the file fields of ``model`` stored with reference counting."""
+    return [
+        field for field in model._meta.get_fields()
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+@receiver(post_save, sender=Tour)
+@receiver(post_delete, sender=Tour)
+def invalidate_tour_on_tour_change(sender, instance, **kwargs):
+    """Drop cached payloads when a tour is saved or deleted."""
+    invalidate_tour(instance.pk)
+    invalidate_tour(CATALOGUE)
+
+
+def _hotspot_tour_id(hotspot):
+    """Return the tour of a hotspot's source scene, or None once the scene is gone."""
+    if Hotspot.source_scene.is_cached(hotspot):
+        return hotspot.source_scene.tour_id
+    return Scene.objects.filter(pk=hotspot.source_scene_id).values_list('tour_id', flat=True).first()
+
+
+def _stored_state(instance):
+    """Return the row as stored before the save in progress, or an empty dict."""
+    return getattr(instance, '_stored_state', None) or {}
+
+
+def _previous_tour_id(instance, signal):
+    """Return the tour a saved scene or hotspot belonged to before the save."""
+    if signal is post_delete:
+        return None
+    return _stored_state(instance).get(TOUR_LOOKUPS[type(instance)])
+
+
+@receiver(post_save, sender=Scene)
+@receiver(post_delete, sender=Scene)
+def invalidate_tour_on_scene_change(sender, instance, signal, **kwargs):
+    """Drop cached payloads of the tour a scene belongs to, and belonged to."""
+    for tour_id in {instance.tour_id, _previous_tour_id(instance, signal)} - {None}:
+        invalidate_tour(tour_id)
+    # Scene counts and first scenes are part of the catalogue
+    invalidate_tour(CATALOGUE)
+
+
+@receiver(post_save, sender=Hotspot)
+@receiver(post_delete, sender=Hotspot)
+def invalidate_tour_on_hotspot_change(sender, instance, signal, **kwargs):
+    """Drop cached payloads of the tour a hotspot belongs to, and belonged to."""
+    # None when the source scene is already gone and invalidated the tour itself
+    for tour_id in {_hotspot_tour_id(instance), _previous_tour_id(instance, signal)} - {None}:
+        invalidate_tour(tour_id)
+
+
+# model: lookup of the tour a row belongs to
+TOUR_LOOKUPS = {Scene: 'tour_id', Hotspot: 'source_scene__tour_id'}
+
+
+def _stored_state_fields(model):
+    fields = [field.attname for field in _counted_file_fields(model)]
+    if model in counters.PARENTS:
+        fields += [counters.PARENTS[model][1], 'is_active', TOUR_LOOKUPS[model]]
+    return list(dict.fromkeys(fields))
+
+
+# model: values read before a save for the post_save handlers below
+STORED_STATE_FIELDS = {model: _stored_state_fields(model) for model in (Tour, Scene, Hotspot)}
+
+
+@receiver(pre_save, sender=Tour)
+@receiver(pre_save, sender=Scene)
+@receiver(pre_save, sender=Hotspot)
+def remember_stored_state(sender, instance, raw=False, using=None, **kwargs):
+    """
+    Note the row as stored before this save: its media files, and the
+    parent, activation and tour of counted rows. Also note which files this
+    save uploads.
+    """
+    instance._stored_state = None
+    # Files assigned but not stored yet; saving them adds a reference even
+    # when the content, and so the name, is unchanged
+    instance._uploaded_files = {
+        field.attname for field in _counted_file_fields(sender)
+        if not getattr(instance, field.attname)._committed
+    }
+    if raw or instance.pk is None or not STORED_STATE_FIELDS[sender]:
+        return
+    queryset = sender._base_manager.db_manager(using).filter(pk=instance.pk).order_by()
+    if sender in counters.PARENTS:
+        # Locked until the save commits (see CountedRowMixin), so concurrent
+        # saves of the row can't both move it between counts
+        queryset = queryset.select_for_update(of=('self',))
+    instance._stored_state = queryset.values(*STORED_STATE_FIELDS[sender]).first()
+
+
+@receiver(post_save, sender=Scene)
+@receiver(post_save, sender=Hotspot)
+def update_counters_on_save(sender, instance, raw=False, **kwargs):
+    """Move a created, (de)activated or re-parented row between stored counts."""
+    if raw:
+        return
+    parent, attname = counters.PARENTS[sender]
+    stored = getattr(instance, '_stored_state', None)
+    previous = None if stored is None else (stored[attname], stored['is_active'])
+    current = (getattr(instance, attname), instance.is_active)
+    if previous == current:
+        return
+    if previous is not None and previous[1]:
+        counters.adjust(parent, previous[0], -1)
+    if current[1]:
+        counters.adjust(parent, current[0], 1)
+
+
+@receiver(post_delete, sender=Scene)
+@receiver(post_delete, sender=Hotspot)
+def update_counters_on_delete(sender, instance, **kwargs):
+    """Drop a deleted active row from its parent's stored count."""
+    if instance.is_active:
+        parent, attname = counters.PARENTS[sender]
+        counters.adjust(parent, getattr(instance, attname), -1)
+
+
+@receiver(post_save, sender=Scene)
+def queue_scene_media(sender, instance, raw=False, **kwargs):
+    """Queue tiling and variants for a newly uploaded or replaced panorama."""
+    if raw:
+        return
+    tiles_due = getattr(settings, 'PANORAMA_TILING_ENABLED', True) and tiling.needs_tiles(instance)
+    if not (tiles_due or variants.needs_variants(instance)):
+        return
+    Scene.objects.filter(pk=instance.pk).update(
+        processing_status=Scene.PROCESSING_PENDING,
+        processing_error='',
+    )
+    instance.processing_status = Scene.PROCESSING_PENDING
+    enqueue('process_scene_media', key=f'scene-media:{instance.pk}', scene_id=instance.pk)
+
+
+@receiver(post_delete, sender=Scene)
+def delete_scene_tiles(sender, instance, **kwargs):
+    """Remove the tile pyramid of a deleted scene unless another scene shares it."""
+    if instance.tile_manifest and not tiling.is_shared(instance.tile_manifest, exclude=instance.pk):
+        tiling.delete_tiles(default_storage, instance.tile_manifest)
+
+
+@receiver(post_save, sender=Tour)
+def queue_tour_media(sender, instance, raw=False, **kwargs):
+    """Queue image variants for a newly uploaded or replaced thumbnail."""
+    if not raw and variants.needs_variants(instance):
+        enqueue('process_tour_media', key=f'tour-media:{instance.pk}', tour_id=instance.pk)
+
+
+@receiver(post_delete, sender=Tour)
+@receiver(post_delete, sender=Scene)
+def delete_image_variants(sender, instance, **kwargs):
+    """Remove the image variants of a deleted tour or scene."""
+    for field_name, entry in (instance.image_variants or {}).items():
+        if not variants.is_shared(instance, field_name, entry):
+            variants.delete_variants(default_storage, entry)
+
+
+@receiver(post_save, sender=Tour)
+@receiver(post_save, sender=Scene)
+def release_replaced_files(sender, instance, raw=False, **kwargs):
+    """Drop the references of media files replaced or cleared by this save."""
+    previous = _stored_state(instance)
+    uploaded = getattr(instance, '_uploaded_files', ())
+    for field in _counted_file_fields(sender):
+        old_name = previous.get(field.attname)
+        if old_name and (old_name != getattr(instance, field.attname).name or field.attname in uploaded):
+            field.storage.delete(old_name)
+
+
+@receiver(post_delete, sender=Tour)
+@receiver(post_delete, sender=Scene)
+def release_deleted_files(sender, instance, **kwargs):
+    """Drop the references held by a deleted tour or scene."""
+    for field in _counted_file_fields(sender):
+        name = getattr(instance, field.attname).name
+        if name:
+            field.storage.delete(name)
+
+
+@receiver(post_migrate)
+def create_search_index(sender, using, **kwargs):
+    """Create the full-text index table once the app's tables exist."""
+    # Not on databases the app isn't migrated to, e.g. replicas
+    if sender.name == 'tours' and router.allow_migrate_model(using, Tour):
+        search.create_index(using)
+
+
+# Fixtures are loaded raw, possibly before the rows they point at; run
+# ``manage.py rebuild_search_index`` after ``loaddata`` instead
+
+@receiver(post_save, sender=Tour)
+def index_tour(sender, instance, raw=False, **kwargs):
+    """Update the search document of a saved tour."""
+    if not raw:
+        search.index_tours([instance])
+
+
+@receiver(post_save, sender=Scene)
+def index_scene(sender, instance, raw=False, **kwargs):
+    """Update the search document of a saved scene."""
+    if not raw:
+        search.index_scenes([instance])
+
+
+@receiver(post_save, sender=Hotspot)
+def index_hotspot(sender, instance, raw=False, **kwargs):
+    """Update the search document of a saved hotspot."""
+    if not raw:
+        search.index_hotspots([instance])
+
+
+@receiver(post_delete, sender=Tour)
+@receiver(post_delete, sender=Scene)
+@receiver(post_delete, sender=Hotspot)
+def remove_search_document(sender, instance, **kwargs):
+    """Drop the search document of a deleted tour, scene or hotspot."""
+    search.remove_documents(sender._meta.model_name, [instance.pk])
@@ -0,0 +1,248 @@
+"""
+Content-addressed, deduplicated storage for uploaded scene and tour media.
+
+Uploaded files are named after the SHA-256 of their content inside the
+field's ``upload_to`` directory (``scenes/panoramas/<sha256>.jpg``), so
+re-uploading the same panorama or audio costs no extra disk and the URL of
+a name never changes meaning, which makes it safe to cache forever.
+
+Every save adds a reference to the file and every ``delete()`` drops one;
+the bytes are removed once the transaction dropping the last reference
+commits. Code copying a stored name to another field adds its reference
+with ``add_references()``. The upload handlers below compute the digest
+while the request body is received, so the storage doesn't have to read
+the file a second time.
+
+Files are written before the transaction saving their row commits, so a
+rolled back save (a failed import, an admin form error) leaves the bytes
+without a reference; ``manage.py sweep_media`` deletes them.
+
+Derived files (tiles, variants) are written by name with
+``default_storage`` and are not reference counted. Every generation of them
+goes to a directory of its own (``new_generation()``), so a name never
+changes content either.
+"""
+import hashlib
+import os
+import re
+import secrets
+import tempfile
+from functools import partial
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+from django.db import transaction
+from django.db.models import F, FileField
+
+from .metrics import increment
+
+HASHED_NAME_RE = re.compile(r'^[0-9a-f]{64}$')
+GENERATION_RE = re.compile(r'^g[0-9a-f]{12}$')
+# Names per query when sweeping, well below SQLite's bound parameter limit
+SWEEP_BATCH_SIZE = 500
+
+
+def is_content_addressed(name):
+    """Return whether a storage name was derived from its content hash."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return bool(HASHED_NAME_RE.match(stem))
+
+
+def new_generation():
+    """Return a fresh directory name for one generation of derived files."""
+    return f'g{secrets.token_hex(6)}'
+
+
+def is_generation(name):
+    """Return whether a directory name was made by ``new_generation()``."""
+    return bool(GENERATION_RE.match(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names files by SHA-256 and counts references."""
+
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, f'{digest}{extension}').replace('\\', '/')
+
+    def _digest(self, content):
+        digest = getattr(content, 'sha256', None)
+        if digest:
+            return digest
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def save(self, name, content, max_length=None):
+        """Store ``content`` under its hashed name and add a reference to it."""
+        from .models import StoredFile
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = self._digest(content)
+        name = self.hashed_name(self.generate_filename(name), digest)
+
+        with transaction.atomic():
+            stored, created = StoredFile.objects.select_for_update().get_or_create(
+                name=name,
+                defaults={'sha256': digest, 'size': content.size, 'refcount': 0},
+            )
+            # Written under the row lock so a concurrent last delete can't race
+            # us; a new row rewrites bytes that may be an unreferenced leftover
+            if created or not self.exists(name):
+                self._write(name, content)
+            StoredFile.objects.filter(pk=stored.pk).update(refcount=F('refcount') + 1)
+        return name
+
+    def _write(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if hasattr(content, 'temporary_file_path'):
+            # Identical bytes under an identical name, so overwriting is harmless
+            file_move_safe(content.temporary_file_path(), full_path, allow_overwrite=True)
+        else:
+            fd, temporary_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+            try:
+                with os.fdopen(fd, 'wb') as handle:
+                    for chunk in content.chunks():
+                        handle.write(chunk)
+                os.replace(temporary_path, full_path)
+            except BaseException:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+                raise
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+    def add_references(self, name, count=1):
+        """Add ``count`` references to a stored file whose name was copied to other fields."""
+        from .models import StoredFile
+
+        if name and count:
+            StoredFile.objects.filter(name=name).update(refcount=F('refcount') + count)
+
+    def delete(self, name):
+        """
+        Drop one reference to ``name``; remove the file with the last one.
+
+        Files stored before reference counting (no ``StoredFile`` row) are
+        left alone, since other rows may still point at them.
+        """
+        from .models import StoredFile
+
+        if not name:
+            return
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(name=name).first()
+            if stored is None:
+                return
+            if stored.refcount > 1:
+                StoredFile.objects.filter(pk=stored.pk).update(refcount=F('refcount') - 1)
+                return
+            stored.delete()
+            # Only once committed: a rollback restores rows that need the bytes
+            transaction.on_commit(partial(self._remove_unreferenced, name))
+
+    def _remove_unreferenced(self, name):
+        from .models import StoredFile
+
+        with transaction.atomic():
+            # A save may have referenced the name again meanwhile
+            if not StoredFile.objects.select_for_update().filter(name=name).exists():
+                super().delete(name)
+
+    def _referencing_fields(self):
+        return [
+            (model, field)
+            for model in apps.get_models()
+            for field in model._meta.get_fields()
+            if isinstance(field, FileField) and field.storage is self
+        ]
+
+    def sweep(self, older_than, dry_run=False):
+        """
+        Delete content-addressed files last written before the UNIX time
+        ``older_than`` that have no ``StoredFile`` row and no field pointing
+        at them, and return their names.
+
+        The age limit spares files whose saving transaction is still open.
+        """
+        from .models import StoredFile
+
+        candidates = []
+        for directory, _, filenames in os.walk(self.location):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if is_content_addressed(filename) and os.path.getmtime(path) < older_than:
+                    candidates.append(os.path.relpath(path, self.location).replace(os.sep, '/'))
+
+        swept = []
+        fields = self._referencing_fields()
+        for start in range(0, len(candidates), SWEEP_BATCH_SIZE):
+            batch = candidates[start:start + SWEEP_BATCH_SIZE]
+            referenced = set(StoredFile.objects.filter(name__in=batch).values_list('name', flat=True))
+            for model, field in fields:
+                referenced.update(
+                    model._base_manager.filter(**{f'{field.name}__in': batch}).values_list(field.attname, flat=True)
+                )
+            for name in batch:
+                # Rewritten since listing: saved again by a transaction we can't see yet
+                if name in referenced or not self.exists(name) or os.path.getmtime(self.path(name)) >= older_than:
+                    continue
+                if not dry_run:
+                    self._remove_unreferenced(name)
+                swept.append(name)
+        return swept
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    """Storage for uploaded tour and scene media."""
+    return content_addressed_storage
+
+
+class _HashingMixin:
+    """Hash upload chunks as they arrive and expose the digest as ``file.sha256``."""
+
+    def new_file(self, *args, **kwargs):
+        self._sha256 = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+
+    def _hashing(self):
+        return True
+
+    def receive_data_chunk(self, raw_data, start):
+        if self._hashing():
+            self._sha256.update(raw_data)
+            increment('upload_bytes_total', len(raw_data), kind='multipart')
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self._sha256.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(_HashingMixin, MemoryFileUploadHandler):
+
+    def _hashing(self):
+        # Larger files pass through to the temporary file handler, which hashes them
+        return self.activated
+
+
+class HashingTemporaryFileUploadHandler(_HashingMixin, TemporaryFileUploadHandler):
+    pass
@@ -0,0 +1,47 @@
+"""
+Background tasks for VR Tours platform.
+
+Run by ``manage.py worker``; see ``jobs.py`` for the queue itself.
+"""
+from django.conf import settings
+
+from . import tiling, variants
+from .cache import CATALOGUE, invalidate_tour
+from .jobs import task
+from .models import Tour, Scene
+
+
+def _scene_media_failed(error, scene_id):
+    Scene.objects.filter(pk=scene_id).update(
+        processing_status=Scene.PROCESSING_FAILED,
+        processing_error=str(error)[:1000],
+    )
+
+
+@task('process_scene_media', on_failure=_scene_media_failed)
+def process_scene_media(scene_id):
+    """Generate the tile pyramid and image variants of a scene."""
+    scene = Scene.objects.filter(pk=scene_id).first()
+    if scene is None:
+        # Deleted while queued
+        return
+
+    Scene.objects.filter(pk=scene_id).update(processing_status=Scene.PROCESSING_RUNNING)
+    if getattr(settings, 'PANORAMA_TILING_ENABLED', True) and tiling.needs_tiles(scene):
+        tiling.process_scene_tiles(scene)
+    if variants.process_image_variants(scene):
+        invalidate_tour(scene.tour_id)
+        invalidate_tour(CATALOGUE)
+    Scene.objects.filter(pk=scene_id).update(
+        processing_status=Scene.PROCESSING_READY,
+        processing_error='',
+    )
+
+
+@task('process_tour_media')
+def process_tour_media(tour_id):
+    """Generate the image variants of a tour's thumbnail."""
+    tour = Tour.objects.filter(pk=tour_id).first()
+    if tour is not None and variants.process_image_variants(tour):
+        invalidate_tour(tour.pk)
+        invalidate_tour(CATALOGUE)
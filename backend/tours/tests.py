@@ -0,0 +1,815 @@
+"""
+Tests for VR Tours platform.
+
+    python manage.py test tours
+"""
+import base64
+import io
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from PIL import Image
+
+from . import counters, jobs, viewport
+from .graph import SceneGraph
+from .cache import CATALOGUE, get_or_build, invalidate_tour, tour_cache_key
+from .models import Hotspot, Job, Scene, StoredFile, Tour
+from .routers import PIN_COOKIE, ReplicaPinningMiddleware
+
+
+def make_tour(scenes=3, title='Tour'):
+    """Create an active tour whose scenes are linked back and forth in order."""
+    tour = Tour.objects.create(title=title, description='A tour')
+    rows = [
+        Scene.objects.create(
+            tour=tour,
+            title=f'Scene {order}',
+            order=order,
+            panorama_image=f'scenes/panoramas/scene-{order}.jpg',
+        )
+        for order in range(scenes)
+    ]
+    for source, target in zip(rows, rows[1:]):
+        Hotspot.objects.create(source_scene=source, target_scene=target, yaw=10, pitch=0, label='Next')
+        Hotspot.objects.create(source_scene=target, target_scene=source, yaw=-170, pitch=0, label='Back')
+    return tour
+
+
+def jpeg(name='panorama.jpg', color=(200, 10, 10)):
+    """Return a small uploaded JPEG."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 32), color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+class MediaRootMixin:
+    """Store media in a temporary directory removed after each test."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+@override_settings(METRICS_DIR=None)
+class QueryCountTests(TestCase):
+    """The read endpoints run a fixed number of queries whatever the row count."""
+
+    def assert_constant_queries(self, url, grow):
+        """Request ``url``, call ``grow`` to add rows, and expect the same query count."""
+        # The first request seeds the cache version, which checks that the tour exists
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as before:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        grow()
+        with self.assertNumQueries(len(before)):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_tour_list(self):
+        make_tour(2)
+
+        def grow():
+            for number in range(10):
+                make_tour(3, title=f'Tour {number}')
+
+        response = self.assert_constant_queries('/api/tours/', grow)
+        self.assertEqual(len(response.json()['results']), 11)
+        self.assert_constant_queries('/api/tours/?ordering=-scene_count', lambda: make_tour(6))
+
+    def test_tour_detail(self):
+        tour = make_tour(2)
+
+        def grow():
+            last = tour.scenes.order_by('-order').first()
+            for order in range(2, 12):
+                scene = Scene.objects.create(
+                    tour=tour, title=f'Scene {order}', order=order,
+                    panorama_image=f'scenes/panoramas/scene-{order}.jpg',
+                )
+                Hotspot.objects.create(source_scene=last, target_scene=scene, yaw=0, pitch=0)
+                last = scene
+
+        response = self.assert_constant_queries(f'/api/tours/{tour.id}/', grow)
+        self.assertEqual(len(response.json()['scenes']), 12)
+        self.assertEqual(response.json()['scene_count'], 12)
+
+    def test_tour_scenes(self):
+        tour = make_tour(2)
+
+        def grow():
+            for order in range(2, 12):
+                Scene.objects.create(
+                    tour=tour, title=f'Scene {order}', order=order,
+                    panorama_image=f'scenes/panoramas/scene-{order}.jpg',
+                )
+
+        response = self.assert_constant_queries(f'/api/tours/{tour.id}/scenes/', grow)
+        self.assertEqual(len(response.json()['results']), 12)
+
+
+def cursor(position, reverse=False):
+    """Encode a cursor the way ``KeysetPagination`` does."""
+    payload = json.dumps({'p': position, 'r': int(reverse)}).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+@override_settings(METRICS_DIR=None)
+class KeysetPaginationTests(TestCase):
+    """Cursors page through every row exactly once, in any ordering."""
+
+    def setUp(self):
+        # Titles and scene counts repeat, so pages split ties on id
+        for number in range(7):
+            make_tour(number % 3, title=f'Tour {number % 2}')
+
+    def walk(self, url):
+        """Follow next links from ``url`` and return the pages of ids."""
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([tour['id'] for tour in data['results']])
+            url = data['next']
+        return pages
+
+    def test_pages_follow_ordering_with_id_tie_breaker(self):
+        for ordering, expected in (
+            ('title', Tour.objects.order_by('title', 'id')),
+            ('-scene_count', Tour.objects.order_by('-scene_count', '-id')),
+            ('scene_count', Tour.objects.order_by('scene_count', 'id')),
+        ):
+            pages = self.walk(f'/api/tours/?ordering={ordering}&page_size=2')
+            self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+            self.assertEqual(sum(pages, []), list(expected.values_list('id', flat=True)), ordering)
+
+    def test_previous_link_returns_the_same_page(self):
+        first = self.client.get('/api/tours/?ordering=title&page_size=3').json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual(self.client.get(second['previous']).json()['results'], first['results'])
+        self.assertIsNone(first['previous'])
+
+    def test_rows_added_while_paging_are_not_repeated(self):
+        first = self.client.get('/api/tours/?page_size=3').json()
+        make_tour(1, title='Newest')
+        rest = self.walk(first['next'])
+        seen = [tour['id'] for tour in first['results']] + sum(rest, [])
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 7)
+
+    def test_malformed_cursors_are_not_found(self):
+        for value in (
+            'zz',
+            base64.urlsafe_b64encode(b'not json').decode(),
+            base64.urlsafe_b64encode(b'{"r": 0}').decode(),
+            base64.urlsafe_b64encode(b'[1, 2]').decode(),
+            cursor([1]),
+            cursor('Tour 0'),
+        ):
+            response = self.client.get(f'/api/tours/?ordering=title&cursor={value}')
+            self.assertEqual(response.status_code, 404, value)
+
+    def test_cursor_from_another_ordering_is_not_found(self):
+        data = self.client.get('/api/tours/?ordering=title&page_size=2').json()
+        value = data['next'].split('cursor=')[1].split('&')[0]
+        response = self.client.get(f'/api/tours/?ordering=-created_at&page_size=2&cursor={value}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_position_types_are_not_found(self):
+        response = self.client.get(f'/api/tours/?ordering=scene_count&cursor={cursor(["many", "x"])}')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(METRICS_DIR=None, PANORAMA_TILING_ENABLED=False)
+class StoredFileTests(MediaRootMixin, TestCase):
+    """Stored files are counted once per field pointing at them."""
+
+    def test_reupload_of_same_content_keeps_one_reference(self):
+        tour = Tour.objects.create(title='Tour')
+        scene = Scene.objects.create(tour=tour, title='Scene', order=0, panorama_image=jpeg())
+        name = scene.panorama_image.name
+        scene.panorama_image = jpeg('again.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            scene.save()
+        self.assertEqual(scene.panorama_image.name, name)
+        self.assertEqual(StoredFile.objects.get(name=name).refcount, 1)
+
+        storage = scene.panorama_image.storage
+        with self.captureOnCommitCallbacks(execute=True):
+            scene.delete()
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertFalse(storage.exists(name))
+
+    def test_replaced_file_loses_its_reference(self):
+        tour = Tour.objects.create(title='Tour')
+        scene = Scene.objects.create(tour=tour, title='Scene', order=0, panorama_image=jpeg())
+        old = scene.panorama_image.name
+        scene.panorama_image = jpeg(color=(10, 10, 200))
+        with self.captureOnCommitCallbacks(execute=True):
+            scene.save()
+        self.assertFalse(StoredFile.objects.filter(name=old).exists())
+        self.assertEqual(StoredFile.objects.get(name=scene.panorama_image.name).refcount, 1)
+
+
+@override_settings(METRICS_DIR=None)
+class TourCacheTests(TestCase):
+    """Cached payloads are keyed by tour version and rebuilt after changes."""
+
+    def setUp(self):
+        cache.clear()
+
+    def change(self, function, *args):
+        """Run ``function`` and the version bumps waiting for its commit."""
+        with self.captureOnCommitCallbacks(execute=True):
+            function(*args)
+
+    def test_invalidation_bumps_only_that_tour(self):
+        tour, other = make_tour(1), make_tour(1, title='Other')
+        key, other_key = tour_cache_key('navigation', tour.id), tour_cache_key('navigation', other.id)
+        self.change(invalidate_tour, tour.id)
+        self.assertNotEqual(tour_cache_key('navigation', tour.id), key)
+        self.assertEqual(tour_cache_key('navigation', other.id), other_key)
+
+    def test_invalidation_waits_for_commit(self):
+        tour = make_tour(1)
+        key = tour_cache_key('navigation', tour.id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                invalidate_tour(tour.id)
+                self.assertEqual(tour_cache_key('navigation', tour.id), key)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(tour_cache_key('navigation', tour.id), key)
+
+    def test_navigation_follows_scene_changes(self):
+        tour = make_tour(3)
+        url = f'/api/tours/{tour.id}/navigation/'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.client.get(url).json()['scenes']), 3)
+
+        scene = tour.scenes.get(order=1)
+        scene.title = 'Renamed'
+        self.change(scene.save)
+        titles = [entry['title'] for entry in self.client.get(url).json()['scenes']]
+        self.assertIn('Renamed', titles)
+
+        self.change(scene.delete)
+        data = self.client.get(url).json()
+        self.assertEqual(len(data['scenes']), 2)
+        self.assertNotIn(scene.id, [entry['id'] for entry in data['scenes']])
+
+    def test_hotspot_change_invalidates_navigation(self):
+        tour = make_tour(2)
+        url = f'/api/tours/{tour.id}/navigation/'
+        before = self.client.get(url).json()['connections']
+        self.change(Hotspot.objects.filter(source_scene__tour=tour).first().delete)
+        self.assertEqual(len(self.client.get(url).json()['connections']), len(before) - 1)
+
+    def test_detail_validators_change_with_scenes(self):
+        tour = make_tour(2)
+        url = f'/api/tours/{tour.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        scene = tour.scenes.get(order=0)
+        scene.title = 'Renamed'
+        self.change(scene.save)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Renamed', [entry['title'] for entry in response.json()['scenes']])
+
+    def test_catalogue_follows_new_tours(self):
+        self.client.get('/api/tours/')
+        key = tour_cache_key('catalogue', CATALOGUE)
+        self.change(make_tour, 1)
+        self.assertNotEqual(tour_cache_key('catalogue', CATALOGUE), key)
+
+    def test_concurrent_misses_build_once(self):
+        builds = []
+
+        def builder():
+            builds.append(1)
+            time.sleep(0.05)
+            return 'payload'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_build('tests:single-flight', builder)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['payload'] * 5)
+        self.assertEqual(len(builds), 1)
+
+
+@override_settings(METRICS_DIR=None)
+class MediaTests(MediaRootMixin, TestCase):
+    """Media files answer ranges and conditional requests."""
+
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 4
+        self.write('audio/clip.mp3', self.content)
+
+    def write(self, name, content):
+        from django.conf import settings
+
+        path = f'{settings.MEDIA_ROOT}/{name}'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as handle:
+            handle.write(content)
+
+    def get(self, name='audio/clip.mp3', **headers):
+        response = self.client.get(f'/media/{name}', headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_file(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_ranges(self):
+        size = len(self.content)
+        for header, start, end in (
+            ('bytes=0-9', 0, 9),
+            ('bytes=1000-', 1000, size - 1),
+            ('bytes=-24', size - 24, size - 1),
+            ('bytes=1020-5000', 1020, size - 1),
+        ):
+            response, body = self.get(range=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(body, self.content[start:end + 1], header)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+
+    def test_unsatisfiable_ranges(self):
+        for header in ('bytes=5000-', 'bytes=-0', 'bytes=9-3'):
+            response, _ = self.get(range=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_range_of_empty_file(self):
+        self.write('audio/empty.mp3', b'')
+        for header in ('bytes=-10', 'bytes=0-'):
+            response, _ = self.get('audio/empty.mp3', range=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], 'bytes */0')
+
+    def test_ignored_ranges(self):
+        for header in ('bytes=0-1,4-5', 'items=0-1', 'bytes=-'):
+            response, body = self.get(range=header)
+            self.assertEqual(response.status_code, 200, header)
+            self.assertEqual(body, self.content)
+
+    def test_if_range(self):
+        response, _ = self.get()
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        for validator in (etag, last_modified):
+            response, body = self.get(range='bytes=0-3', if_range=validator)
+            self.assertEqual((response.status_code, body), (206, self.content[:4]))
+        for validator in ('"stale"', 'Mon, 01 Jan 2001 00:00:00 GMT'):
+            response, body = self.get(range='bytes=0-3', if_range=validator)
+            self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_not_modified(self):
+        response, _ = self.get()
+        response, body = self.get(if_none_match=response['ETag'])
+        self.assertEqual((response.status_code, body), (304, b''))
+        self.assertIn('ETag', response)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected/')
+    def test_accel_redirect_quotes_the_name(self):
+        self.write('audio/a clip?.mp3', b'data')
+        response, body = self.get(quote('audio/a clip?.mp3'))
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/audio/a%20clip%3F.mp3')
+        self.assertEqual(body, b'')
+
+
+failed_payloads = []
+
+
+@jobs.task('tests.always_fails', max_attempts=2, on_failure=lambda error, **payload: failed_payloads.append(payload))
+def always_fails(number):
+    raise RuntimeError(f"Failure {number}")
+
+
+@override_settings(METRICS_DIR=None, JOB_RETRY_BACKOFF=60, JOB_LOCK_TIMEOUT=600)
+class JobQueueTests(TestCase):
+    """Failed and abandoned jobs are retried with backoff, then failed."""
+
+    def setUp(self):
+        failed_payloads.clear()
+        # Failures are expected; keep their tracebacks out of the output
+        jobs.logger.disabled = True
+        self.addCleanup(setattr, jobs.logger, 'disabled', False)
+
+    def make_due(self, job):
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+    def test_retry_with_backoff_then_fail(self):
+        job = jobs.enqueue('tests.always_fails', number=1)
+        self.assertEqual(jobs.claim_due_jobs(5), [job.pk])
+        self.assertEqual(jobs.run_job(job.pk), Job.STATUS_PENDING)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('Failure 1', job.last_error)
+        self.assertAlmostEqual(
+            (job.run_after - timezone.now()).total_seconds(), 60, delta=5
+        )
+        # Not due before the backoff has passed
+        self.assertEqual(jobs.claim_due_jobs(5), [])
+
+        self.make_due(job)
+        self.assertEqual(jobs.claim_due_jobs(5), [job.pk])
+        self.assertEqual(jobs.run_job(job.pk), Job.STATUS_FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 2))
+        self.assertEqual(failed_payloads, [{'number': 1}])
+        self.assertEqual(jobs.claim_due_jobs(5), [])
+
+    def test_backoff_doubles_per_attempt(self):
+        job = jobs.enqueue('tests.always_fails', number=1)
+        Job.objects.filter(pk=job.pk).update(max_attempts=5)
+        delays = []
+        for _ in range(3):
+            self.make_due(job)
+            jobs.claim_due_jobs(1)
+            jobs.run_job(job.pk)
+            job.refresh_from_db()
+            delays.append(round((job.run_after - timezone.now()).total_seconds() / 60))
+        self.assertEqual(delays, [1, 2, 4])
+
+    def test_stale_lock_is_released_as_a_failed_attempt(self):
+        stale = timezone.now() - timedelta(hours=1)
+        retried = jobs.enqueue('tests.always_fails', number=1)
+        exhausted = jobs.enqueue('tests.always_fails', number=2)
+        fresh = jobs.enqueue('tests.always_fails', number=3)
+        Job.objects.filter(pk=retried.pk).update(status=Job.STATUS_RUNNING, attempts=1, locked_at=stale)
+        Job.objects.filter(pk=exhausted.pk).update(status=Job.STATUS_RUNNING, attempts=2, locked_at=stale)
+        Job.objects.filter(pk=fresh.pk).update(status=Job.STATUS_RUNNING, attempts=1, locked_at=timezone.now())
+
+        # The released job waits for its backoff like any failed attempt
+        self.assertEqual(jobs.claim_due_jobs(5), [])
+        for job in (retried, exhausted, fresh):
+            job.refresh_from_db()
+        self.assertEqual((retried.status, retried.attempts), (Job.STATUS_PENDING, 1))
+        self.assertIn('lock expired', retried.last_error)
+        self.assertEqual(exhausted.status, Job.STATUS_FAILED)
+        self.assertEqual(failed_payloads, [{'number': 2}])
+        self.assertEqual(fresh.status, Job.STATUS_RUNNING)
+
+    def test_unclaim_undoes_the_attempt(self):
+        job = jobs.enqueue('tests.always_fails', number=1)
+        jobs.claim_due_jobs(1)
+        jobs.unclaim([job.pk])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_PENDING, 0))
+
+
+@override_settings(METRICS_DIR=None)
+class HotspotBulkTests(TestCase):
+    """Bulk hotspot writes are all-or-nothing and behave like single saves."""
+
+    url = '/api/hotspots/bulk/'
+
+    def item(self, source, target, **fields):
+        return {'source_scene': source.id, 'target_scene': target.id, 'yaw': 0, 'pitch': 0, **fields}
+
+    def test_errors_are_reported_per_index(self):
+        tour = make_tour(2)
+        first, second = tour.scenes.order_by('order')
+        other = make_tour(1, title='Other').scenes.get()
+        count = Hotspot.objects.count()
+        response = self.client.post(self.url, [
+            self.item(first, second),
+            self.item(first, second, yaw=999),
+            self.item(first, other),
+            self.item(first, first),
+            {**self.item(first, second), 'id': 999999},
+            {**self.item(first, second), 'source_scene': 999999},
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        errors = {entry['index']: entry['errors'] for entry in response.json()['errors']}
+        self.assertEqual(sorted(errors), [1, 2, 3, 4, 5])
+        self.assertIn('yaw', errors[1])
+        self.assertIn('non_field_errors', errors[2])
+        self.assertIn('non_field_errors', errors[3])
+        self.assertIn('id', errors[4])
+        self.assertIn('source_scene', errors[5])
+        self.assertEqual(Hotspot.objects.count(), count)
+
+    def test_not_a_list(self):
+        response = self.client.post(self.url, {'yaw': 0}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.json())
+
+    def test_move_hotspot_to_another_scene(self):
+        tour = make_tour(3)
+        first, second, third = tour.scenes.order_by('order')
+        hotspot = Hotspot.objects.get(source_scene=first, target_scene=second)
+        navigation = f'/api/tours/{tour.id}/navigation/'
+        self.client.get(navigation)
+        stale = timezone.now() - timedelta(days=1)
+        Hotspot.objects.filter(pk=hotspot.pk).update(updated_at=stale)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, [
+                {**self.item(third, first, yaw=45), 'id': hotspot.id},
+                self.item(second, third, yaw=90),
+            ], content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['updated']), 1)
+        self.assertEqual(len(response.json()['created']), 1)
+
+        hotspot.refresh_from_db()
+        self.assertEqual((hotspot.source_scene_id, hotspot.target_scene_id, hotspot.yaw), (third.id, first.id, 45))
+        self.assertGreater(hotspot.updated_at, stale)
+        counts = dict(Scene.objects.filter(tour=tour).values_list('id', 'hotspot_count'))
+        self.assertEqual(counts, {first.id: 0, second.id: 3, third.id: 2})
+        links = {
+            (entry['from_scene'], entry['to_scene'])
+            for entry in self.client.get(navigation).json()['connections']
+        }
+        self.assertIn((third.id, first.id), links)
+        self.assertNotIn((first.id, second.id), links)
+
+
+def great_circle_degrees(yaw, pitch, other_yaw, other_pitch):
+    """Return the angle between two view directions, the slow way."""
+    (x,), (y,), (z,) = viewport.unit_vectors([yaw], [pitch])
+    (ox,), (oy,), (oz,) = viewport.unit_vectors([other_yaw], [other_pitch])
+    return math.degrees(math.acos(max(-1.0, min(1.0, x * ox + y * oy + z * oz))))
+
+
+class HotspotIndexTests(TestCase):
+    """The bucketed index finds exactly the hotspots inside the view cone."""
+
+    def index(self, points):
+        return viewport.HotspotIndex((number, yaw, pitch) for number, (yaw, pitch) in enumerate(points))
+
+    def test_cone_wraps_across_the_yaw_seam(self):
+        index = self.index([(175, 0), (-175, 0), (0, 0), (160, 0)])
+        for yaw in (179, -179, 180, -180):
+            self.assertEqual(sorted(index.visible(yaw, 0, 20)), [0, 1], yaw)
+
+    def test_cone_over_a_pole_spans_every_yaw(self):
+        index = self.index([(yaw, 80) for yaw in range(-180, 180, 30)] + [(0, 40)])
+        self.assertEqual(sorted(index.visible(90, 85, 30)), list(range(12)))
+
+    def test_wide_field_of_view(self):
+        index = self.index([(0, 0), (180, 0), (90, -89)])
+        self.assertEqual(sorted(index.visible(0, 0, 360)), [0, 1, 2])
+
+    def test_matches_brute_force(self):
+        generator = random.Random(7)
+        points = [(generator.uniform(-180, 180), generator.uniform(-90, 90)) for _ in range(300)]
+        index = self.index(points)
+        for numpy in (viewport.numpy, None):
+            with mock.patch.object(viewport, 'numpy', numpy):
+                for _ in range(50):
+                    yaw, pitch = generator.uniform(-180, 180), generator.uniform(-90, 90)
+                    fov = generator.choice((10, 60, 120, 200))
+                    expected = [
+                        number for number, point in enumerate(points)
+                        if great_circle_degrees(yaw, pitch, *point) <= fov / 2 - 1e-6
+                    ]
+                    found = set(index.visible(yaw, pitch, fov))
+                    self.assertTrue(set(expected) <= found, (yaw, pitch, fov))
+                    self.assertTrue(all(
+                        great_circle_degrees(yaw, pitch, *points[number]) <= fov / 2 + 1e-6
+                        for number in found
+                    ))
+
+
+@override_settings(METRICS_DIR=None)
+class SceneHotspotsViewportTests(TestCase):
+    """The viewport query parameters filter hotspots or are refused."""
+
+    def setUp(self):
+        cache.clear()
+        self.scene = make_tour(3).scenes.get(order=1)
+        self.url = f'/api/scenes/{self.scene.id}/hotspots/'
+
+    def test_viewport_filters_hotspots(self):
+        # Scene 1 links forward at yaw 10 and back at yaw -170
+        results = self.client.get(self.url, {'yaw': 0, 'pitch': 0, 'fov': 60}).json()['results']
+        self.assertEqual([hotspot['yaw'] for hotspot in results], [10])
+        self.assertEqual(len(self.client.get(self.url).json()['results']), 2)
+
+    def test_incomplete_viewport_is_refused(self):
+        for params in (
+            {'fov': 60},
+            {'yaw': 0},
+            {'pitch': 0, 'fov': 60},
+            {'yaw': 'x', 'pitch': 0},
+            {'yaw': 0, 'pitch': 0, 'fov': 0},
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class SceneGraphTests(TestCase):
+    """Routes and reachability over the compiled hotspot graph."""
+
+    def test_shortest_path_takes_fewest_hops(self):
+        graph = SceneGraph([1, 2, 3, 4], [(1, 2), (2, 3), (3, 4), (1, 3)])
+        self.assertEqual(graph.shortest_path(1, 4), [1, 3, 4])
+        self.assertEqual(graph.shortest_path(2, 2), [2])
+
+    def test_unreachable_target(self):
+        graph = SceneGraph([1, 2, 3], [(1, 2), (3, 1)])
+        self.assertIsNone(graph.shortest_path(1, 3))
+        self.assertEqual(graph.unreachable_from(1), [3])
+        self.assertEqual(graph.dead_ends(), [2])
+
+    def test_self_loops_and_unknown_scenes_are_ignored(self):
+        graph = SceneGraph([1, 2], [(1, 1), (1, 2), (1, 2), (2, 2), (2, 99), (99, 1)])
+        self.assertEqual(graph.edge_count, 1)
+        self.assertEqual(graph.dead_ends(), [2])
+        self.assertEqual(graph.unreachable_from(2), [1])
+
+
+@override_settings(METRICS_DIR=None)
+class TourRouteTests(TestCase):
+    """The route and reachability endpoints follow active hotspots only."""
+
+    def setUp(self):
+        cache.clear()
+        self.tour = make_tour(3)
+        self.first, self.second, self.third = self.tour.scenes.order_by('order')
+
+    def route(self, **params):
+        return self.client.get(f'/api/tours/{self.tour.id}/route/', params)
+
+    def reachability(self):
+        return self.client.get(f'/api/tours/{self.tour.id}/reachability/').json()
+
+    def test_route(self):
+        data = self.route(to=self.third.id).json()
+        self.assertEqual(data['path'], [self.first.id, self.second.id, self.third.id])
+        self.assertEqual(data['hops'], 2)
+
+    def test_inactive_hotspot_is_not_followed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            hotspot = Hotspot.objects.get(source_scene=self.second, target_scene=self.third)
+            hotspot.is_active = False
+            hotspot.save()
+        self.assertEqual(self.route(to=self.third.id).status_code, 404)
+        self.assertEqual(self.reachability()['unreachable'], [self.third.id])
+
+    def test_inactive_scene_is_left_out(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.third.is_active = False
+            self.third.save()
+        self.assertEqual(self.route(to=self.third.id).status_code, 400)
+        data = self.reachability()
+        self.assertEqual((data['scene_count'], data['unreachable']), (2, []))
+
+    def test_self_loop_is_not_an_exit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Hotspot.objects.filter(source_scene=self.third).delete()
+            Hotspot.objects.create(source_scene=self.third, target_scene=self.third, yaw=0, pitch=0)
+        data = self.reachability()
+        self.assertEqual(data['dead_ends'], [self.third.id])
+        self.assertEqual(self.route(**{'from': self.third.id, 'to': self.first.id}).status_code, 404)
+
+    def test_unknown_scenes_are_refused(self):
+        self.assertEqual(self.route(to=999999).status_code, 400)
+        self.assertEqual(self.route(to='x').status_code, 400)
+        self.assertEqual(self.client.get('/api/tours/999999/route/', {'to': 1}).status_code, 404)
+
+
+@override_settings(METRICS_DIR=None)
+class StoredCounterTests(TestCase):
+    """Stored counters follow row changes and survive saves of stale instances."""
+
+    def setUp(self):
+        self.tour = make_tour(3)
+        self.first, self.second, self.third = self.tour.scenes.order_by('order')
+
+    def counts(self):
+        self.tour.refresh_from_db()
+        return self.tour.scene_count, dict(
+            Scene.objects.filter(tour=self.tour).values_list('id', 'hotspot_count')
+        )
+
+    def test_counts_after_creation(self):
+        self.assertEqual(self.counts(), (3, {self.first.id: 1, self.second.id: 2, self.third.id: 1}))
+
+    def test_stale_instance_keeps_counts(self):
+        stale_tour = Tour.objects.get(pk=self.tour.pk)
+        stale_scene = Scene.objects.get(pk=self.first.pk)
+        Scene.objects.create(tour=self.tour, title='Added', order=3)
+        Hotspot.objects.create(source_scene=self.first, target_scene=self.third, yaw=0, pitch=0)
+
+        stale_tour.title = 'Renamed'
+        stale_tour.save()
+        stale_scene.title = 'Renamed'
+        stale_scene.save()
+        scene_count, hotspot_counts = self.counts()
+        self.assertEqual((self.tour.title, scene_count), ('Renamed', 4))
+        self.assertEqual(hotspot_counts[self.first.id], 2)
+
+    def test_deactivating_and_reactivating(self):
+        self.second.is_active = False
+        self.second.save()
+        hotspot = Hotspot.objects.get(source_scene=self.first)
+        hotspot.is_active = False
+        hotspot.save()
+        scene_count, hotspot_counts = self.counts()
+        self.assertEqual((scene_count, hotspot_counts[self.first.id]), (2, 0))
+
+        self.second.is_active = True
+        self.second.save()
+        hotspot.is_active = True
+        hotspot.save()
+        scene_count, hotspot_counts = self.counts()
+        self.assertEqual((scene_count, hotspot_counts[self.first.id]), (3, 1))
+
+    def test_deleting(self):
+        Hotspot.objects.filter(source_scene=self.second, target_scene=self.third).delete()
+        self.assertEqual(self.counts()[1][self.second.id], 1)
+        self.third.delete()
+        self.assertEqual(self.counts()[0], 2)
+
+    def test_moving_between_parents(self):
+        other = make_tour(1, title='Other')
+        self.third.tour = other
+        self.third.order = 5
+        self.third.save()
+        other.refresh_from_db()
+        self.assertEqual((self.counts()[0], other.scene_count), (2, 2))
+
+        hotspot = Hotspot.objects.get(source_scene=self.first)
+        hotspot.source_scene = self.second
+        hotspot.save()
+        hotspot_counts = self.counts()[1]
+        self.assertEqual((hotspot_counts[self.first.id], hotspot_counts[self.second.id]), (0, 3))
+
+    def test_recount_repairs_drift(self):
+        Scene.objects.filter(pk=self.second.pk).update(is_active=False)
+        Tour.objects.filter(pk=self.tour.pk).update(scene_count=99)
+        self.assertEqual(counters.recount(Tour), 1)
+        self.assertEqual(self.counts()[0], 2)
+        self.assertEqual(counters.recount(Tour), 0)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Only safe requests to the tours API read from replicas."""
+
+    def read_aliases(self, method, path, cookies=None):
+        """Return the read alias before the view, in the view and after the request."""
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies or {})
+        aliases = []
+
+        def get_response(request):
+            aliases.append(router.db_for_read(Tour))
+            request.resolver_match = match = resolve(request.path_info)
+            middleware.process_view(request, match.func, match.args, match.kwargs)
+            aliases.append(router.db_for_read(Tour))
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(get_response)
+        middleware(request)
+        aliases.append(router.db_for_read(Tour))
+        return aliases
+
+    def test_api_reads_use_replicas(self):
+        self.assertEqual(self.read_aliases('get', '/api/tours/'), ['default', 'replica', 'default'])
+
+    def test_admin_reads_use_the_primary(self):
+        self.assertEqual(self.read_aliases('get', '/admin/tours/tour/1/change/'), ['default'] * 3)
+
+    def test_writes_and_pinned_clients_use_the_primary(self):
+        self.assertEqual(self.read_aliases('post', '/api/tours/'), ['default'] * 3)
+        pinned = {PIN_COOKIE: str(int(time.time()) + 60)}
+        self.assertEqual(self.read_aliases('get', '/api/tours/', pinned), ['default'] * 3)
@@ -0,0 +1,271 @@
+"""
+Multi-resolution tile pipeline for 360° panoramas.
+
+An equirectangular panorama is reprojected onto the six faces of a cube and
+each face is cut into a pyramid of square tiles, so the viewer can show a
+low-resolution level instantly and stream in only the tiles in view.
+
+Faces are named ``f`` (yaw 0), ``r`` (yaw 90), ``b`` (yaw 180), ``l``
+(yaw -90), ``u`` (up) and ``d`` (down). Tiles are stored next to the
+original file, in a new generation directory every time they are cut::
+
+    scenes/panoramas/lobby.jpg
+    scenes/panoramas/lobby_tiles/{generation}/preview.jpg
+    scenes/panoramas/lobby_tiles/{generation}/{level}/{face}/{y}_{x}.jpg
+
+Level 0 is the lowest resolution. Tiles are written with ``default_storage``
+and, like the content-addressed original, never change under their name,
+so they can be cached forever. The reprojection
+uses Pillow's MESH transform, so the per-pixel work runs in C on the CPU.
+"""
+import io
+import logging
+import math
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from .storage import new_generation
+
+logger = logging.getLogger(__name__)
+
+FACES = ('f', 'r', 'b', 'l', 'u', 'd')
+MANIFEST_VERSION = 1
+PREVIEW_SIZE = (1024, 512)
+
+
+def _direction(face, a, b):
+    """Return the view direction through point ``(a, b)`` of a cube face."""
+    if face == 'f':
+        return a, -b, 1.0
+    if face == 'r':
+        return 1.0, -b, -a
+    if face == 'b':
+        return -a, -b, -1.0
+    if face == 'l':
+        return -1.0, -b, a
+    if face == 'u':
+        return a, 1.0, b
+    return a, -1.0, -b
+
+
+def _to_source(face, a, b, width, height):
+    """Return equirectangular pixel coordinates ``(u, v)`` for a face point."""
+    x, y, z = _direction(face, a, b)
+    horizontal = math.hypot(x, z)
+    lat = math.atan2(y, horizontal)
+    # Longitude is undefined at the poles; the caller fills it in
+    lon = math.atan2(x, z) if horizontal > 1e-9 else None
+    v = (0.5 - lat / math.pi) * height
+    if lon is None:
+        return None, v
+    return (lon / (2 * math.pi) + 0.5) * width, v
+
+
+def _face_mesh(face, size, width, height, grid):
+    """
+    Build the MESH transform data mapping a ``size`` square face to the source.
+
+    Quads that straddle the ±180° seam are unwrapped to the right, which is
+    why the source image is padded with a copy of its left half.
+    """
+    mesh = []
+    step = size / grid
+    for row in range(grid):
+        for col in range(grid):
+            x0, y0 = round(col * step), round(row * step)
+            x1, y1 = round((col + 1) * step), round((row + 1) * step)
+            # Corner order expected by Pillow: UL, LL, LR, UR
+            corners = [(x0, y0), (x0, y1), (x1, y1), (x1, y0)]
+            points = [
+                _to_source(face, 2 * px / size - 1, 2 * py / size - 1, width, height)
+                for px, py in corners
+            ]
+            us = [u for u, _ in points if u is not None]
+            if max(us) - min(us) > width / 2:
+                us = [u + width if u < width / 2 else u for u in us]
+            fill = sum(us) / len(us)
+            quad = []
+            unwrapped = iter(us)
+            for u, v in points:
+                quad.extend((fill if u is None else next(unwrapped), v))
+            mesh.append(((x0, y0, x1, y1), quad))
+    return mesh
+
+
+def _face_levels(width, tile_size, max_face_size):
+    """Return the face sizes of the pyramid, smallest first."""
+    native = min(max(width // 4, tile_size), max_face_size)
+    sizes = [tile_size]
+    while sizes[-1] * 2 <= native:
+        sizes.append(sizes[-1] * 2)
+    return sizes
+
+
+def tiles_base(panorama_name, generation):
+    """Return the storage directory holding one generation of a panorama's tiles."""
+    return f'{os.path.splitext(panorama_name)[0]}_tiles/{generation}'
+
+
+def tile_names(manifest):
+    """Yield every storage name referenced by a manifest."""
+    base = manifest['base']
+    yield f"{base}/{manifest['preview']}"
+    for level_index, level in enumerate(manifest['levels']):
+        count = level['tiles']
+        for face in manifest['faces']:
+            for y in range(count):
+                for x in range(count):
+                    yield f"{base}/{level_index}/{face}/{y}_{x}.{manifest['format']}"
+
+
+def _save(storage, name, image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate_tiles(field_file):
+    """
+    Cut the panorama stored in ``field_file`` into cube-face tiles.
+
+    Returns the manifest describing the pyramid, suitable for storing on
+    ``Scene.tile_manifest``.
+    """
+    tile_size = getattr(settings, 'PANORAMA_TILE_SIZE', 512)
+    max_face_size = getattr(settings, 'PANORAMA_TILE_MAX_FACE_SIZE', 4096)
+    quality = getattr(settings, 'PANORAMA_TILE_QUALITY', 85)
+    storage = default_storage
+
+    with field_file.open('rb') as handle:
+        source = Image.open(handle)
+        # Let JPEG decode at reduced scale when the source exceeds the top level
+        source.draft('RGB', (max_face_size * 4, max_face_size * 2))
+        source = source.convert('RGB')
+
+    if source.width > max_face_size * 4:
+        source = source.resize(
+            (max_face_size * 4, max_face_size * 2), Image.Resampling.LANCZOS
+        )
+    width, height = source.size
+
+    preview = source.resize(PREVIEW_SIZE, Image.Resampling.LANCZOS)
+    padded = Image.new('RGB', (width + width // 2, height))
+    padded.paste(source, (0, 0))
+    padded.paste(source.crop((0, 0, width // 2, height)), (width, 0))
+    del source
+
+    sizes = _face_levels(width, tile_size, max_face_size)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'source': field_file.name,
+        'base': tiles_base(field_file.name, new_generation()),
+        'format': 'jpg',
+        'tile_size': tile_size,
+        'faces': list(FACES),
+        'preview': 'preview.jpg',
+        'levels': [{'size': size, 'tiles': size // tile_size} for size in sizes],
+    }
+    try:
+        _save(storage, f"{manifest['base']}/preview.jpg", preview, quality)
+        _cut_faces(storage, manifest['base'], padded, width, height, sizes, tile_size, quality)
+    except BaseException:
+        # Nothing refers to a half-written generation yet
+        delete_tiles(storage, manifest)
+        raise
+    return manifest
+
+
+def _cut_faces(storage, base, padded, width, height, sizes, tile_size, quality):
+    top = sizes[-1]
+    grid = max(16, top // 32)
+    for face in FACES:
+        face_image = padded.transform(
+            (top, top),
+            Image.Transform.MESH,
+            _face_mesh(face, top, width, height, grid),
+            Image.Resampling.BILINEAR,
+        )
+        for level_index, size in enumerate(sizes):
+            level_image = (
+                face_image if size == top
+                else face_image.resize((size, size), Image.Resampling.LANCZOS)
+            )
+            count = size // tile_size
+            for y in range(count):
+                for x in range(count):
+                    box = (x * tile_size, y * tile_size, (x + 1) * tile_size, (y + 1) * tile_size)
+                    _save(
+                        storage,
+                        f'{base}/{level_index}/{face}/{y}_{x}.jpg',
+                        level_image.crop(box),
+                        quality,
+                    )
+
+
+def tile_urls(manifest):
+    """Return the client-facing description of a manifest with its URLs."""
+    base_url = default_storage.url(manifest['base'])
+    return {
+        'tile_size': manifest['tile_size'],
+        'faces': manifest['faces'],
+        'levels': manifest['levels'],
+        'preview_url': f"{base_url}/{manifest['preview']}",
+        'tile_url_template': f"{base_url}/{{level}}/{{face}}/{{y}}_{{x}}.{manifest['format']}",
+    }
+
+
+def delete_tiles(storage, manifest):
+    """Remove every file referenced by a manifest from storage."""
+    for name in tile_names(manifest):
+        if storage.exists(name):
+            storage.delete(name)
+
+
+def needs_tiles(scene):
+    """Return whether the scene's tiles are missing or stale."""
+    if not scene.panorama_image:
+        return False
+    manifest = scene.tile_manifest or {}
+    return manifest.get('source') != scene.panorama_image.name
+
+
+def is_shared(manifest, exclude):
+    """Return whether a scene other than ``exclude`` uses the same tiles."""
+    from .models import Scene
+
+    return Scene.objects.filter(
+        tile_manifest__base=manifest['base']
+    ).exclude(pk=exclude).exists()
+
+
+def process_scene_tiles(scene):
+    """
+    (Re)generate the tiles of a scene and record the manifest.
+
+    Scenes sharing a content-addressed panorama share its tiles, so an
+    existing manifest for the same file is reused instead of re-tiling. The
+    previous pyramid is removed when the panorama changed and no other scene
+    uses it. Updates are written with ``QuerySet.update`` so no save signals
+    fire again.
+    """
+    from .cache import invalidate_tour
+    from .models import Scene
+
+    previous = scene.tile_manifest
+    manifest = Scene.objects.filter(
+        tile_manifest__source=scene.panorama_image.name,
+        tile_manifest__version=MANIFEST_VERSION,
+    ).exclude(pk=scene.pk).values_list('tile_manifest', flat=True).first()
+    if manifest is None:
+        manifest = generate_tiles(scene.panorama_image)
+    if previous and previous.get('base') != manifest['base'] and not is_shared(previous, scene.pk):
+        delete_tiles(default_storage, previous)
+
+    Scene.objects.filter(pk=scene.pk).update(tile_manifest=manifest)
+    scene.tile_manifest = manifest
+    invalidate_tour(scene.tour_id)
+    return manifest
@@ -0,0 +1,233 @@
+"""
+Per-request performance timings for VR Tours platform.
+
+``ServerTimingMiddleware`` measures a sample of requests
+(``SERVER_TIMING_SAMPLE_RATE``) and reports where the time went in a
+``Server-Timing`` header, which browser dev tools show next to each request:
+
+* ``db``: time in ``cursor.execute`` on any connection, with the query count;
+* ``serialize``: time in the ``to_representation`` of the serializers using
+  ``TimedSerializerMixin``, minus the queries they ran;
+* ``render``: time in the response renderers;
+* ``total``: the whole request, middleware included.
+
+Each sample is also added to rolling aggregates per URL name (the last
+``SERVER_TIMING_WINDOW`` samples), served by ``/api/timing/stats/``.
+Requests outside the sample cost one random number; inside it, a few clock
+reads per query and per serialized object.
+
+``request_sample`` shares one ``Sample`` between the middleware of a
+request; ``MetricsMiddleware`` uses it to count the queries of every
+request without the clock reads.
+
+State lives in a context variable, so it follows a request through threads
+(``sync_to_async``) and async views alike.
+"""
+import random
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+METRICS = ('db', 'serialize', 'render', 'total')
+
+_sample = ContextVar('server_timing', default=None)
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+class Sample:
+    """Query count and, once ``timed``, timings of one request in seconds."""
+
+    __slots__ = ('queries', 'durations', 'running', 'timed')
+
+    def __init__(self):
+        self.queries = 0
+        self.durations = dict.fromkeys(METRICS, 0.0)
+        self.running = set()
+        self.timed = False
+
+
+@contextmanager
+def request_sample(timed=False):
+    """
+    Yield the sample of the current request, starting it unless an outer
+    middleware already did. With ``timed`` the sample also measures
+    durations; otherwise it only counts queries.
+    """
+    sample = _sample.get()
+    token = None
+    if sample is None:
+        sample = Sample()
+        token = _sample.set(sample)
+    sample.timed = sample.timed or timed
+    try:
+        yield sample
+    finally:
+        if token is not None:
+            _sample.reset(token)
+
+
+def timed(metric):
+    """
+    Add the run time of the decorated function to ``metric`` of the current
+    sample. Nested and recursive calls count once, and queries run inside
+    are left to ``db``.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            sample = _sample.get()
+            if sample is None or not sample.timed or metric in sample.running:
+                return func(*args, **kwargs)
+            sample.running.add(metric)
+            start, sql = perf_counter(), sample.durations['db']
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sample.running.discard(metric)
+                sample.durations[metric] += perf_counter() - start - (sample.durations['db'] - sql)
+        return wrapper
+    return decorator
+
+
+class TimedSerializerMixin:
+    """Count the serializer's ``to_representation`` as ``serialize`` time."""
+
+    @timed('serialize')
+    def to_representation(self, instance):
+        return super().to_representation(instance)
+
+
+def _time_query(execute, sql, params, many, context):
+    sample = _sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    if not sample.timed:
+        sample.queries += 1
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.durations['db'] += perf_counter() - start
+        sample.queries += 1
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    """Time the queries of every database connection."""
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def server_timing_header(sample):
+    """Format a sample as a ``Server-Timing`` header value."""
+    entries = []
+    for metric in METRICS:
+        entry = f'{metric};dur={sample.durations[metric] * 1000:.2f}'
+        if metric == 'db':
+            entry += f';desc="{sample.queries} {"query" if sample.queries == 1 else "queries"}"'
+        entries.append(entry)
+    return ', '.join(entries)
+
+
+def record(endpoint, sample):
+    """Add a sample to the rolling aggregates of an endpoint."""
+    row = (sample.queries, *(sample.durations[metric] for metric in METRICS))
+    with _stats_lock:
+        stats = _stats.get(endpoint)
+        if stats is None:
+            stats = _stats[endpoint] = {'count': 0, 'recent': deque(maxlen=settings.SERVER_TIMING_WINDOW)}
+        stats['count'] += 1
+        stats['recent'].append(row)
+
+
+def _percentile(ordered, percent):
+    return ordered[min(int(percent / 100 * len(ordered)), len(ordered) - 1)]
+
+
+def get_timing_stats():
+    """
+    Return the rolling aggregates of this process per endpoint: the number
+    of samples, the query count and the mean and p95 of every metric in
+    milliseconds over the recent ones, and p50/p99 of ``total``.
+    """
+    with _stats_lock:
+        snapshot = {endpoint: (stats['count'], list(stats['recent'])) for endpoint, stats in _stats.items()}
+    result = {}
+    for endpoint, (count, rows) in sorted(snapshot.items()):
+        columns = list(zip(*rows))
+        entry = {
+            'samples': count,
+            'window': len(rows),
+            'queries_mean': round(sum(columns[0]) / len(rows), 2),
+            'queries_max': max(columns[0]),
+        }
+        for metric, values in zip(METRICS, columns[1:]):
+            ordered = sorted(values)
+            entry[f'{metric}_mean_ms'] = round(sum(ordered) / len(ordered) * 1000, 3)
+            entry[f'{metric}_p95_ms'] = round(_percentile(ordered, 95) * 1000, 3)
+            if metric == 'total':
+                entry['total_p50_ms'] = round(_percentile(ordered, 50) * 1000, 3)
+                entry['total_p99_ms'] = round(_percentile(ordered, 99) * 1000, 3)
+        result[endpoint] = entry
+    return result
+
+
+def reset_timing_stats():
+    """Forget the aggregates of this process."""
+    with _stats_lock:
+        _stats.clear()
+
+
+class ServerTimingMiddleware:
+    """Time a sample of requests, add ``Server-Timing`` and aggregate per endpoint."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        with request_sample(timed=True) as sample:
+            start = perf_counter()
+            response = self.get_response(request)
+        return self.finish(request, sample, perf_counter() - start, response)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        with request_sample(timed=True) as sample:
+            start = perf_counter()
+            response = await self.get_response(request)
+        return self.finish(request, sample, perf_counter() - start, response)
+
+    def sampled(self):
+        rate = settings.SERVER_TIMING_SAMPLE_RATE
+        return rate >= 1 or rate > 0 and random.random() < rate
+
+    def finish(self, request, sample, elapsed, response):
+        sample.durations['total'] = elapsed
+        header = server_timing_header(sample)
+        if response.has_header('Server-Timing'):
+            header = f"{response['Server-Timing']}, {header}"
+        response['Server-Timing'] = header
+        match = getattr(request, 'resolver_match', None)
+        record(match.view_name if match else '<unresolved>', sample)
+        return response
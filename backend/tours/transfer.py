@@ -0,0 +1,275 @@
+"""
+Tour export/import archives for moving tours between environments.
+
+An archive is a zip file holding ``tour.json`` (the tour, its scenes and
+hotspots) and every referenced media file under ``media/<storage name>``.
+Export streams the zip as it is written, so memory stays at one read
+buffer. Import stores media through the content-addressed storage, creates
+scenes and hotspots with ``bulk_create`` inside one transaction and queues
+media processing for the new scenes.
+"""
+import json
+import zipfile
+
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files import File
+from django.db import transaction
+
+from .cache import CATALOGUE, invalidate_tour
+from .counters import recount_scenes, recount_tours
+from .jobs import enqueue_many
+from .models import Tour, Scene, Hotspot
+from .search import index_hotspots, index_scenes
+
+ARCHIVE_FORMAT = 'vr-tours-archive'
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = 'tour.json'
+COPY_BLOCK_SIZE = 64 * 1024
+
+TOUR_FIELDS = ['title', 'description', 'is_active']
+SCENE_FIELDS = ['title', 'description', 'initial_yaw', 'initial_pitch', 'order', 'is_active']
+SCENE_FILE_FIELDS = ['panorama_image', 'voiceover_audio', 'map_image']
+HOTSPOT_FIELDS = ['yaw', 'pitch', 'label', 'size', 'color', 'is_active']
+
+
+class ArchiveError(ValueError):
+    """Raised when an archive can't be imported."""
+
+
+class _StreamBuffer:
+    """Write-only file object whose contents are drained by the generator."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return b''.join(chunks)
+
+
+def build_manifest(tour):
+    """Return the ``tour.json`` content and the media names it references."""
+    scenes = list(Scene.objects.filter(tour=tour).order_by('order'))
+    hotspots = Hotspot.objects.filter(source_scene__tour=tour).order_by('id').values(
+        'source_scene_id', 'target_scene_id', *HOTSPOT_FIELDS
+    )
+    media = set()
+
+    def media_name(field_file):
+        if not field_file:
+            return None
+        media.add(field_file.name)
+        return field_file.name
+
+    manifest = {
+        'format': ARCHIVE_FORMAT,
+        'version': ARCHIVE_VERSION,
+        'tour': {
+            **{field: getattr(tour, field) for field in TOUR_FIELDS},
+            'thumbnail': media_name(tour.thumbnail),
+        },
+        'scenes': [
+            {
+                'id': scene.id,
+                **{field: getattr(scene, field) for field in SCENE_FIELDS},
+                **{field: media_name(getattr(scene, field)) for field in SCENE_FILE_FIELDS},
+            }
+            for scene in scenes
+        ],
+        'hotspots': [
+            {
+                'source_scene': hotspot.pop('source_scene_id'),
+                'target_scene': hotspot.pop('target_scene_id'),
+                **hotspot,
+            }
+            for hotspot in hotspots
+        ],
+    }
+    return manifest, sorted(media)
+
+
+def stream_export(tour):
+    """Yield the bytes of a tour archive as it is being written."""
+    manifest, media = build_manifest(tour)
+    storage = Tour._meta.get_field('thumbnail').storage
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr(
+            MANIFEST_NAME,
+            json.dumps(manifest, indent=2),
+            compress_type=zipfile.ZIP_DEFLATED,
+        )
+        yield buffer.drain()
+        for name in media:
+            if not storage.exists(name):
+                continue
+            info = zipfile.ZipInfo(f'media/{name}')
+            # Media is already compressed; store it as is
+            info.compress_type = zipfile.ZIP_STORED
+            size = storage.size(name)
+            with storage.open(name, 'rb') as source, \
+                    archive.open(info, 'w', force_zip64=size > zipfile.ZIP64_LIMIT) as target:
+                while True:
+                    block = source.read(COPY_BLOCK_SIZE)
+                    if not block:
+                        break
+                    target.write(block)
+                    yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def export_filename(tour):
+    return f'tour-{tour.pk}.zip'
+
+
+def _clean_record(record, what, model, fields, file_fields=()):
+    """Check one tour, scene or hotspot of the manifest, cleaning its values in place."""
+    if not isinstance(record, dict):
+        raise ArchiveError(f"{MANIFEST_NAME}: {what} is not an object.")
+    for name in fields:
+        if name not in record:
+            raise ArchiveError(f"{MANIFEST_NAME}: {what} has no {name}.")
+        try:
+            record[name] = model._meta.get_field(name).clean(record[name], None)
+        except ValidationError as error:
+            raise ArchiveError(f"{MANIFEST_NAME}: invalid {name} of {what}: {' '.join(error.messages)}")
+    for name in file_fields:
+        if not isinstance(record.get(name) or '', str):
+            raise ArchiveError(f"{MANIFEST_NAME}: {name} of {what} is not a file name.")
+
+
+def _check_id(value, what):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ArchiveError(f"{MANIFEST_NAME}: {what} is not a scene id.")
+
+
+def _read_manifest(archive):
+    try:
+        manifest = json.loads(archive.read(MANIFEST_NAME))
+    except KeyError:
+        raise ArchiveError(f"Archive has no {MANIFEST_NAME}.")
+    except ValueError:
+        raise ArchiveError(f"{MANIFEST_NAME} is not valid JSON.")
+    if not isinstance(manifest, dict) or manifest.get('format') != ARCHIVE_FORMAT:
+        raise ArchiveError("Not a VR Tours archive.")
+    if manifest.get('version') != ARCHIVE_VERSION:
+        raise ArchiveError(f"Unsupported archive version {manifest.get('version')}.")
+
+    _clean_record(manifest.get('tour'), 'the tour', Tour, TOUR_FIELDS, ['thumbnail'])
+    for key in ('scenes', 'hotspots'):
+        if not isinstance(manifest.get(key), list):
+            raise ArchiveError(f"{MANIFEST_NAME}: {key} is not a list.")
+    for number, scene in enumerate(manifest['scenes'], 1):
+        _clean_record(scene, f'scene {number}', Scene, SCENE_FIELDS, SCENE_FILE_FIELDS)
+        _check_id(scene.get('id'), f'id of scene {number}')
+    # Checked before any write, so a bad archive is refused rather than
+    # failing a constraint halfway through the import
+    for key in ('id', 'order'):
+        values = [scene[key] for scene in manifest['scenes']]
+        if len(set(values)) != len(values):
+            raise ArchiveError(f"{MANIFEST_NAME}: two scenes have the same {key}.")
+    scene_ids = {scene['id'] for scene in manifest['scenes']}
+    for number, hotspot in enumerate(manifest['hotspots'], 1):
+        _clean_record(hotspot, f'hotspot {number}', Hotspot, HOTSPOT_FIELDS)
+        for key in ('source_scene', 'target_scene'):
+            _check_id(hotspot.get(key), f'{key} of hotspot {number}')
+            if hotspot[key] not in scene_ids:
+                raise ArchiveError(f"{MANIFEST_NAME}: {key} of hotspot {number} is missing from the archive.")
+    return manifest
+
+
+def import_tour(fileobj):
+    """
+    Create a tour from an archive and return it.
+
+    ``fileobj`` must be seekable (a file on disk or an uploaded file).
+    Original scene ids are remapped to the new rows for the hotspots.
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise ArchiveError("Archive is not a valid zip file.")
+
+    with archive:
+        manifest = _read_manifest(archive)
+        storage = Tour._meta.get_field('thumbnail').storage
+        stored = {}
+        extra_references = {}
+
+        def store(name):
+            """Store a referenced media file once and return its new name."""
+            if not name:
+                return ''
+            if name in stored:
+                extra_references[stored[name]] = extra_references.get(stored[name], 0) + 1
+            else:
+                try:
+                    info = archive.getinfo(f'media/{name}')
+                except KeyError:
+                    raise ArchiveError(f"Archive is missing media file {name}.")
+                with archive.open(info) as member:
+                    content = File(member, name=name)
+                    content.size = info.file_size
+                    try:
+                        stored[name] = storage.save(name, content)
+                    except SuspiciousFileOperation:
+                        raise ArchiveError(f"Archive has an unsafe media file name {name}.")
+            return stored[name]
+
+        with transaction.atomic():
+            tour_data = manifest['tour']
+            tour = Tour(**{field: tour_data[field] for field in TOUR_FIELDS})
+            tour.thumbnail.name = store(tour_data.get('thumbnail'))
+            tour.save()
+
+            scenes = []
+            for scene_data in manifest['scenes']:
+                scene = Scene(tour=tour, **{field: scene_data[field] for field in SCENE_FIELDS})
+                for field in SCENE_FILE_FIELDS:
+                    getattr(scene, field).name = store(scene_data.get(field))
+                scenes.append(scene)
+            Scene.objects.bulk_create(scenes)
+            scene_ids = {
+                scene_data['id']: scene.pk
+                for scene_data, scene in zip(manifest['scenes'], scenes)
+            }
+
+            hotspots = [
+                Hotspot(
+                    source_scene_id=scene_ids[hotspot_data['source_scene']],
+                    target_scene_id=scene_ids[hotspot_data['target_scene']],
+                    **{field: hotspot_data[field] for field in HOTSPOT_FIELDS},
+                )
+                for hotspot_data in manifest['hotspots']
+            ]
+            Hotspot.objects.bulk_create(hotspots)
+
+            # Every field pointing at a stored file holds one reference to it
+            for name, count in extra_references.items():
+                storage.add_references(name, count)
+
+            # bulk_create skips signals, so count, queue processing, index and invalidate by hand
+            recount_tours([tour.pk])
+            recount_scenes([scene.pk for scene in scenes])
+            scenes_with_media = [scene for scene in scenes if scene.panorama_image or scene.map_image]
+            Scene.objects.filter(pk__in=[scene.pk for scene in scenes_with_media]).update(
+                processing_status=Scene.PROCESSING_PENDING
+            )
+            enqueue_many('process_scene_media', [
+                (f'scene-media:{scene.pk}', {'scene_id': scene.pk})
+                for scene in scenes_with_media
+            ])
+            index_scenes(scenes)
+            index_hotspots(hotspots, {scene.pk: tour.pk for scene in scenes})
+            invalidate_tour(tour.pk)
+            invalidate_tour(CATALOGUE)
+
+    return tour
@@ -0,0 +1,159 @@
+"""
+Resumable chunked uploads for large scene media.
+
+Chunks are streamed from the request straight into a part file on disk at
+the offset the client claims, so memory per upload stays at one read
+buffer however big the file is. On completion the part file is handed to
+storage as a temporary file, which ``FileSystemStorage`` moves into place
+instead of copying it through Python. Writers of one upload take turns
+under a lock on its part file, which is local to the host like the file
+itself.
+"""
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .metrics import increment
+from .models import ChunkedUpload
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not on Windows
+    fcntl = None
+
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+class UploadOffsetMismatch(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Chunk offset does not match the bytes received so far."
+    default_code = 'offset_mismatch'
+
+
+class _PartFile(File):
+    """A file on local disk that storage may move instead of copy."""
+
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name=name)
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def upload_dir():
+    path = Path(getattr(settings, 'CHUNKED_UPLOAD_DIR', Path(settings.BASE_DIR) / 'uploads'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def part_path(upload):
+    """Return the path of the part file that receives an upload's chunks."""
+    return upload_dir() / f'{upload.pk}.part'
+
+
+def write_chunk(upload, offset, stream):
+    """
+    Append a chunk read from ``stream`` at ``offset`` and return the new offset.
+
+    The offset must equal the bytes received so far; on mismatch the client
+    should ask for the current offset and resume from there.
+    """
+    if upload.status != ChunkedUpload.STATUS_OPEN:
+        raise ValidationError("Upload is already complete.")
+    if offset != upload.offset:
+        raise UploadOffsetMismatch()
+
+    path = part_path(upload)
+    written = 0
+    # Opened without truncating or appending, so the chunk lands at offset
+    with os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), 'r+b') as part:
+        if fcntl is not None:
+            # Released when the file is closed
+            fcntl.flock(part, fcntl.LOCK_EX)
+        # A request for the same offset may have written it while we waited
+        if not ChunkedUpload.objects.filter(
+            pk=upload.pk, offset=offset, status=ChunkedUpload.STATUS_OPEN
+        ).exists():
+            raise UploadOffsetMismatch()
+        part.seek(offset)
+        while True:
+            data = stream.read(READ_BUFFER_SIZE)
+            if not data:
+                break
+            if offset + written + len(data) > upload.size:
+                part.truncate(offset)
+                raise ValidationError("Chunk exceeds the declared upload size.")
+            part.write(data)
+            written += len(data)
+        part.truncate(offset + written)
+
+        # Compare-and-set, still under the lock, so the offset only ever
+        # counts bytes that are in the part file
+        updated = ChunkedUpload.objects.filter(
+            pk=upload.pk, offset=offset, status=ChunkedUpload.STATUS_OPEN
+        ).update(offset=offset + written, updated_at=timezone.now())
+        if not updated:
+            part.truncate(offset)
+            raise UploadOffsetMismatch()
+    increment('upload_bytes_total', written, kind='chunked')
+    upload.offset = offset + written
+    return upload.offset
+
+
+def complete_upload(upload):
+    """Attach a fully received upload to its scene field and return the scene."""
+    if upload.status != ChunkedUpload.STATUS_OPEN:
+        raise ValidationError("Upload is already complete.")
+    if upload.offset != upload.size:
+        raise ValidationError(
+            f"Upload is incomplete: received {upload.offset} of {upload.size} bytes."
+        )
+
+    path = part_path(upload)
+    scene = upload.scene
+    with transaction.atomic():
+        claimed = ChunkedUpload.objects.filter(
+            pk=upload.pk, status=ChunkedUpload.STATUS_OPEN
+        ).update(status=ChunkedUpload.STATUS_COMPLETE, updated_at=timezone.now())
+        if not claimed:
+            raise ValidationError("Upload is already complete.")
+        part = _PartFile(str(path), upload.filename)
+        try:
+            getattr(scene, upload.field).save(upload.filename, part, save=True)
+        finally:
+            part.close()
+    if path.exists():
+        # Storage copied rather than moved the part file
+        os.remove(path)
+    upload.status = ChunkedUpload.STATUS_COMPLETE
+    return scene
+
+
+def abort_upload(upload):
+    """Delete an upload and its part file."""
+    path = part_path(upload)
+    if path.exists():
+        os.remove(path)
+    upload.delete()
+
+
+def purge_expired():
+    """Abort open uploads untouched for ``CHUNKED_UPLOAD_EXPIRY`` seconds."""
+    expiry = getattr(settings, 'CHUNKED_UPLOAD_EXPIRY', 24 * 60 * 60)
+    expired = ChunkedUpload.objects.filter(
+        status=ChunkedUpload.STATUS_OPEN,
+        updated_at__lt=timezone.now() - timedelta(seconds=expiry),
+    )
+    count = 0
+    for upload in expired:
+        abort_upload(upload)
+        count += 1
+    return count
@@ -1,28 +1,65 @@
 """
 URL configuration for VR Tours API.
 """
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'tours'
 
+# Read endpoints; under ASGI the async views keep them off worker threads
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+    tour_list = async_views.tour_list
+    tour_detail = async_views.tour_detail
+    tour_scenes = async_views.tour_scenes
+    tour_navigation = async_views.tour_navigation
+    scene_detail = async_views.scene_detail
+    scene_hotspots = async_views.scene_hotspots
+else:
+    tour_list = views.TourListAPIView.as_view()
+    tour_detail = views.TourDetailAPIView.as_view()
+    tour_scenes = views.TourScenesAPIView.as_view()
+    tour_navigation = views.tour_navigation
+    scene_detail = views.SceneDetailAPIView.as_view()
+    scene_hotspots = views.SceneHotspotsAPIView.as_view()
+
 urlpatterns = [
     # API Overview
     path('', views.api_overview, name='api-overview'),
     path('health/', views.health_check, name='health-check'),
+    path('cache/stats/', views.cache_stats, name='cache-stats'),
+    path('timing/stats/', views.timing_stats, name='timing-stats'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('search/', views.site_search, name='search'),
     
     # Tours
-    path('tours/', views.TourListAPIView.as_view(), name='tour-list'),
-    path('tours/<int:id>/', views.TourDetailAPIView.as_view(), name='tour-detail'),
-    path('tours/<int:tour_id>/scenes/', views.TourScenesAPIView.as_view(), name='tour-scenes'),
-    path('tours/<int:tour_id>/navigation/', views.tour_navigation, name='tour-navigation'),
+    path('tours/', tour_list, name='tour-list'),
+    path('tours/<int:id>/', tour_detail, name='tour-detail'),
+    path('tours/<int:tour_id>/scenes/', tour_scenes, name='tour-scenes'),
+    path('tours/<int:tour_id>/navigation/', tour_navigation, name='tour-navigation'),
+    path('tours/<int:tour_id>/bundle/', views.tour_bundle, name='tour-bundle'),
+    path('tours/<int:tour_id>/route/', views.tour_route, name='tour-route'),
+    path('tours/<int:tour_id>/reachability/', views.tour_reachability, name='tour-reachability'),
+    path('tours/<int:tour_id>/export/', views.tour_export, name='tour-export'),
+    path('tours/import/', views.tour_import, name='tour-import'),
     
     # Scenes
-    path('scenes/<int:id>/', views.SceneDetailAPIView.as_view(), name='scene-detail'),
-    path('scenes/<int:scene_id>/hotspots/', views.SceneHotspotsAPIView.as_view(), name='scene-hotspots'),
+    path('scenes/<int:id>/', scene_detail, name='scene-detail'),
+    path('scenes/<int:scene_id>/hotspots/', scene_hotspots, name='scene-hotspots'),
+    path('scenes/<int:scene_id>/clusters/', views.scene_hotspot_clusters, name='scene-hotspot-clusters'),
+    path('scenes/<int:scene_id>/tiles/', views.scene_tiles, name='scene-tiles'),
+    path('scenes/<int:scene_id>/processing/', views.scene_processing, name='scene-processing'),
     
     # Content management endpoints (optional)
     path('tours/create/', views.TourCreateAPIView.as_view(), name='tour-create'),
     path('scenes/create/', views.SceneCreateAPIView.as_view(), name='scene-create'),
     path('hotspots/create/', views.HotspotCreateAPIView.as_view(), name='hotspot-create'),
+    path('hotspots/bulk/', views.HotspotBulkAPIView.as_view(), name='hotspot-bulk'),
+    path('hotspots/<int:hotspot_id>/click/', views.hotspot_click, name='hotspot-click'),
+    
+    # Resumable chunked uploads
+    path('uploads/', views.ChunkedUploadCreateAPIView.as_view(), name='upload-create'),
+    path('uploads/<uuid:id>/', views.ChunkedUploadAPIView.as_view(), name='upload-detail'),
+    path('uploads/<uuid:id>/complete/', views.chunked_upload_complete, name='upload-complete'),
 ] 
\ No newline at end of file
@@ -0,0 +1,222 @@
+"""
+Derivative image variants for VR Tours platform.
+
+Each image field gets a few sized presets, each encoded in every modern
+format Pillow supports plus a JPEG fallback. Variants are stored next to the
+original file::
+
+    tours/thumbnails/cover.jpg
+    tours/thumbnails/cover_variants/card.webp
+    tours/thumbnails/cover_variants/card.jpg
+
+and recorded on the model's ``image_variants`` field, so serializers and the
+admin can reference them without touching storage.
+
+The API lists every format of a preset (``thumbnail_variants``,
+``panorama_thumbnail``, ...) for ``<picture>`` sources, since the browser
+knows what it decodes: the ``Accept`` header of the JSON request that
+fetched the URLs is not the one of the image requests. Single-URL fields
+only pick a modern format when the API request lists it explicitly.
+"""
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, features
+
+from .storage import new_generation
+
+# Bounding boxes per field and preset; images are shrunk to fit, never enlarged
+IMAGE_VARIANTS = {
+    'thumbnail': {'card': (640, 400), 'admin': (200, 200)},
+    'panorama_image': {'card': (640, 320), 'admin': (400, 200)},
+    'map_image': {'card': (400, 400), 'admin': (200, 200)},
+}
+
+# Preferred first when the client accepts several
+FORMATS = ('avif', 'webp', 'jpeg')
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg'}
+QUALITY = {'avif': 60, 'webp': 80, 'jpeg': 82}
+
+
+def available_formats():
+    """Return the output formats supported by the installed Pillow."""
+    return [fmt for fmt in FORMATS if fmt == 'jpeg' or features.check(fmt)]
+
+
+def negotiate_format(accept, formats):
+    """
+    Pick the best of ``formats`` for an ``Accept`` header.
+
+    Only formats listed explicitly with a non-zero quality are chosen over
+    the JPEG fallback, since wildcards say nothing about decoder support.
+    """
+    qualities = {}
+    for part in (accept or '').split(','):
+        media_type, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_type.strip().lower()] = quality
+
+    best, best_quality = 'jpeg', 0.0
+    for fmt in FORMATS:
+        quality = qualities.get(MIME_TYPES[fmt], 0.0)
+        if fmt in formats and fmt != 'jpeg' and quality > best_quality:
+            best, best_quality = fmt, quality
+    return best if best in formats else next(iter(formats), None)
+
+
+def variants_base(name, generation):
+    """Return the storage directory holding one generation of a file's variants."""
+    return f'{os.path.splitext(name)[0]}_variants/{generation}'
+
+
+def generate_variants(field_file, presets):
+    """
+    Render every preset of ``field_file`` in every available format.
+
+    Returns the entry recorded under the field name in ``image_variants``.
+    """
+    storage = default_storage
+    base = variants_base(field_file.name, new_generation())
+    largest = max(presets.values())
+
+    with field_file.open('rb') as handle:
+        source = Image.open(handle)
+        # JPEG sources can decode directly at a reduced scale
+        source.draft('RGB', (largest[0] * 2, largest[1] * 2))
+        has_alpha = source.mode in ('RGBA', 'LA') or 'transparency' in source.info
+        source = source.convert('RGBA' if has_alpha else 'RGB')
+
+    entry = {'source': field_file.name}
+    try:
+        for preset, size in presets.items():
+            image = source.copy()
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+            entry[preset] = {'width': image.width, 'height': image.height}
+            for fmt in available_formats():
+                buffer = io.BytesIO()
+                encoded = image.convert('RGB') if fmt == 'jpeg' else image
+                encoded.save(buffer, format=fmt.upper(), quality=QUALITY[fmt])
+                name = f'{base}/{preset}.{EXTENSIONS[fmt]}'
+                entry[preset][fmt] = storage.save(name, ContentFile(buffer.getvalue()))
+    except BaseException:
+        # Nothing refers to a half-written generation yet
+        delete_variants(storage, entry)
+        raise
+    return entry
+
+
+def delete_variants(storage, entry):
+    """Remove every file referenced by a variants entry from storage."""
+    for preset, formats in entry.items():
+        if preset == 'source':
+            continue
+        for fmt in FORMATS:
+            name = formats.get(fmt)
+            if name and storage.exists(name):
+                storage.delete(name)
+
+
+def is_shared(instance, field_name, entry):
+    """Return whether another row of the same model uses the same variants."""
+    return type(instance).objects.filter(
+        **{f'image_variants__{field_name}__source': entry.get('source')}
+    ).exclude(pk=instance.pk).exists()
+
+
+def _existing_entry(instance, field_name, name):
+    """Return the variants entry another row already has for file ``name``."""
+    rows = type(instance).objects.filter(
+        **{f'image_variants__{field_name}__source': name}
+    ).exclude(pk=instance.pk).values_list('image_variants', flat=True)[:1]
+    for row in rows:
+        return row[field_name]
+    return None
+
+
+def needs_variants(instance):
+    """Return whether any image field's variants are missing or stale."""
+    entries = instance.image_variants or {}
+    for field_name in IMAGE_VARIANTS:
+        if not hasattr(instance, field_name):
+            continue
+        field_file = getattr(instance, field_name)
+        entry = entries.get(field_name)
+        if field_file and (not entry or entry.get('source') != field_file.name):
+            return True
+        if entry and not field_file:
+            return True
+    return False
+
+
+def process_image_variants(instance):
+    """
+    Bring ``instance.image_variants`` in line with its image fields.
+
+    Stale entries are regenerated and entries of cleared fields dropped,
+    together with their files unless another row still uses them. Returns whether anything changed; the result
+    is written with ``QuerySet.update`` so no save signals fire again.
+    """
+    current = dict(instance.image_variants or {})
+    changed = False
+    for field_name, presets in IMAGE_VARIANTS.items():
+        if not hasattr(instance, field_name):
+            continue
+        field_file = getattr(instance, field_name)
+        entry = current.get(field_name)
+        if entry and (not field_file or entry.get('source') != field_file.name):
+            if not is_shared(instance, field_name, entry):
+                delete_variants(default_storage, entry)
+            del current[field_name]
+            changed = True
+        if field_file and field_name not in current:
+            # Identical uploads share a content-addressed name, and so variants
+            current[field_name] = (
+                _existing_entry(instance, field_name, field_file.name)
+                or generate_variants(field_file, presets)
+            )
+            changed = True
+
+    if changed:
+        type(instance).objects.filter(pk=instance.pk).update(image_variants=current)
+        instance.image_variants = current
+    return changed
+
+
+def variant_urls(instance, field_name, preset):
+    """Return ``{format: url}`` of a preset, or ``None`` if not generated."""
+    field_file = getattr(instance, field_name)
+    entry = (instance.image_variants or {}).get(field_name)
+    if not field_file or not entry or entry.get('source') != field_file.name:
+        return None
+    formats = entry.get(preset)
+    if not formats:
+        return None
+    return {
+        fmt: default_storage.url(formats[fmt])
+        for fmt in FORMATS if fmt in formats
+    }
+
+
+def variant_url(instance, field_name, preset, accept=None):
+    """
+    Return the URL of the best variant for ``accept``.
+
+    ``accept`` should come from a request for the image itself, or list the
+    image types the client decodes; ``application/json`` alone gets JPEG.
+    Falls back to the original file while variants are missing.
+    """
+    urls = variant_urls(instance, field_name, preset)
+    if not urls:
+        field_file = getattr(instance, field_name)
+        return field_file.url if field_file else None
+    return urls[negotiate_format(accept, urls)]
@@ -0,0 +1,152 @@
+"""
+Viewport windowing of scene hotspots for VR Tours platform.
+
+A viewer only needs the hotspots inside its view cone: the spherical cap of
+angular radius ``fov / 2`` around the direction it looks at. Each scene's
+active hotspots are indexed once into a grid of yaw/pitch buckets holding
+their unit vectors; a query only visits the buckets the cap can touch
+(wrapping across the ±180° yaw seam and widening to every yaw near the
+poles) and then keeps the candidates whose great-circle distance to the view
+direction is inside the cap. Indexes are cached under the tour's versioned
+key, so any hotspot change rebuilds them. NumPy vectorizes the distance test
+when it is installed; without it the same test runs in pure Python.
+"""
+import math
+from array import array
+
+from .cache import get_or_build, tour_cache_key
+from .models import Hotspot
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BUCKET_DEGREES = 15
+_COLUMNS = 360 // BUCKET_DEGREES
+_ROWS = 180 // BUCKET_DEGREES
+
+
+def unit_vectors(yaws, pitches):
+    """Return ``(x, y, z)`` lists of the unit vectors of yaw/pitch pairs in degrees."""
+    xs, ys, zs = [], [], []
+    for yaw, pitch in zip(yaws, pitches):
+        yaw, pitch = math.radians(yaw), math.radians(pitch)
+        xs.append(math.cos(pitch) * math.cos(yaw))
+        ys.append(math.cos(pitch) * math.sin(yaw))
+        zs.append(math.sin(pitch))
+    return xs, ys, zs
+
+
+def _column(yaw):
+    return int((yaw + 180.0) // BUCKET_DEGREES) % _COLUMNS
+
+
+def _row(pitch):
+    return min(int((pitch + 90.0) // BUCKET_DEGREES), _ROWS - 1)
+
+
+class HotspotIndex:
+    """Active hotspots of one scene bucketed by yaw and pitch."""
+
+    __slots__ = ('ids', 'x', 'y', 'z', 'offsets', 'members')
+
+    def __init__(self, hotspots):
+        """Build the index from ``(id, yaw, pitch)`` triples."""
+        hotspots = list(hotspots)
+        self.ids = array('q', [hotspot_id for hotspot_id, _, _ in hotspots])
+        xs, ys, zs = unit_vectors(
+            [yaw for _, yaw, _ in hotspots], [pitch for _, _, pitch in hotspots]
+        )
+        self.x, self.y, self.z = array('d', xs), array('d', ys), array('d', zs)
+
+        # Bucket membership in CSR form, like the scene graph
+        buckets = [[] for _ in range(_ROWS * _COLUMNS)]
+        for position, (_, yaw, pitch) in enumerate(hotspots):
+            buckets[_row(pitch) * _COLUMNS + _column(yaw)].append(position)
+        self.offsets = array('l', [0])
+        self.members = array('l')
+        for bucket in buckets:
+            self.members.extend(bucket)
+            self.offsets.append(len(self.members))
+
+    def __getstate__(self):
+        return self.ids, self.x, self.y, self.z, self.offsets, self.members
+
+    def __setstate__(self, state):
+        self.ids, self.x, self.y, self.z, self.offsets, self.members = state
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _candidates(self, yaw, pitch, radius):
+        """Return positions in the buckets a cap of ``radius`` degrees can touch."""
+        if radius >= 90.0:
+            return range(len(self.ids))
+
+        low, high = pitch - radius, pitch + radius
+        if low <= -90.0 or high >= 90.0:
+            # The cap covers a pole, so it spans every yaw
+            columns = range(_COLUMNS)
+        else:
+            # Widest yaw reach of a cap, at the latitude where it is tangent
+            # to a meridian: asin(sin r / cos pitch)
+            spread = math.degrees(math.asin(min(
+                1.0, math.sin(math.radians(radius)) / math.cos(math.radians(pitch))
+            )))
+            if spread >= 180.0 - BUCKET_DEGREES:
+                columns = range(_COLUMNS)
+            else:
+                first = _column(yaw - spread)
+                count = (_column(yaw + spread) - first) % _COLUMNS + 1
+                columns = [(first + step) % _COLUMNS for step in range(count)]
+
+        candidates = []
+        for row in range(_row(max(low, -90.0)), _row(min(high, 90.0)) + 1):
+            for column in columns:
+                bucket = row * _COLUMNS + column
+                candidates.extend(self.members[self.offsets[bucket]:self.offsets[bucket + 1]])
+        return candidates
+
+    def visible(self, yaw, pitch, fov):
+        """
+        Return the ids of hotspots within ``fov / 2`` degrees of great-circle
+        distance from the view direction ``yaw``/``pitch``.
+        """
+        radius = fov / 2.0
+        candidates = self._candidates(yaw, pitch, radius)
+        if not candidates:
+            return []
+        (cx,), (cy,), (cz,) = unit_vectors([yaw], [pitch])
+        # Inside the cap exactly when the dot product exceeds cos(radius)
+        threshold = math.cos(math.radians(radius)) - 1e-12
+
+        if numpy is not None:
+            positions = numpy.fromiter(candidates, dtype=numpy.intp, count=len(candidates))
+            x = numpy.frombuffer(self.x, dtype=numpy.float64)[positions]
+            y = numpy.frombuffer(self.y, dtype=numpy.float64)[positions]
+            z = numpy.frombuffer(self.z, dtype=numpy.float64)[positions]
+            inside = positions[x * cx + y * cy + z * cz >= threshold]
+            return numpy.frombuffer(self.ids, dtype=numpy.int64)[inside].tolist()
+
+        return [
+            self.ids[position] for position in candidates
+            if self.x[position] * cx + self.y[position] * cy + self.z[position] * cz >= threshold
+        ]
+
+
+def build_hotspot_index(scene_id):
+    """Index the hotspots the viewer shows in a scene."""
+    return HotspotIndex(Hotspot.objects.filter(
+        source_scene_id=scene_id,
+        is_active=True,
+        target_scene__is_active=True
+    ).order_by().values_list('id', 'yaw', 'pitch'))
+
+
+def get_hotspot_index(scene_id, tour_id):
+    """Return the cached hotspot index of a scene, building it on a miss."""
+    return get_or_build(
+        tour_cache_key(f'hotspot-index:{scene_id}', tour_id),
+        lambda: build_hotspot_index(scene_id)
+    )
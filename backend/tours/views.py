@@ -1,26 +1,62 @@
 """
 Django REST Framework views for VR Tours platform.
 """
+import io
+import os
+import tempfile
+import time
+from functools import partial
+
 from rest_framework import generics, status
-from rest_framework.decorators import api_view
+from rest_framework.views import APIView
+from rest_framework.decorators import api_view, parser_classes
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Prefetch
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, OuterRef, Prefetch, Subquery
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 
-from .models import Tour, Scene, Hotspot
+from .cache import get_cache_stats, get_or_build, invalidate_tour, tour_cache_key
+from .clustering import CLUSTER_RADII, get_scene_clusters, level_for_fov
+from .conditional import catalogue_condition, scene_kwarg_condition, tour_kwarg_condition
+from .counters import recount_scenes
+from .graph import get_scene_graph
+from .metrics import render_metrics
+from .models import Tour, Scene, Hotspot, Job, ChunkedUpload
+from .pagination import KeysetPagination, SceneKeysetPagination
+from .routers import replica_pinning_exempt
 from .serializers import (
     TourListSerializer,
     TourDetailSerializer,
     SceneListSerializer,
     SceneDetailSerializer,
+    TourBundleSerializer,
+    BundleSceneSerializer,
+    BundleHotspotSerializer,
     HotspotSerializer,
     HotspotCreateSerializer,
+    HotspotBulkItemSerializer,
     SceneCreateSerializer,
+    ChunkedUploadSerializer,
+    validate_hotspot_batch,
 )
+from .search import FullTextSearchFilter, KINDS, index_hotspots, search
+from .storage import get_media_storage
+from .tiling import tile_urls
+from .timing import get_timing_stats
+from .transfer import ArchiveError, export_filename, import_tour, stream_export
+from .uploads import abort_upload, complete_upload, write_chunk
+from .viewport import get_hotspot_index
 
 
+@method_decorator(catalogue_condition, name='get')
 class TourListAPIView(generics.ListAPIView):
     """
     API view to list all active tours.
@@ -28,18 +64,24 @@ class TourListAPIView(generics.ListAPIView):
     GET /api/tours/
     """
     serializer_class = TourListSerializer
-    filter_backends = [SearchFilter, OrderingFilter]
+    pagination_class = KeysetPagination
+    filter_backends = [FullTextSearchFilter, OrderingFilter]
     search_fields = ['title', 'description']
     ordering_fields = ['title', 'created_at', 'scene_count']
     ordering = ['-created_at']
     
     def get_queryset(self):
-        """Return only active tours with optimized queries."""
-        return Tour.objects.filter(is_active=True).prefetch_related(
-            Prefetch('scenes', queryset=Scene.objects.filter(is_active=True).order_by('order'))
+        """Return only active tours with the first scene annotated."""
+        first_scene = Scene.objects.filter(
+            tour=OuterRef('pk'),
+            is_active=True
+        ).order_by('order').values('id')[:1]
+        return Tour.objects.filter(is_active=True).annotate(
+            first_scene_id=Subquery(first_scene),
         )
 
 
+@method_decorator(tour_kwarg_condition('id'), name='get')
 class TourDetailAPIView(generics.RetrieveAPIView):
     """
     API view to retrieve a specific tour with all its scenes.
@@ -59,6 +101,7 @@ class TourDetailAPIView(generics.RetrieveAPIView):
         )
 
 
+@method_decorator(tour_kwarg_condition('tour_id'), name='get')
 class TourScenesAPIView(generics.ListAPIView):
     """
     API view to list all scenes in a specific tour.
@@ -66,6 +109,7 @@ class TourScenesAPIView(generics.ListAPIView):
     GET /api/tours/{tour_id}/scenes/
     """
     serializer_class = SceneListSerializer
+    pagination_class = SceneKeysetPagination
     
     def get_queryset(self):
         """Return scenes for the specified tour."""
@@ -77,15 +121,37 @@ class TourScenesAPIView(generics.ListAPIView):
         ).order_by('order')
 
 
+def preload_links(neighbours):
+    """Return the ``Link`` header preloading the likeliest next panoramas, or ''."""
+    return ', '.join(
+        f'<{neighbour["preload_url"]}>; rel=preload; as=image'
+        for neighbour in neighbours[:settings.SCENE_PRELOAD_LIMIT]
+        if neighbour['preload_url']
+    )
+
+
+@method_decorator(scene_kwarg_condition('id'), name='get')
 class SceneDetailAPIView(generics.RetrieveAPIView):
     """
     API view to retrieve a specific scene with all its details and hotspots.
     
+    ``neighbours`` lists the scenes one click away, most followed first,
+    and the first ``SCENE_PRELOAD_LIMIT`` of them are announced in
+    ``Link: rel=preload`` headers so the browser fetches their panoramas
+    while the visitor looks around.
+    
     GET /api/scenes/{id}/
     """
     serializer_class = SceneDetailSerializer
     lookup_field = 'id'
     
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        links = preload_links(response.data['neighbours'])
+        if links:
+            response['Link'] = links
+        return response
+    
     def get_queryset(self):
         """Return optimized queryset for scene details."""
         return Scene.objects.filter(
@@ -99,23 +165,69 @@ class SceneDetailAPIView(generics.RetrieveAPIView):
         )
 
 
+@method_decorator(scene_kwarg_condition('scene_id'), name='get')
 class SceneHotspotsAPIView(generics.ListAPIView):
     """
     API view to list all hotspots for a specific scene.
     
+    With ``yaw`` and ``pitch`` (and optionally ``fov``, default 100 degrees)
+    only the hotspots inside that view cone are returned.
+    
     GET /api/scenes/{scene_id}/hotspots/
+    GET /api/scenes/{scene_id}/hotspots/?yaw={yaw}&pitch={pitch}&fov={fov}
     """
     serializer_class = HotspotSerializer
+    default_fov = 100.0
     
     def get_queryset(self):
         """Return hotspots for the specified scene."""
         scene_id = self.kwargs['scene_id']
-        return Hotspot.objects.filter(
+        queryset = Hotspot.objects.filter(
             source_scene_id=scene_id,
             source_scene__is_active=True,
             target_scene__is_active=True,
             is_active=True
         ).select_related('target_scene')
+        
+        viewport = self.get_viewport()
+        if viewport is None:
+            return queryset
+        tour_id = Scene.objects.filter(
+            id=scene_id,
+            is_active=True
+        ).values_list('tour_id', flat=True).first()
+        if tour_id is None:
+            return queryset.none()
+        return queryset.filter(id__in=get_hotspot_index(scene_id, tour_id).visible(*viewport))
+    
+    def get_viewport(self):
+        """Return ``(yaw, pitch, fov)`` from the query string, or None."""
+        params = self.request.query_params
+        if 'yaw' not in params and 'pitch' not in params:
+            if 'fov' in params:
+                # Silently returning every hotspot would hide the client's mistake
+                raise ValidationError({'fov': ["A field of view needs yaw and pitch."]})
+            return None
+        
+        errors = {}
+        values = {}
+        for name, low, high in (('yaw', -360.0, 360.0), ('pitch', -90.0, 90.0), ('fov', 0.0, 360.0)):
+            if name not in params:
+                if name == 'fov':
+                    values[name] = self.default_fov
+                else:
+                    errors[name] = ["Both yaw and pitch are required."]
+                continue
+            try:
+                values[name] = float(params[name])
+            except ValueError:
+                errors[name] = ["A number is required."]
+                continue
+            if not low <= values[name] <= high or values[name] == 0.0 and name == 'fov':
+                errors[name] = [f"Must be between {low:g} and {high:g} degrees."]
+        if errors:
+            raise ValidationError(errors)
+        return values['yaw'], values['pitch'], values['fov']
 
 
 @api_view(['GET'])
@@ -131,12 +243,30 @@ def api_overview(request):
             'List all tours': '/api/tours/',
             'Get tour details': '/api/tours/{id}/',
             'Get tour scenes': '/api/tours/{tour_id}/scenes/',
+            'Export tour archive': '/api/tours/{tour_id}/export/',
+            'Import tour archive': '/api/tours/import/',
+        },
+        'Navigation': {
+            'Get tour navigation graph': '/api/tours/{tour_id}/navigation/',
+            'Get shortest route between scenes': '/api/tours/{tour_id}/route/?from={scene_id}&to={scene_id}',
+            'Get unreachable and dead-end scenes': '/api/tours/{tour_id}/reachability/',
+            'Get tour bundle (tour, scenes and hotspots)': '/api/tours/{tour_id}/bundle/',
+            'Cache statistics': '/api/cache/stats/',
+            'Request timing statistics': '/api/timing/stats/',
+            'Prometheus metrics': '/api/metrics/',
         },
         'Scenes': {
             'Get scene details': '/api/scenes/{id}/',
             'Get scene hotspots': '/api/scenes/{scene_id}/hotspots/',
+            'Get scene hotspots in view': '/api/scenes/{scene_id}/hotspots/?yaw={yaw}&pitch={pitch}&fov={fov}',
+            'Get clustered scene hotspots': '/api/scenes/{scene_id}/clusters/?fov={fov}',
+            'Get scene tile manifest': '/api/scenes/{scene_id}/tiles/',
+            'Get scene processing state': '/api/scenes/{scene_id}/processing/',
+            'Create/update hotspots in bulk': '/api/hotspots/bulk/',
+            'Record a hotspot click': '/api/hotspots/{hotspot_id}/click/',
         },
         'Search': {
+            'Search tours, scenes and hotspots': '/api/search/?q={query}',
             'Search tours': '/api/tours/?search={query}',
             'Order tours': '/api/tours/?ordering={field}',
         }
@@ -150,66 +280,87 @@ def api_overview(request):
     })
 
 
+def build_navigation_data(tour_id):
+    """
+    Build the navigation graph of an active tour.
+
+    Raises ``Tour.DoesNotExist`` if the tour is missing or inactive.
+    """
+    tour = Tour.objects.get(id=tour_id, is_active=True)
+
+    # Get all scenes and their hotspots
+    scenes = list(Scene.objects.filter(
+        tour=tour,
+        is_active=True
+    ).prefetch_related(
+        Prefetch(
+            'source_hotspots',
+            queryset=Hotspot.objects.filter(is_active=True)
+        )
+    ).order_by('order'))
+
+    # Build navigation graph
+    navigation_data = {
+        'tour': {
+            'id': tour.id,
+            'title': tour.title,
+            'scene_count': len(scenes),
+        },
+        'scenes': [],
+        'connections': []
+    }
+
+    for scene in scenes:
+        scene_data = {
+            'id': scene.id,
+            'title': scene.title,
+            'order': scene.order,
+            'initial_yaw': scene.initial_yaw,
+            'initial_pitch': scene.initial_pitch,
+            'panorama_image': scene.panorama_image.url if scene.panorama_image else None,
+            'map_image': scene.map_image.url if scene.map_image else None,
+            'voiceover_audio': scene.voiceover_audio.url if scene.voiceover_audio else None,
+        }
+        navigation_data['scenes'].append(scene_data)
+
+        # Add hotspot connections
+        for hotspot in scene.source_hotspots.all():
+            connection = {
+                'id': hotspot.id,
+                'from_scene': scene.id,
+                'to_scene': hotspot.target_scene_id,
+                'yaw': hotspot.yaw,
+                'pitch': hotspot.pitch,
+                'label': hotspot.label,
+                'size': hotspot.size,
+                'color': hotspot.color,
+            }
+            navigation_data['connections'].append(connection)
+
+    return navigation_data
+
+
+def get_navigation_data(tour_id):
+    """Return the navigation graph of a tour from the cache, building it on a miss."""
+    return get_or_build(
+        tour_cache_key('navigation', tour_id),
+        lambda: build_navigation_data(tour_id),
+    )
+
+
 @api_view(['GET'])
+@tour_kwarg_condition('tour_id')
 def tour_navigation(request, tour_id):
     """
     Get navigation data for a tour including scene connections.
     
+    The payload is cached per tour and invalidated by signals whenever the
+    tour, one of its scenes or one of its hotspots changes.
+    
     GET /api/tours/{tour_id}/navigation/
     """
     try:
-        tour = get_object_or_404(Tour, id=tour_id, is_active=True)
-        
-        # Get all scenes and their hotspots
-        scenes = Scene.objects.filter(
-            tour=tour,
-            is_active=True
-        ).prefetch_related(
-            Prefetch(
-                'source_hotspots',
-                queryset=Hotspot.objects.filter(is_active=True).select_related('target_scene')
-            )
-        ).order_by('order')
-        
-        # Build navigation graph
-        navigation_data = {
-            'tour': {
-                'id': tour.id,
-                'title': tour.title,
-                'scene_count': scenes.count(),
-            },
-            'scenes': [],
-            'connections': []
-        }
-        
-        for scene in scenes:
-            scene_data = {
-                'id': scene.id,
-                'title': scene.title,
-                'order': scene.order,
-                'initial_yaw': scene.initial_yaw,
-                'initial_pitch': scene.initial_pitch,
-                'panorama_image': scene.panorama_image.url if scene.panorama_image else None,
-                'map_image': scene.map_image.url if scene.map_image else None,
-                'voiceover_audio': scene.voiceover_audio.url if scene.voiceover_audio else None,
-            }
-            navigation_data['scenes'].append(scene_data)
-            
-            # Add hotspot connections
-            for hotspot in scene.source_hotspots.all():
-                connection = {
-                    'id': hotspot.id,
-                    'from_scene': scene.id,
-                    'to_scene': hotspot.target_scene.id,
-                    'yaw': hotspot.yaw,
-                    'pitch': hotspot.pitch,
-                    'label': hotspot.label,
-                    'size': hotspot.size,
-                    'color': hotspot.color,
-                }
-                navigation_data['connections'].append(connection)
-        
-        return Response(navigation_data)
+        return Response(get_navigation_data(tour_id))
         
     except Tour.DoesNotExist:
         return Response(
@@ -223,17 +374,350 @@ def tour_navigation(request, tour_id):
         )
 
 
+def _scene_param(request, name, graph, default=None):
+    """Read a scene id query parameter that must belong to ``graph``."""
+    value = request.query_params.get(name)
+    if value is None:
+        if default is None:
+            raise ValueError(f"The '{name}' parameter is required.")
+        return default
+    try:
+        scene_id = int(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be a scene id.")
+    if scene_id not in graph:
+        raise ValueError(f"Scene {scene_id} is not an active scene of this tour.")
+    return scene_id
+
+
+@api_view(['GET'])
+@tour_kwarg_condition('tour_id')
+def tour_route(request, tour_id):
+    """
+    Get the shortest hotspot route between two scenes of a tour.
+    
+    ``from`` defaults to the first scene. Routes are computed on the cached
+    scene graph, so no query is issued per hop.
+    
+    GET /api/tours/{tour_id}/route/?from={scene_id}&to={scene_id}
+    """
+    try:
+        graph = get_scene_graph(tour_id)
+    except Tour.DoesNotExist:
+        return Response(
+            {'error': 'Tour not found or inactive'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    try:
+        source = _scene_param(request, 'from', graph, default=graph.start)
+        target = _scene_param(request, 'to', graph)
+    except ValueError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    path = graph.shortest_path(source, target)
+    if path is None:
+        return Response(
+            {'error': f'Scene {target} cannot be reached from scene {source}'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return Response({
+        'from': source,
+        'to': target,
+        'hops': len(path) - 1,
+        'path': path,
+    })
+
+
+@api_view(['GET'])
+@tour_kwarg_condition('tour_id')
+def tour_reachability(request, tour_id):
+    """
+    Get the scenes unreachable from the first scene and the dead-end scenes.
+    
+    GET /api/tours/{tour_id}/reachability/?from={scene_id}
+    """
+    try:
+        graph = get_scene_graph(tour_id)
+    except Tour.DoesNotExist:
+        return Response(
+            {'error': 'Tour not found or inactive'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    if not len(graph):
+        return Response({
+            'from': None,
+            'scene_count': 0,
+            'hotspot_count': 0,
+            'unreachable': [],
+            'dead_ends': [],
+        })
+    try:
+        source = _scene_param(request, 'from', graph, default=graph.start)
+    except ValueError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'from': source,
+        'scene_count': len(graph),
+        'hotspot_count': graph.edge_count,
+        'unreachable': graph.unreachable_from(source),
+        'dead_ends': graph.dead_ends(),
+    })
+
+
+@api_view(['GET'])
+@tour_kwarg_condition('tour_id')
+def tour_bundle(request, tour_id):
+    """
+    Get a tour with every active scene and hotspot in one payload.
+    
+    Scenes and hotspots are keyed by id and reference each other by id, so
+    the viewer can prefetch a whole tour in one round-trip. Built with three
+    queries whatever the size of the tour.
+    
+    GET /api/tours/{tour_id}/bundle/
+    """
+    tour = get_object_or_404(Tour, id=tour_id, is_active=True)
+    scenes = list(Scene.objects.filter(
+        tour=tour,
+        is_active=True
+    ).prefetch_related(
+        Prefetch(
+            'source_hotspots',
+            queryset=Hotspot.objects.filter(
+                is_active=True,
+                target_scene__is_active=True
+            ).order_by('id')
+        )
+    ).order_by('order'))
+    hotspots = [hotspot for scene in scenes for hotspot in scene.source_hotspots.all()]
+    
+    context = {'request': request, 'scenes': scenes}
+    return Response({
+        'tour': TourBundleSerializer(tour, context=context).data,
+        'scenes': {
+            data['id']: data
+            for data in BundleSceneSerializer(scenes, many=True, context=context).data
+        },
+        'hotspots': {
+            data['id']: data
+            for data in BundleHotspotSerializer(hotspots, many=True, context=context).data
+        },
+    })
+
+
+@api_view(['GET'])
+@scene_kwarg_condition('scene_id')
+def scene_tiles(request, scene_id):
+    """
+    Get the tile manifest of a scene's panorama for progressive loading.
+    
+    GET /api/scenes/{scene_id}/tiles/
+    """
+    scene = get_object_or_404(
+        Scene.objects.only('id', 'tile_manifest'),
+        id=scene_id,
+        is_active=True,
+        tour__is_active=True
+    )
+    manifest = scene.tile_manifest
+    if not manifest:
+        return Response(
+            {'error': 'Tiles are not available for this scene'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    return Response({'scene': scene.id, **tile_urls(manifest)})
+
+
+@api_view(['GET'])
+@scene_kwarg_condition('scene_id')
+def scene_hotspot_clusters(request, scene_id):
+    """
+    Get the hotspots of a scene grouped into markers for a field of view.
+    
+    ``fov`` (degrees, default 100) picks the clustering level at which
+    markers stop overlapping; ``level`` picks one explicitly. Each marker
+    has the centroid ``yaw``/``pitch``, member ``count`` and ``hotspots`` ids.
+    
+    GET /api/scenes/{scene_id}/clusters/?fov={fov}
+    GET /api/scenes/{scene_id}/clusters/?level={level}
+    """
+    tour_id = Scene.objects.filter(
+        id=scene_id,
+        is_active=True,
+        tour__is_active=True
+    ).values_list('tour_id', flat=True).first()
+    if tour_id is None:
+        return Response(
+            {'error': 'Scene not found or inactive'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    try:
+        if 'level' in request.query_params:
+            level = int(request.query_params['level'])
+            if not 0 <= level < len(CLUSTER_RADII):
+                raise ValueError
+        else:
+            fov = float(request.query_params.get('fov', 100))
+            if not 0 < fov <= 360:
+                raise ValueError
+            level = level_for_fov(fov)
+    except ValueError:
+        return Response(
+            {'error': f"'level' must be 0-{len(CLUSTER_RADII) - 1} and 'fov' between 0 and 360 degrees."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response({
+        'scene': scene_id,
+        'level': level,
+        'radius': CLUSTER_RADII[level],
+        'levels': len(CLUSTER_RADII),
+        'clusters': get_scene_clusters(scene_id, tour_id)[level],
+    })
+
+
+@api_view(['GET'])
+def scene_processing(request, scene_id):
+    """
+    Get the background media processing state of a scene.
+    
+    GET /api/scenes/{scene_id}/processing/
+    """
+    scene = get_object_or_404(
+        Scene.objects.only('id', 'processing_status', 'processing_error', 'tile_manifest'),
+        id=scene_id
+    )
+    job = Job.objects.filter(key=f'scene-media:{scene.id}').order_by('-id').first()
+    return Response({
+        'scene': scene.id,
+        'status': scene.processing_status,
+        'error': scene.processing_error or None,
+        'tiles_ready': bool(scene.tile_manifest),
+        'job': {
+            'id': job.id,
+            'status': job.status,
+            'attempts': job.attempts,
+            'max_attempts': job.max_attempts,
+            'run_after': job.run_after,
+        } if job else None,
+    })
+
+
+@api_view(['GET'])
+def site_search(request):
+    """
+    Full-text search over tours, scenes and hotspot labels.
+    
+    Results are ranked best first; matches in ``title`` and ``snippet`` are
+    wrapped in ``<mark>`` (the rest of the text is HTML-escaped).
+    
+    GET /api/search/?q={query}&type=tour,scene,hotspot&limit=20
+    """
+    query = request.query_params.get('q', '').strip()
+    kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind]
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if unknown:
+        return Response(
+            {'error': f"Unknown type: {', '.join(unknown)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 50)
+    except ValueError:
+        limit = 20
+    
+    return Response({
+        'query': query,
+        'results': search(query, kinds or None, limit),
+    })
+
+
+@api_view(['GET'])
+def cache_stats(request):
+    """
+    Cache hit/miss counters of this worker process.
+    
+    GET /api/cache/stats/
+    """
+    return Response(get_cache_stats())
+
+
+@api_view(['GET'])
+def timing_stats(request):
+    """
+    Rolling Server-Timing aggregates per endpoint of this worker process.
+    Served with DEBUG or to staff users only, since they map out the API's
+    slow paths.
+    
+    GET /api/timing/stats/
+    """
+    if not (settings.DEBUG or request.user.is_staff):
+        raise PermissionDenied("Timing stats are only available to staff users.")
+    return Response(get_timing_stats())
+
+
+def metrics(request):
+    """
+    Prometheus metrics of all worker processes.
+    
+    GET /api/metrics/
+    """
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _probe_database(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def _probe_storage():
+    storage = get_media_storage()
+    location = getattr(storage, 'location', None)
+    if location is None:
+        # Remote storage: a round trip shows it answers
+        storage.exists('health-check')
+        return
+    os.makedirs(location, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=location, prefix='.health-'):
+        pass
+
+
 @api_view(['GET'])
 def health_check(request):
     """
-    Simple health check endpoint.
+    Readiness probe: queries every database and writes a temporary file to
+    the media storage. Answers 503 if any check fails.
     
     GET /api/health/
     """
+    probes = {f'database:{alias}': partial(_probe_database, alias) for alias in settings.DATABASES}
+    probes['storage'] = _probe_storage
+    checks = {}
+    for name, probe in probes.items():
+        start = time.perf_counter()
+        try:
+            probe()
+        except Exception as exc:
+            checks[name] = {'status': 'error', 'error': type(exc).__name__}
+        else:
+            checks[name] = {'status': 'ok'}
+        checks[name]['latency_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    
+    if all(check['status'] == 'ok' for check in checks.values()):
+        return Response({
+            'status': 'healthy',
+            'message': 'VR Tours API is running',
+            'checks': checks,
+        })
     return Response({
-        'status': 'healthy',
-        'message': 'VR Tours API is running'
-    })
+        'status': 'unhealthy',
+        'message': 'VR Tours API is not ready',
+        'checks': checks,
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
 
 # Additional views for content management (optional, for future admin features)
@@ -259,4 +743,197 @@ class HotspotCreateAPIView(generics.CreateAPIView):
     API view to create a new hotspot.
     """
     queryset = Hotspot.objects.all()
-    serializer_class = HotspotCreateSerializer 
\ No newline at end of file
+    serializer_class = HotspotCreateSerializer
+
+
+@replica_pinning_exempt
+@api_view(['POST'])
+def hotspot_click(request, hotspot_id):
+    """
+    Record that a visitor followed a hotspot, for neighbour ranking.
+    
+    The counter is bumped in place, so cached scene payloads are left alone
+    and pick the new ranking up on their next rebuild.
+    
+    POST /api/hotspots/{hotspot_id}/click/
+    """
+    updated = Hotspot.objects.filter(id=hotspot_id, is_active=True).update(
+        click_count=F('click_count') + 1
+    )
+    if not updated:
+        return Response({'error': 'Hotspot not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class HotspotBulkAPIView(APIView):
+    """
+    API view to create and update many hotspots at once.
+    
+    POST /api/hotspots/bulk/ with a list of hotspots; items with an ``id``
+    replace that hotspot, the others are created. Nothing is written unless
+    every item is valid; errors are reported per item index.
+    """
+    
+    def post(self, request):
+        if not isinstance(request.data, list):
+            return Response(
+                {'non_field_errors': ["Expected a list of hotspots."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        errors = {}
+        items = {}
+        for index, item in enumerate(request.data):
+            serializer = HotspotBulkItemSerializer(data=item)
+            if serializer.is_valid():
+                items[index] = serializer.validated_data
+            else:
+                errors[index] = serializer.errors
+        
+        link_errors, scene_tours = validate_hotspot_batch(items)
+        errors.update(link_errors)
+        
+        existing = Hotspot.objects.select_related('source_scene').in_bulk(
+            [data['id'] for data in items.values() if 'id' in data]
+        )
+        for index, data in items.items():
+            if 'id' in data and data['id'] not in existing:
+                errors.setdefault(index, {})['id'] = [f"Hotspot {data['id']} does not exist."]
+        
+        if errors:
+            return Response(
+                {'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        created, updated = [], []
+        tour_ids, scene_ids = set(), set()
+        # bulk_update skips auto_now
+        now = timezone.now()
+        for data in items.values():
+            tour_ids.add(scene_tours[data['source_scene_id']])
+            scene_ids.add(data['source_scene_id'])
+            if 'id' in data:
+                hotspot = existing[data['id']]
+                # A hotspot moved to another tour changes the old tour as well
+                tour_ids.add(hotspot.source_scene.tour_id)
+                scene_ids.add(hotspot.source_scene_id)
+                for field, value in data.items():
+                    setattr(hotspot, field, value)
+                hotspot.updated_at = now
+                updated.append(hotspot)
+            else:
+                created.append(Hotspot(**data))
+        
+        with transaction.atomic():
+            Hotspot.objects.bulk_create(created)
+            Hotspot.objects.bulk_update(updated, [
+                'source_scene_id', 'target_scene_id', 'yaw', 'pitch',
+                'label', 'size', 'color', 'is_active', 'updated_at',
+            ])
+            # Bulk writes skip the save signals that count, index and drop cached payloads
+            recount_scenes(scene_ids)
+            index_hotspots(created + updated, scene_tours)
+            for tour_id in tour_ids:
+                invalidate_tour(tour_id)
+        
+        return Response({
+            'created': HotspotBulkItemSerializer(created, many=True).data,
+            'updated': HotspotBulkItemSerializer(updated, many=True).data,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class ChunkedUploadCreateAPIView(generics.CreateAPIView):
+    """
+    API view to start a resumable upload of a scene panorama or voiceover.
+    
+    POST /api/uploads/
+    """
+    queryset = ChunkedUpload.objects.all()
+    serializer_class = ChunkedUploadSerializer
+
+
+class ChunkedUploadAPIView(generics.RetrieveDestroyAPIView):
+    """
+    API view to inspect, append to or abort a resumable upload.
+    
+    GET    /api/uploads/{id}/   current offset, to resume after a failure
+    PUT    /api/uploads/{id}/   raw chunk body, starting at the Upload-Offset header
+    DELETE /api/uploads/{id}/   abort and discard received bytes
+    """
+    queryset = ChunkedUpload.objects.all()
+    serializer_class = ChunkedUploadSerializer
+    lookup_field = 'id'
+    
+    def put(self, request, *args, **kwargs):
+        """Stream one chunk from the request body to disk."""
+        upload = self.get_object()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'An integer Upload-Offset header is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Read the raw body stream; request.data would buffer the whole chunk
+        new_offset = write_chunk(upload, offset, request.stream or io.BytesIO())
+        return Response(
+            {'id': upload.id, 'offset': new_offset, 'size': upload.size},
+            headers={'Upload-Offset': str(new_offset)}
+        )
+    
+    def perform_destroy(self, instance):
+        abort_upload(instance)
+
+
+@api_view(['POST'])
+def chunked_upload_complete(request, id):
+    """
+    Finish a resumable upload and attach the file to its scene.
+    
+    POST /api/uploads/{id}/complete/
+    """
+    upload = get_object_or_404(ChunkedUpload, id=id)
+    scene = complete_upload(upload)
+    return Response({
+        'upload': ChunkedUploadSerializer(upload).data,
+        'scene': scene.id,
+        'processing_status': scene.processing_status,
+    })
+
+
+@api_view(['GET'])
+def tour_export(request, tour_id):
+    """
+    Download a tour with its scenes, hotspots and media as a zip archive.
+    
+    GET /api/tours/{tour_id}/export/
+    """
+    # Inactive tours are hidden like on every other read endpoint
+    tour = get_object_or_404(Tour, id=tour_id, is_active=True)
+    response = StreamingHttpResponse(stream_export(tour), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(tour)}"'
+    return response
+
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+def tour_import(request):
+    """
+    Create a tour from an archive produced by the export endpoint.
+    
+    POST /api/tours/import/ (multipart field ``archive``)
+    """
+    archive = request.FILES.get('archive')
+    if archive is None:
+        return Response({'archive': ["No archive was submitted."]}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        tour = import_tour(archive)
+    except ArchiveError as error:
+        return Response({'archive': [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'id': tour.id,
+        'title': tour.title,
+        'scenes': tour.scenes.count(),
+    }, status=status.HTTP_201_CREATED)
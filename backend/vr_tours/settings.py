@@ -3,6 +3,7 @@ Django settings for VR Tours platform.
 """
 
 import os
+from importlib.util import find_spec
 from pathlib import Path
 from decouple import config
 
@@ -39,8 +40,11 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'tours.metrics.MetricsMiddleware',
+    'tours.timing.ServerTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'tours.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,9 +78,36 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests, checked before reuse
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=600, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas (see tours/routers.py). DB_LOCAL_REPLICA adds a stand-in for
+# development: a second, read-only connection to the SQLite file.
+if config('DB_LOCAL_REPLICA', default=False, cast=bool):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['tours.routers.ReplicaRouter']
+# Seconds a client that wrote keeps reading from the primary
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='vr-tours'),
+    }
+}
+
+# Seconds a cached per-tour payload (e.g. navigation graph) is kept
+TOUR_CACHE_TIMEOUT = config('TOUR_CACHE_TIMEOUT', default=60 * 60, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,6 +138,43 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Media delivery (see tours/media.py)
+MEDIA_CACHE_MAX_AGE = config('MEDIA_CACHE_MAX_AGE', default=60 * 60, cast=int)
+# None (Django streams), 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache)
+MEDIA_SENDFILE = config('MEDIA_SENDFILE', default=None)
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='/protected-media/')
+
+# Panorama tile pyramid (see tours/tiling.py)
+PANORAMA_TILING_ENABLED = config('PANORAMA_TILING_ENABLED', default=True, cast=bool)
+PANORAMA_TILE_SIZE = 512
+PANORAMA_TILE_MAX_FACE_SIZE = 4096
+PANORAMA_TILE_QUALITY = 85
+
+# Neighbour panoramas announced with Link: rel=preload on scene details
+SCENE_PRELOAD_LIMIT = config('SCENE_PRELOAD_LIMIT', default=3, cast=int)
+# Angle a hotspot marker covers as a fraction of the field of view (see tours/clustering.py)
+HOTSPOT_CLUSTER_FOV_FRACTION = 1 / 25
+
+# Background job queue (see tours/jobs.py, run with `manage.py worker`)
+JOB_QUEUE_EAGER = config('JOB_QUEUE_EAGER', default=False, cast=bool)  # run jobs in-process
+JOB_LOCK_TIMEOUT = 15 * 60  # seconds before a job held by a dead worker is retried
+JOB_RETRY_BACKOFF = 30  # seconds, doubled on every retry
+
+# Serve the read endpoints with the async views of tours/async_views.py (for ASGI)
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+
+# Server-Timing headers and per-endpoint timings (see tours/timing.py): the
+# share of requests measured, 0 to turn it off and 1 to measure every request
+SERVER_TIMING_SAMPLE_RATE = config('SERVER_TIMING_SAMPLE_RATE', default=0.01, cast=float)
+SERVER_TIMING_WINDOW = 500  # recent samples aggregated per endpoint
+
+# Prometheus metrics (see tours/metrics.py): every worker process writes its
+# totals here for /api/metrics/ to add up; keep it local to the host, e.g.
+# /var/tmp/vr-tours-metrics. Unset, /api/metrics/ only reports the process
+# serving it
+METRICS_DIR = config('METRICS_DIR', default=None)
+METRICS_FLUSH_INTERVAL = 1  # seconds between writes per process
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -114,9 +182,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # Picked by the Accept header; the first one is the default
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-    ],
+        'tours.renderers.ORJSONRenderer',
+    ] + (['tours.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
         'rest_framework.parsers.MultiPartParser',
@@ -135,5 +204,18 @@ CORS_ALLOWED_ORIGINS = [
 CORS_ALLOW_CREDENTIALS = True
 
 # File upload settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB 
\ No newline at end of file
+# Hash uploads while they are received, for content-addressed storage
+FILE_UPLOAD_HANDLERS = [
+    'tours.storage.HashingMemoryFileUploadHandler',
+    'tours.storage.HashingTemporaryFileUploadHandler',
+]
+# Keep Django's 2.5MB defaults so larger multipart files spool to disk
+# instead of RAM; big media should use the chunked upload API.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
+PANORAMA_MAX_UPLOAD_SIZE = 200 * 1024 * 1024  # 200MB
+VOICEOVER_MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50MB
+
+# Resumable chunked uploads (see tours/uploads.py)
+CHUNKED_UPLOAD_DIR = BASE_DIR / 'uploads'  # outside MEDIA_ROOT, never served
+CHUNKED_UPLOAD_EXPIRY = 24 * 60 * 60  # seconds an unfinished upload is kept 
\ No newline at end of file
@@ -2,16 +2,19 @@
 URL configuration for VR Tours platform.
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from tours.media import serve_media
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('tours.urls')),
+    # Range-aware media delivery, optionally offloaded to the front proxy
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
 ]
 
-# Serve media files during development
+# Serve static files during development
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT) 
\ No newline at end of file
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)